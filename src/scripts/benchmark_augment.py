@@ -0,0 +1,94 @@
+import argparse
+import logging
+import tempfile
+import time
+
+import numpy as np
+from torch.utils.data import DataLoader
+
+from wandb_jetracer.utils.augment import BatchAugment, augmented_collate
+from wandb_jetracer.utils.utils import setup_logging
+from wandb_jetracer.utils.xy_dataset import XYDataset
+
+
+def make_synthetic_dataset(directory, nb_imgs, img_size=224):
+    dataset = XYDataset(directory)
+    for _ in range(nb_imgs):
+        image = np.random.randint(
+            0, 256, (img_size, img_size, 3), dtype=np.uint8
+        )
+        x, y = np.random.randint(0, img_size, 2)
+        dataset.save_entry(None, image, x, y)
+
+
+def samples_per_second(loader, epochs):
+    start = time.perf_counter()
+    count = 0
+    for _ in range(epochs):
+        for images, _ in loader:
+            count += len(images)
+
+    return count / (time.perf_counter() - start)
+
+
+def main(args):
+    setup_logging()
+
+    directory = args.directory
+    if directory is None:
+        directory = tempfile.mkdtemp()
+        logging.info(f"Creating {args.nb_imgs} synthetic images...")
+        make_synthetic_dataset(directory, args.nb_imgs)
+
+    loader_args = dict(batch_size=args.batch_size, shuffle=True,
+                       num_workers=args.num_workers)
+
+    per_item = DataLoader(
+        XYDataset(directory, train=True, cache_dir=args.cache_dir),
+        **loader_args
+    )
+    batched = DataLoader(
+        XYDataset(directory, cache_dir=args.cache_dir, uint8=True),
+        collate_fn=augmented_collate(BatchAugment()),
+        **loader_args
+    )
+
+    for name, loader in [("per item", per_item), ("batched", batched)]:
+        rate = samples_per_second(loader, args.epochs)
+        logging.info(f"{name}: {rate:.1f} samples/s")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compare per item and batched augmentation throughput.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument(
+        "--directory",
+        type=str,
+        default=None,
+        help="Labelled images to use. None = synthetic images."
+    )
+    parser.add_argument(
+        "-n",
+        "--nb_imgs",
+        type=int,
+        default=512,
+        help="Number of synthetic images."
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=None,
+        help="Use a FrameCache stored there for both datasets."
+    )
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--num_workers", type=int, default=2)
+    parser.add_argument("--epochs", type=int, default=2)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
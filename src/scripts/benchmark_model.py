@@ -0,0 +1,140 @@
+import argparse
+import json
+import logging
+import sys
+import time
+
+from wandb_jetracer.utils.benchmark import (latency,
+                                            peak_memory,
+                                            prediction_errors,
+                                            regressions,
+                                            throughput)
+from wandb_jetracer.utils.runners import MODEL_FILES, load_runner
+from wandb_jetracer.utils.utils import setup_logging
+from wandb_jetracer.utils.xy_dataset import XYDataset
+
+
+def benchmark(config):
+    start = time.perf_counter()
+    runner = load_runner(
+        config.backend, config.model, config.architecture, config.device
+    )
+    results = {
+        "model": config.model,
+        "backend": config.backend,
+        "device": str(runner.device),
+        "dtype": str(runner.dtype),
+        "load_seconds": time.perf_counter() - start,
+    }
+
+    logging.info("Measuring latency...")
+    results.update(latency(runner, config.n, config.warmup))
+
+    # trt engines are built for a batch size of 1
+    batch_size = 1 if config.backend == "trt" else config.batch_size
+    logging.info(f"Measuring throughput with batches of {batch_size}...")
+    results["batch_size"] = batch_size
+    results["throughput_fps"] = throughput(runner, batch_size)
+
+    logging.info(f"Evaluating on {config.test_dir}...")
+    dataset = XYDataset(config.test_dir, train=False)
+    results["test_images"] = len(dataset)
+    results.update(prediction_errors(runner, dataset, batch_size))
+
+    results.update(peak_memory())
+
+    return results
+
+
+def main(args):
+    setup_logging()
+    results = benchmark(args)
+
+    output = json.dumps(results, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        logging.info(f"Results written to {args.output}")
+
+    if args.baseline is None:
+        return True
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressed = regressions(results, baseline, args.max_regression)
+    for metric, (before, after) in regressed.items():
+        logging.error(f"{metric} regressed: {before:.4g} -> {after:.4g}")
+
+    return not regressed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the latency, throughput, memory and accuracy "
+                    "of a model, results are printed as json.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument(
+        "model",
+        type=str,
+        help=f"Path to the model, e.g {', '.join(MODEL_FILES.values())}."
+    )
+    parser.add_argument(
+        "test_dir",
+        type=str,
+        help="Directory of labelled images, e.g the dataset's test split."
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        default="torch",
+        choices=list(MODEL_FILES),
+        help="How to run the model."
+    )
+    parser.add_argument(
+        "--architecture",
+        type=str,
+        default=None,
+        help="Architecture of the torch backend's model, e.g resnet18."
+    )
+    parser.add_argument(
+        "--device",
+        type=str,
+        default=None,
+        help="Device to run torch and torchscript models on. \
+             None = cuda if available."
+    )
+    parser.add_argument("-n", type=int, default=100,
+                        help="Number of frames to time.")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--batch_size", type=int, default=16)
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default=None,
+        help="Json file to write the results to. None = stdout."
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="Results of a previous run. Exit with an error if a metric \
+             is worse by more than --max_regression."
+    )
+    parser.add_argument(
+        "--max_regression",
+        type=float,
+        default=0.1,
+        help="Fraction by which a metric can be worse than the baseline."
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not main(args):
+        sys.exit(1)
@@ -1,23 +1,33 @@
 import argparse
 import logging
-import os
-import sys
 
-import cv2
 from tqdm import tqdm
 import wandb
 
 from jetcam.csi_camera import CSICamera
+from wandb_jetracer.utils.dataset_sync import DatasetSync, WandbStore
+from wandb_jetracer.utils.frame_writer import FrameWriter
 from wandb_jetracer.utils.utils import setup_logging, create_img_name
 
 
 def collect_images(camera, output_dir, config):
     logging.info("Collecting images...")
 
-    for _ in tqdm(range(config.nb_imgs)):
-        image = camera.read()
-        fname = create_img_name()
-        cv2.imwrite(os.path.join(output_dir, fname), image)
+    # encoding and writing happen in the background
+    # so that we don't miss frames
+    with FrameWriter(
+        output_dir,
+        workers=config.writers,
+        max_queue=config.queue_size,
+        quality=config.jpeg_quality,
+    ) as writer:
+        for _ in tqdm(range(config.nb_imgs)):
+            image = camera.read()
+            writer.submit(image, create_img_name())
+
+        logging.info("Waiting for the last images to be written...")
+
+    logging.info(f"Writer stats: {writer.stats()}")
 
 
 def main(args):
@@ -31,32 +41,22 @@ def main(args):
         config = run.config
         setup_logging()
 
-        camera, output_dir = setup(config)
-        collect_images(camera, output_dir, config)
+        # existing images aren't downloaded, only new ones are uploaded
+        sync = DatasetSync(
+            WandbStore(run), config.dataset_name, config.dataset_name
+        )
+        if sync.remote:
+            logging.info("Dataset already exists, adding to it")
+        else:
+            logging.info("Dataset doesn't exist yet, creating it")
 
-        dataset = wandb.Artifact(config.dataset_name, type="dataset")
-        # add images to artifact
-        dataset.add_dir(output_dir)
-        # log artifact to wandb
-        run.log_artifact(dataset)
+        camera = setup(config)
+        collect_images(camera, sync.directory, config)
 
+        sync.push()
 
-def setup(config):
-    try:
-        # first pull the latest version of the dataset to add to it
-        artifact = wandb.use_artifact(f"{config.dataset_name}:latest")
-        artifact_dir = artifact.download()
-        logging.info("Dataset already exists, adding to it")
-    except wandb.errors.CommError:
-        logging.info("Dataset doesn't exist yet, creating it")
-        artifact_dir = config.dataset_name
-        try:
-            os.makedirs(artifact_dir, exist_ok=False)
-        except FileExistsError:
-            logging.error(f"Local directory {artifact_dir} shouldn't exist. "
-                          "Please delete/rename it.")
-            sys.exit(0)
 
+def setup(config):
     logging.info("Setting up camera...")
 
     camera = CSICamera(
@@ -64,7 +64,7 @@ def setup(config):
         height=config.img_size,
         capture_fps=config.framerate,
     )
-    return camera, artifact_dir
+    return camera
 
 
 def parse_args():
@@ -96,6 +96,25 @@ def parse_args():
         default=224,
         help="Size of the images to collect."
     )
+    parser.add_argument(
+        "--jpeg_quality",
+        type=int,
+        default=95,
+        help="JPEG quality of the saved images, between 0 and 100."
+    )
+    parser.add_argument(
+        "--writers",
+        type=int,
+        default=2,
+        help="Number of threads encoding and writing images."
+    )
+    parser.add_argument(
+        "--queue_size",
+        type=int,
+        default=64,
+        help="Max number of images waiting to be written. \
+             Capture waits for the writers when it's full."
+    )
     parser.add_argument(
         "-e",
         "--entity",
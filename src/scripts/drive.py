@@ -1,63 +1,175 @@
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import os
 import time
 
 import cv2
-from jtop import jtop
-from mpu9250_jmdev.registers import (
-                        AK8963_ADDRESS,
-                        MPU9050_ADDRESS_68,
-                        GFS_1000,
-                        AFS_8G,
-                        AK8963_BIT_16,
-                        AK8963_MODE_C100HZ
-                    )
-from mpu9250_jmdev.mpu_9250 import MPU9250
-import torch
+import numpy as np
 import wandb
-import yolov5
-from yolov5.utils.general import non_max_suppression
 
-from jetcam.csi_camera import CSICamera
-from jetracer.nvidia_racecar import NvidiaRacecar
-from wandb_jetracer.utils.xy_dataset import preprocess
+from wandb_jetracer.utils.detector import (DETECTOR_STATS_KEYS,
+                                           DetectorWorker)
+from wandb_jetracer.utils.estimator import (ESTIMATORS,
+                                            estimator_class,
+                                            make_estimator)
+from wandb_jetracer.utils.flight_recorder import (DEFAULT_MAX_DUMPS,
+                                                  DEFAULT_RECORDER_DIR,
+                                                  FlightRecorder,
+                                                  recover)
+from wandb_jetracer.utils.imu import IMU_KEYS, IMU_STATS_KEYS, IMUSampler
+from wandb_jetracer.utils.instrumentation import (NULL_PROFILER,
+                                                  Profiler,
+                                                  StartupTimer)
+from wandb_jetracer.utils.model_cache import (DEFAULT_CACHE_DIR,
+                                              MODEL_ARTIFACTS,
+                                              ModelCache)
+from wandb_jetracer.utils.pipeline import Pipeline
+from wandb_jetracer.utils.scheduler import (ControlScheduler,
+                                            LatestFrame,
+                                            Watchdog)
+from wandb_jetracer.utils.system_stats import (STATS_AGE_KEY,
+                                               JtopSource,
+                                               ProcSource,
+                                               SystemStats)
+from wandb_jetracer.utils.telemetry import (Image,
+                                            TelemetrySink,
+                                            make_backend,
+                                            reduced_columns)
 from wandb_jetracer.utils.utils import setup_logging, show_label
-from torch2trt import TRTModule
+from wandb_jetracer.utils.video import (CODECS,
+                                        DEFAULT_CODEC,
+                                        VIDEO_STATS_KEYS,
+                                        VideoRecorder)
 
 THROTTLE_GAIN = -1
 STEERING_GAIN = -2  # TODO: add that to the config
 IMG_SIZE = 224
+STAGE_BUDGETS = {  # seconds
+    "read_mpu": 0.005,
+    "infer": 0.05,
+    "control_policy": 0.001,
+}
+# seconds between watchdog checks, on a thread of their own
+WATCHDOG_INTERVAL = 0.1
+# runners.MODEL_FILES, not imported here so that torch is only imported
+# while the camera and IMU are being set up
+BACKENDS = ["trt", "torchscript", "onnx", "torch"]
 
 
-def setup(config):
+def model_alias(config):
+    return f'{MODEL_ARTIFACTS[config.backend]}:{config.model_version}'
 
-    model_trt = TRTModule()
 
-    if config.local_model is None:
+def check_offline_model(config):
+    """
+    With the store telemetry backend wandb is disabled, so the model
+    must be local or already cached: fail before setting anything up.
+    """
+    if config.telemetry_backend != "store" or config.local_model is not None:
+        return
+
+    alias = model_alias(config)
+    if config.refresh_model:
+        raise ValueError("--refresh_model needs wandb, which is disabled "
+                         "with --telemetry_backend store")
+    if ModelCache(config.model_cache).resolve(alias) is None:
+        raise ValueError(f"{alias} isn't in the model cache "
+                         f"{config.model_cache} and wandb is disabled with "
+                         "--telemetry_backend store. Use --local_model or "
+                         "drive once online to cache it")
+
+
+def resolve_model(config):
+    """Backend, local path and architecture of the model to drive with"""
+    backend = config.backend
+    architecture = config.architecture
+
+    if config.local_model is not None:
+        logging.info(f"Using local model: {config.local_model}")
+        return backend, config.local_model, architecture
+
+    from wandb_jetracer.utils.runners import MODEL_FILES
+
+    cache = ModelCache(config.model_cache)
+    alias = model_alias(config)
+    cached = None if config.refresh_model else cache.resolve(alias)
+    if cached is not None:
+        logging.info(f"Using cached {alias}")
+        model_path, metadata = cached
+    else:
+        check_offline_model(config)
         logging.info("Downloading latest optimized model...")
-        artifact = wandb.use_artifact(f'trt-model:{config.model_version}')
+        artifact = wandb.use_artifact(alias)
         artifact_dir = artifact.download()
-        model_trt.load_state_dict(torch.load(
-            os.path.join(artifact_dir, 'trt-model.pth')
-        ))
-    else:
-        logging.info(f"Using local model: {config.local_model}")
-        model_trt.load_state_dict(torch.load(config.local_model))
 
-    yolo_model = None
-    if config.yolo:
-        logging.info("Setting up yolo model")
-        yolo_model = yolov5.load('yolov5s.pt')
-        yolo_model.half()
+        # artifacts logged by trt_optim.py know how they were optimized
+        metadata = dict(artifact.metadata)
+        model_backend = metadata.setdefault("backend", backend)
+        if model_backend == "torch" and architecture is None:
+            metadata.setdefault(
+                "architecture",
+                artifact.logged_by().config["architecture"]
+            )
+
+        # next time the model is found without asking wandb
+        key = metadata.get("cache_key", artifact.digest)
+        model_path = cache.put(
+            key,
+            os.path.join(artifact_dir, MODEL_FILES[model_backend]),
+            metadata,
+        )
+        cache.set_alias(alias, key)
+
+    backend = metadata.get("backend", backend)
+    architecture = metadata.get("architecture", architecture)
+
+    return backend, model_path, architecture
+
 
-    logging.info("Setting up car and camera")
-    car = NvidiaRacecar()
-    camera = CSICamera(
+def load_model(config, startup=None):
+    startup = startup or StartupTimer()
+    with startup.task("resolve_model"):
+        backend, model_path, architecture = resolve_model(config)
+
+    with startup.task("load_model"):
+        from wandb_jetracer.utils.runners import load_runner
+
+        runner = load_runner(backend, model_path, architecture)
+
+    # lazy initializations (cuda context, trt engine, preprocessing
+    # buffers...) happen on the first frame, not while driving
+    with startup.task("warm_up_model"):
+        infer(np.zeros((IMG_SIZE, IMG_SIZE, 3), dtype=np.uint8), runner)
+
+    return runner
+
+
+def setup_car():
+    from jetracer.nvidia_racecar import NvidiaRacecar
+
+    return NvidiaRacecar()
+
+
+def setup_camera(config):
+    from jetcam.csi_camera import CSICamera
+
+    return CSICamera(
         width=IMG_SIZE, height=IMG_SIZE, capture_fps=config.framerate
     )
 
-    logging.info("Setting up MPU9250")
+
+def setup_mpu():
+    from mpu9250_jmdev.registers import (
+                            AK8963_ADDRESS,
+                            MPU9050_ADDRESS_68,
+                            GFS_1000,
+                            AFS_8G,
+                            AK8963_BIT_16,
+                            AK8963_MODE_C100HZ
+                        )
+    from mpu9250_jmdev.mpu_9250 import MPU9250
+
     mpu = MPU9250(
         address_ak=AK8963_ADDRESS,
         address_mpu_master=MPU9050_ADDRESS_68,  # In 0x68 Address
@@ -70,7 +182,100 @@ def setup(config):
 
     mpu.configure()  # Apply the settings to the registers.
 
-    return car, camera, mpu, model_trt, yolo_model
+    return mpu
+
+
+class YoloDetector:
+    """yolo and non max suppression on a camera frame"""
+
+    def __init__(self, yolo_model):
+        from wandb_jetracer.utils.xy_dataset import Preprocessor
+
+        self.model = yolo_model
+        self.names = yolo_model.names
+        param = next(yolo_model.parameters())
+        # its own buffers: preprocess() belongs to the steering model
+        self.preprocess = Preprocessor(
+            device=param.device, dtype=param.dtype
+        )
+
+    def __call__(self, image):
+        from yolov5.utils.general import non_max_suppression
+
+        objects = self.model(self.preprocess(image), size=IMG_SIZE)[0]
+
+        return non_max_suppression(
+            objects,
+            self.model.conf,
+            iou_thres=self.model.iou
+        )
+
+
+def setup_yolo():
+    import yolov5
+
+    yolo_model = yolov5.load('yolov5s.pt')
+    yolo_model.half()
+
+    return YoloDetector(yolo_model)
+
+
+def start_detector(detector, config, clock=time.monotonic):
+    """Run the detector in the background at its own, lower, rate"""
+    if detector is None:
+        return None
+
+    min_period = 1 / config.detection_rate if config.detection_rate else 0
+    return DetectorWorker(
+        detector,
+        every=config.detection_every,
+        min_period=min_period,
+        clock=clock,
+    ).start()
+
+
+def latest_detections(worker, now=None):
+    """Objects to act on, never waits for the detector"""
+    if worker is None:
+        return None, {}
+
+    objects, staleness = worker.latest(now)
+    log = {}
+    if staleness is not None:
+        log["detector/staleness_seconds"] = staleness
+
+    return objects, log
+
+
+def setup(config, startup=None):
+    """
+    Set up the car, camera, IMU, jtop and models concurrently. Hardware
+    libraries and models are only imported here, and only if enabled,
+    which keeps the driving logic importable elsewhere (see replay.py).
+    """
+    startup = startup or StartupTimer()
+    tasks = {
+        "car": setup_car,
+        "camera": lambda: setup_camera(config),
+        "mpu": setup_mpu,
+        "jtop": start_jtop,
+        # times its own steps: resolve, load and warm up
+        "model": lambda: load_model(config, startup),
+    }
+    if config.yolo:
+        tasks["detector"] = setup_yolo
+
+    logging.info(f"Setting up {', '.join(tasks)}")
+    with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+        futures = {
+            name: executor.submit(startup.timed(f"setup_{name}", fn))
+            for name, fn in tasks.items()
+        }
+    results = {name: future.result() for name, future in futures.items()}
+    startup.mark("setup_done")
+
+    return (results["car"], results["camera"], results["mpu"],
+            results["model"], results.get("detector"), results["jtop"])
 
 
 def control_policy(road_center, objects, config):
@@ -81,77 +286,97 @@ def control_policy(road_center, objects, config):
     return throttle, steering
 
 
-def infer(image, model_trt, yolo_model=None):
-    image = preprocess(image).half()
+def infer(image, runner, profiler=NULL_PROFILER):
+    from wandb_jetracer.utils.xy_dataset import preprocess
 
-    objects = None
-    if yolo_model is not None:
-        objects = yolo_model(image, size=IMG_SIZE)[0]
-        objects = non_max_suppression(
-            objects,
-            yolo_model.conf,
-            iou_thres=yolo_model.iou
-        )
+    with profiler.span("preprocess"):
+        image = preprocess(image, runner.dtype, runner.device)
 
-    output = model_trt(image).squeeze()  # .detach().cpu().numpy().flatten()
-    x, y = float(output[0]), float(output[1])
+    # reading the output waits for the gpu, it's part of the model time
+    with profiler.span("model"):
+        output = runner(image).squeeze()
+        x, y = float(output[0]), float(output[1])
 
-    return (x, y), objects
+    return x, y
 
 
-def format_jetson_stats(stats):
-    s_metrics = ["GPU", "Temp GPU", "Temp CPU", "power avg", "power cur"]
-    system_stats = {k: stats[k] for k in s_metrics}
+def make_road_estimator(config):
+    """Estimator of the road center control_policy() steers on"""
+    return make_estimator(
+        config.estimator,
+        process_noise=config.process_noise,
+        gyro_gain=config.gyro_gain,
+    )
 
-    return system_stats
 
+def estimate_road_center(estimator, imu_values, now, clock, config):
+    """Road center when the next command takes effect"""
+    yaw_rate = imu_values.get("car/gyroscope_z")
+    if yaw_rate is not None:
+        estimator.update_yaw_rate(yaw_rate, now)
 
-def read_mpu(mpu):
-    accel_x, accel_y, accel_z = mpu.readAccelerometerMaster()
-    gyro_x, gyro_y, gyro_z = mpu.readGyroscopeMaster()
-    magneto_x, magneto_y, magneto_z = mpu.readMagnetometerMaster()
+    return estimator.estimate(clock() + config.actuation_delay)
 
-    # TODO: doesn't feel very pythonic, fix that
-    return {
-        "car/accelerometer_x": accel_x,
-        "car/accelerometer_y": accel_y,
-        "car/accelerometer_z": accel_z,
 
-        "car/gyrosope_x": gyro_x,
-        "car/gyroscope_y": gyro_y,
-        "car/gyroscope_z": gyro_z,
+def start_flight_recorder(config):
+    """Ring of the last seconds of driving, None if disabled"""
+    if not config.flight_recorder_seconds:
+        return None
 
-        "car/magnetometer_x": magneto_x,
-        "car/magnetometer_y": magneto_y,
-        "car/magnetometer_z": magneto_z,
-    }
+    # the previous run may have died without dumping it
+    path = recover(config.flight_recorder_dir, config.flight_recorder_dumps)
+    if path is not None:
+        logging.warning(f"Previous flight recorder ring dumped to {path}")
 
+    capacity = int(config.flight_recorder_seconds * config.framerate)
+    return FlightRecorder(
+        config.flight_recorder_dir, capacity, (IMG_SIZE, IMG_SIZE, 3),
+        max_dumps=config.flight_recorder_dumps,
+    )
 
-def format_detections(yolo_objects, names):
-    box_data = []
-    # add bboxes
+
+def dump_flight_recorder(recorder):
+    if recorder is None:
+        return
+    path = recorder.dump()
+    if path is not None:
+        logging.info(f"Flight recorder dumped to {path}")
+
+
+def start_imu(mpu, config, clock=time.monotonic):
+    """Sample the IMU in the background at its own rate"""
+    return IMUSampler(mpu, rate=config.imu_rate, clock=clock).start()
+
+
+def detection_boxes(yolo_objects):
+    """(minX, minY, maxX, maxY, conf, class) of every detection"""
     for det in yolo_objects:
         if len(det):
             for *xyxy, conf, cls in reversed(det):
-                c = int(cls)  # integer class
-                label = names[c]
-                minX, minY, maxX, maxY = xyxy
-                box = {
-                    "position": {
-                        "minX": int(minX),
-                        "maxX": int(maxX),
-                        "minY": int(minY),
-                        "maxY": int(maxY)
-                    },
-                    "domain": "pixel",
-                    "class_id": c,
-                    "box_caption": label,
-                    "scores": {
-                        "conf": float(conf),
-                    }
-                }
-
-                box_data.append(box)
+                yield (*xyxy, conf, int(cls))
+
+
+def format_detections(yolo_objects, names):
+    box_data = []
+    # add bboxes
+    for minX, minY, maxX, maxY, conf, c in detection_boxes(yolo_objects):
+        label = names[c]
+        box = {
+            "position": {
+                "minX": int(minX),
+                "maxX": int(maxX),
+                "minY": int(minY),
+                "maxY": int(maxY)
+            },
+            "domain": "pixel",
+            "class_id": c,
+            "box_caption": label,
+            "scores": {
+                "conf": float(conf),
+            }
+        }
+
+        box_data.append(box)
     boxes = {
         "predictions": {
             "box_data": box_data
@@ -161,86 +386,438 @@ def format_detections(yolo_objects, names):
     return boxes
 
 
-def drive(car, camera, mpu, model_trt, yolo_model, config):
-    logging.debug("Debug mode enabled")
-    logging.info("Starting to drive")
+def draw_debug_overlay(image, road_center, objects, names):
+    """Burn the road center and detection boxes into image (BGR)"""
+    if road_center is not None:
+        show_label(image, road_center)
+    if objects is not None:
+        for minX, minY, maxX, maxY, conf, c in detection_boxes(objects):
+            top_left = (int(minX), int(minY))
+            cv2.rectangle(image, top_left, (int(maxX), int(maxY)),
+                          (0, 0, 255), 1)
+            cv2.putText(image, f"{names[c]} {float(conf):.2f}", top_left,
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 255), 1)
+
+    return image
+
+
+def start_debug_video(config, detector, telemetry):
+    """
+    Records every frame, with its overlays, into video segments logged
+    as debug/video. None if debug frames are logged as images.
+    """
+    if not config.debug or config.debug_media != "video":
+        return None
+
+    names = detector.names if detector is not None else []
+    directory = config.debug_video_dir \
+        or time.strftime("debug_videos/%Y%m%d-%H%M%S")
+    logging.info(f"Recording debug videos in {directory}")
+
+    return VideoRecorder(
+        directory,
+        fps=config.framerate,
+        segment_frames=int(config.debug_video_seconds * config.framerate),
+        codec=config.debug_video_codec,
+        overlay=lambda image, road_center, objects: draw_debug_overlay(
+            image, road_center, objects, names
+        ),
+        on_segment=lambda video: telemetry.log({"debug/video": video}),
+    )
+
+
+def make_debug_log(image, road_center, objects, detector):
+    logging.debug("logging image")
+    image = show_label(image, road_center)
+    image = cv2.cvtColor(
+        image, cv2.COLOR_BGR2RGB
+    )
+
+    boxes = None
+    if detector is not None and objects is not None:
+        boxes = format_detections(objects, detector.names)
+        logging.debug(boxes)
+
+    return {
+        "inference/frame": Image(image, boxes=boxes),
+    }
+
+
+def start_jtop():
+    """Started jtop, None if it isn't installed (not a jetson)"""
+    try:
+        from jtop import jtop
+    except ImportError:
+        logging.warning("jtop isn't installed, "
+                        "reading system stats from /proc and /sys")
+        return None
 
     jetson = jtop()
     jetson.start()
 
+    return jetson
+
+
+def start_system_stats(jetson, config, clock=time.monotonic):
+    """Sample system stats in the background, from jtop if available"""
+    source = ProcSource() if jetson is None else JtopSource(jetson)
+    return SystemStats(
+        source, rate=config.system_stats_rate, clock=clock
+    ).start()
+
+
+def telemetry_columns(config, jetson=None):
+    """
+    Every scalar drive() and drive_pipelined() log, the run store only
+    keeps the ones declared here
+    """
+    source = ProcSource if jetson is None else JtopSource
+    spans = [*STAGE_BUDGETS, "preprocess", "model", "flight_recorder",
+             "logging"]
+    pipeline_stages = ["capture", "inference", "actuation", "telemetry"]
+    setup_tasks = ["car", "camera", "mpu", "jtop", "model", "detector"]
+    tasks = ["wandb_init", "resolve_model", "load_model", "warm_up_model",
+             *(f"setup_{task}" for task in setup_tasks)]
+
+    return [
+        "inference/seconds",
+        "car/steering",
+        "car/throttle",
+        *IMU_KEYS,
+        *IMU_STATS_KEYS,
+        *source.keys(),
+        STATS_AGE_KEY,
+        *ControlScheduler.stats_keys(STAGE_BUDGETS),
+        *estimator_class(config.estimator).STATS_KEYS,
+        *Profiler.report_keys(spans),
+        *DETECTOR_STATS_KEYS,
+        "detector/staleness_seconds",
+        *VIDEO_STATS_KEYS,
+        *Pipeline.stats_keys(pipeline_stages),
+        *StartupTimer.report_keys(tasks, ["setup_done", "first_command"]),
+    ]
+
+
+def make_telemetry(config, jetson=None):
+    if config.telemetry_backend == "store":
+        path = config.run_store or time.strftime("runs/%Y%m%d-%H%M%S")
+        logging.info(f"Storing telemetry in {path}, "
+                     "upload it with sync_run.py")
+    else:
+        path = config.telemetry_file
+    # what the run is synced with
+    run_config = config.as_dict() if hasattr(config, "as_dict") \
+        else vars(config)
+
+    columns = reduced_columns(
+        telemetry_columns(config, jetson), config.telemetry_mode
+    )
+
+    return TelemetrySink(
+        make_backend(config.telemetry_backend, path, run_config, columns),
+        flush_hz=config.telemetry_rate,
+        mode=config.telemetry_mode,
+    )
+
+
+def report_startup(startup, telemetry):
+    """Log how long it took to send the first steering command"""
+    startup.mark("first_command")
+    logging.info(f"Startup timeline:\n{startup.summary()}")
+    telemetry.log(startup.report())
+
+
+def drive(car, camera, mpu, runner, detector, telemetry, config,
+          jetson=None, startup=None, clock=time.monotonic,
+          sleep=time.sleep):
+    logging.debug("Debug mode enabled")
+    logging.info("Starting to drive")
+
+    # setup() already tried jtop, without it stats come from /proc
+    system_stats = start_system_stats(jetson, config, clock)
+
+    profiler = Profiler(enabled=config.profile)
+    scheduler = ControlScheduler(
+        car,
+        period=1 / config.framerate,
+        watchdog_timeout=config.watchdog_timeout,
+        watchdog_interval=WATCHDOG_INTERVAL,
+        budgets=STAGE_BUDGETS,
+        profiler=profiler,
+        clock=clock,
+        sleep=sleep,
+    )
+    # let the camera capture in the background so reads never block
+    camera.running = True
+    read_frame = LatestFrame(camera, clock)
+    detections = start_detector(detector, config, clock)
+    imu = start_imu(mpu, config, clock)
+    estimator = make_road_estimator(config)
+    recorder = start_flight_recorder(config)
+    video = start_debug_video(config, detector, telemetry)
+
     frame_count = 0
+    done = False
 
-    while True:
-        image = camera.read()
+    def step(image, captured_at):
+        nonlocal frame_count, done
         inference_start = time.time()
         debug_log = {}
 
-        imu_values = read_mpu(mpu)
-        road_center, objects = infer(image, model_trt, yolo_model)
-        car.throttle, car.steering = control_policy(
-            road_center,
-            objects,
-            config
-        )
+        now = clock()
+        if detections is not None:
+            detections.submit(image, captured_at)
 
-        if config.debug:
-            frame_count += 1
-            if frame_count % config.debug_freq == 0:
-                logging.debug("logging image")
-                image = show_label(image, road_center)
-                image = cv2.cvtColor(
-                    image, cv2.COLOR_BGR2RGB
-                )
+        # IMU sample interpolated at the time the frame was captured
+        with scheduler.stage("read_mpu"):
+            imu_values = imu.log_at(captured_at)
+        # in between, the estimator keeps track of the road center
+        prediction = None
+        if frame_count % config.infer_every == 0:
+            with scheduler.stage("infer"):
+                prediction = infer(image, runner, profiler)
+            estimator.update(prediction, captured_at)
+        objects, detections_log = latest_detections(detections, now)
+        with scheduler.stage("control_policy"):
+            road_center = estimate_road_center(
+                estimator, imu_values, captured_at, clock, config
+            )
+            car.throttle, car.steering = control_policy(
+                road_center,
+                objects,
+                config
+            )
+        if recorder is not None:
+            with profiler.span("flight_recorder"):
+                recorder.record(captured_at, image, prediction,
+                                car.steering, car.throttle, imu_values)
 
-                boxes = None
-                if config.yolo:
-                    boxes = format_detections(objects, yolo_model.names)
-                    logging.debug(boxes)
+        frame_count += 1
+        if frame_count == 1 and startup is not None:
+            report_startup(startup, telemetry)
 
-                debug_log = {
-                    "inference/frame": wandb.Image(image, boxes=boxes),
-                }
+        if config.debug:
+            if video is not None:
+                video.submit(image, inference_start, road_center, objects)
+            elif frame_count % config.debug_freq == 0:
+                debug_log = make_debug_log(
+                    image, road_center, objects, detector
+                )
 
             is_done = frame_count == config.framerate * config.debug_seconds
             if is_done:
                 logging.debug(f"frame count: {frame_count}")
                 logging.debug("end debug")
-                break
+                done = True
+                return
 
-        system_stats = format_jetson_stats(jetson.stats)
+        with profiler.span("logging"):
+            inference_end = time.time()
+            inference_seconds = (inference_end - inference_start)
 
-        inference_end = time.time()
-        inference_seconds = (inference_end - inference_start)
+            log = {
+                "inference/seconds": inference_seconds,
+                "car/steering": car.steering,
+                "car/throttle": car.throttle
+            }
+
+            # percentiles and stats are only computed once per second
+            if frame_count % config.framerate == 0:
+                log.update(profiler.report())
+                log.update(imu.stats())
+                log.update(estimator.stats())
+                log.update(system_stats.snapshot(now))
+                log.update(scheduler.stats())
+                if detections is not None:
+                    log.update(detections.stats())
+                if video is not None:
+                    log.update(video.stats())
+
+            telemetry.log({
+                **log, **debug_log, **imu_values, **detections_log
+            })
+
+    try:
+        scheduler.run(read_frame, step, should_stop=lambda: done)
+    finally:
+        car.throttle = 0
+        read_frame.close()
+        imu.stop()
+        system_stats.stop()
+        dump_flight_recorder(recorder)
+        if video is not None:
+            video.close()
+            logging.info(f"Debug video stats: {video.stats()}")
+        logging.info(f"Scheduler stats: {scheduler.stats()}")
+        if detections is not None:
+            detections.stop()
+            logging.info(f"Detector stats: {detections.stats()}")
+        if profiler.enabled:
+            logging.info(f"Stage latencies: {profiler.report()}")
+
+
+def drive_pipelined(car, camera, mpu, runner, detector, telemetry,
+                    config, jetson=None, startup=None):
+    """
+    Same as drive() but capture, inference, actuation and logging
+    each run on their own thread, connected by latest-value-wins queues.
+    The car always acts on the freshest prediction and slow logging
+    never delays the next steering command.
+    """
+    logging.debug("Debug mode enabled")
+    logging.info("Starting to drive (pipelined)")
+
+    # setup() already tried jtop, without it stats come from /proc
+    system_stats = start_system_stats(jetson, config)
+
+    frame_count = 0
+    first_command = True
+    watchdog = Watchdog(car, config.watchdog_timeout)
+    detections = start_detector(detector, config)
+    imu = start_imu(mpu, config)
+    # only used by the actuation thread
+    estimator = make_road_estimator(config)
+    recorder = start_flight_recorder(config)
+    video = start_debug_video(config, detector, telemetry)
+
+    def capture():
+        # stamped before read(), which also converts the frame
+        capture_clock = time.monotonic()
+        capture_time = time.time()
+        image = camera.read()
+        if detections is not None:
+            detections.submit(image, capture_clock)
+        return image, capture_time, capture_clock
+
+    def inference(frame):
+        image, capture_time, capture_clock = frame
+        imu_values = imu.log_at(capture_clock)
+        road_center = infer(image, runner)
+
+        return image, capture_time, capture_clock, road_center, imu_values
+
+    def actuation(inference_output):
+        nonlocal first_command
+        (image, capture_time, capture_clock, prediction,
+         imu_values) = inference_output
+        objects, detections_log = latest_detections(detections)
+        estimator.update(prediction, capture_clock)
+        road_center = estimate_road_center(
+            estimator, imu_values, capture_clock, time.monotonic, config
+        )
+        car.throttle, car.steering = control_policy(
+            road_center,
+            objects,
+            config
+        )
+        if recorder is not None:
+            recorder.record(capture_clock, image, prediction, car.steering,
+                            car.throttle, imu_values)
+        watchdog.feed()
+        if first_command and startup is not None:
+            first_command = False
+            report_startup(startup, telemetry)
 
         log = {
-            "inference/seconds": inference_seconds,
+            "inference/seconds": time.time() - capture_time,
             "car/steering": car.steering,
             "car/throttle": car.throttle
         }
 
-        wandb.log({**log, **debug_log, **system_stats, **imu_values})
+        return image, capture_time, road_center, objects, {
+            **log, **imu_values, **detections_log
+        }
+
+    def logging_stage(record):
+        nonlocal frame_count
+        image, capture_time, road_center, objects, log = record
+
+        debug_log = {}
+        frame_count += 1
+        if video is not None:
+            video.submit(image, capture_time, road_center, objects)
+        elif config.debug and frame_count % config.debug_freq == 0:
+            debug_log = make_debug_log(
+                image, road_center, objects, detector
+            )
+
+        if frame_count % config.framerate == 0:
+            log.update(imu.stats())
+            log.update(estimator.stats())
+            log.update(system_stats.snapshot())
+            log.update(pipeline.stats())
+            if detections is not None:
+                log.update(detections.stats())
+            if video is not None:
+                log.update(video.stats())
+
+        telemetry.log({**log, **debug_log})
+
+    pipeline = Pipeline([
+        ("capture", capture),
+        ("inference", inference),
+        ("actuation", actuation),
+        ("telemetry", logging_stage),
+    ])
+    pipeline.start()
+
+    start = time.time()
+    try:
+        while not pipeline.failed:
+            time.sleep(WATCHDOG_INTERVAL)
+            watchdog.check()
+            elapsed = time.time() - start
+            if config.debug and elapsed >= config.debug_seconds:
+                logging.debug("end debug")
+                break
+    finally:
+        pipeline.stop()
+        car.throttle = 0
+        imu.stop()
+        system_stats.stop()
+        dump_flight_recorder(recorder)
+        if video is not None:
+            video.close()
+            logging.info(f"Debug video stats: {video.stats()}")
+        logging.info(f"Pipeline stats: {pipeline.stats()}")
+        if detections is not None:
+            detections.stop()
+            logging.info(f"Detector stats: {detections.stats()}")
 
 
 def main(args):
-    with wandb.init(
-        project=args.project,
-        job_type="inference",
-        config=args,
-        entity=args.entity,
-    ) as run:
+    check_offline_model(args)
+
+    startup = StartupTimer()
+    with startup.task("wandb_init"):
+        run = wandb.init(
+            project=args.project,
+            job_type="inference",
+            config=args,
+            entity=args.entity,
+            # offline, the run is synced later from the store
+            mode="disabled" if args.telemetry_backend == "store" else None,
+        )
 
+    with run:
         config = run.config
         setup_logging(config)
 
-        car, camera, mpu, model_trt, yolo_model = setup(config)
+        car, camera, mpu, runner, detector, jetson = setup(config, startup)
 
+        telemetry = make_telemetry(config, jetson)
+
+        drive_fn = drive_pipelined if config.pipelined else drive
         try:
-            drive(car, camera, mpu, model_trt, yolo_model, config)
+            drive_fn(car, camera, mpu, runner, detector, telemetry,
+                     config, jetson=jetson, startup=startup)
         except KeyboardInterrupt:
             pass
+        finally:
+            telemetry.close()
 
 
-def parse_args():
+def make_parser():
     parser = argparse.ArgumentParser(
         description="Run the optimized model on the car",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
@@ -250,7 +827,8 @@ def parse_args():
         "--framerate",
         type=int,
         default=10,
-        help="How many images to analyze per second"
+        help="How many images to analyze per second. \
+             Also sets the control loop rate."
     )
     parser.add_argument(
         "--yolo",
@@ -258,6 +836,146 @@ def parse_args():
         help="If specified, will run images through yolo \
              and log predictions to wandb.",
     )
+    parser.add_argument(
+        "--detection_rate",
+        type=float,
+        default=2,
+        help="Max number of frames/s the detector runs on, in the \
+             background. 0 = as fast as it can.",
+    )
+    parser.add_argument(
+        "--detection_every",
+        type=int,
+        default=1,
+        help="Only offer every Nth frame to the detector.",
+    )
+    parser.add_argument(
+        "--imu_rate",
+        type=float,
+        default=100,
+        help="How many times per second the IMU is sampled, \
+             in the background.",
+    )
+    parser.add_argument(
+        "--system_stats_rate",
+        type=float,
+        default=1,
+        help="How many times per second GPU load, temperatures and \
+             power are sampled, in the background.",
+    )
+    parser.add_argument(
+        "--estimator",
+        type=str,
+        default="none",
+        choices=ESTIMATORS,
+        help="Steer on the raw prediction of the last frame (none) or \
+             on the road center tracked by a Kalman filter, projected \
+             to when the command takes effect.",
+    )
+    parser.add_argument(
+        "--process_noise",
+        type=float,
+        default=10.0,
+        help="Kalman filter: how fast the road center velocity can \
+             change. Higher = follows predictions more closely.",
+    )
+    parser.add_argument(
+        "--gyro_gain",
+        type=float,
+        default=None,
+        help="Kalman filter: fuse gyroscope z * gyro_gain as the \
+             road center x velocity. None = the IMU isn't used.",
+    )
+    parser.add_argument(
+        "--actuation_delay",
+        type=float,
+        default=0.0,
+        help="Seconds between sending a command and the car reacting, \
+             the estimated road center is projected that far ahead.",
+    )
+    parser.add_argument(
+        "--infer_every",
+        type=int,
+        default=1,
+        help="Only run the model every Nth control loop period, \
+             in between the car steers on the estimated road center. \
+             Not used with --pipelined.",
+    )
+    parser.add_argument(
+        "--flight_recorder_seconds",
+        type=float,
+        default=30,
+        help="Keep every frame, prediction, command and IMU sample of \
+             the last seconds in a ring on disk, dumped to a replayable \
+             session when driving stops. 0 = disabled.",
+    )
+    parser.add_argument(
+        "--flight_recorder_dir",
+        type=str,
+        default=DEFAULT_RECORDER_DIR,
+        help="Where the flight recorder ring and dumps are kept.",
+    )
+    parser.add_argument(
+        "--flight_recorder_dumps",
+        type=int,
+        default=DEFAULT_MAX_DUMPS,
+        help="Number of flight recorder dumps to keep, older ones are \
+             deleted.",
+    )
+    parser.add_argument(
+        "--watchdog_timeout",
+        type=float,
+        default=0.5,
+        help="Stop the car if no fresh prediction was made \
+             for that many seconds.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="If specified, time each stage of the control loop \
+             and log their p50/p95/p99 latencies.",
+    )
+    parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="If specified, capture, inference, actuation and logging \
+             run on separate threads.",
+    )
+    parser.add_argument(
+        "--telemetry_rate",
+        type=float,
+        default=1.0,
+        help="How many times per second telemetry is flushed.",
+    )
+    parser.add_argument(
+        "--telemetry_mode",
+        type=str,
+        default="aggregate",
+        choices=["downsample", "aggregate"],
+        help="Keep the last value of each metric between flushes \
+             or log their mean/min/max/p99.",
+    )
+    parser.add_argument(
+        "--telemetry_backend",
+        type=str,
+        default="wandb",
+        choices=["wandb", "file", "store"],
+        help="Where to flush telemetry to. store = a local run store \
+             that works offline, see sync_run.py.",
+    )
+    parser.add_argument(
+        "--telemetry_file",
+        type=str,
+        default="telemetry.jsonl",
+        help="Output file for the file telemetry backend.",
+    )
+    parser.add_argument(
+        "--run_store",
+        type=str,
+        default=None,
+        help="Directory of the store telemetry backend. \
+             None = runs/<date>-<time>.",
+    )
     parser.add_argument(
         "-d",
         "--debug",
@@ -273,7 +991,37 @@ def parse_args():
         "--debug_freq",
         type=int,
         default=10,
-        help="How many frames between each logged image",
+        help="How many frames between each logged image, \
+             with --debug_media images.",
+    )
+    parser.add_argument(
+        "--debug_media",
+        type=str,
+        default="video",
+        choices=["video", "images"],
+        help="In debug mode, record every frame into video segments \
+             or log an image every --debug_freq frames.",
+    )
+    parser.add_argument(
+        "--debug_video_seconds",
+        type=float,
+        default=10,
+        help="Length of each debug video segment, logged once complete.",
+    )
+    parser.add_argument(
+        "--debug_video_codec",
+        type=str,
+        default=DEFAULT_CODEC,
+        choices=list(CODECS),
+        help="Codec of the debug videos, avc1 (h264) if opencv \
+             was built with it. wandb can't play mp4v videos.",
+    )
+    parser.add_argument(
+        "--debug_video_dir",
+        type=str,
+        default=None,
+        help="Where debug videos are recorded. \
+             None = debug_videos/<date>-<time>.",
     )
     parser.add_argument(
         "--project",
@@ -306,8 +1054,37 @@ def parse_args():
         type=str,
         help="Path to local model. Bypasses artifacts if specified.",
     )
+    parser.add_argument(
+        "--model_cache",
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+        help="Models found here (e.g optimized by trt_optim.py on the \
+             car) are used without asking wandb.",
+    )
+    parser.add_argument(
+        "--refresh_model",
+        action="store_true",
+        help="Resolve the model version on wandb even if it's cached.",
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        default="trt",
+        choices=BACKENDS,
+        help="How to run the model. Overridden by the artifact metadata.",
+    )
+    parser.add_argument(
+        "--architecture",
+        type=str,
+        default=None,
+        help="Model architecture, needed to load local torch models.",
+    )
     # TODO add model version as param
-    return parser.parse_args()
+    return parser
+
+
+def parse_args():
+    return make_parser().parse_args()
 
 
 if __name__ == "__main__":
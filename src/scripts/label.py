@@ -5,69 +5,75 @@ import os
 import cv2
 import wandb
 
-from wandb_jetracer.utils.utils import setup_logging, label_img
+from wandb_jetracer.utils.dataset_sync import DatasetSync, WandbStore
+from wandb_jetracer.utils.labelling import LabellingSession, suggest_labels
+from wandb_jetracer.utils.utils import setup_logging
 
 
 class ImageLabeller:
-    def __init__(self, directory):
-        self.directory = directory
-        self.count_deleted = 0
-
-        self.get_non_labelled_imgs()
-        logging.info(f"{len(self.to_label)} images to label out of "
-                     f"{len(os.listdir(self.directory))}")
-
-        to_label_len = len(self.to_label)
+    def __init__(self, directory, prefetch=8, runner=None, batch_size=32):
+        self.session = LabellingSession(directory, prefetch=prefetch)
+        if runner is not None:
+            self.prelabel(runner, batch_size)
+        logging.info(f"{len(self.session.pending)} images to label out of "
+                     f"{self.session.total}")
 
         self.label()
 
-        self.get_non_labelled_imgs()
-        self.count_labelled = to_label_len - len(self.to_label)
-        self.count_labelled -= self.count_deleted
-
+        self.count_labelled, self.count_deleted = self.session.commit()
         logging.info(f"{self.count_labelled} images labelled, "
                      f"{self.count_deleted} deleted.")
 
-    def get_non_labelled_imgs(self):
-        self.to_label = []
-        for fname in os.listdir(self.directory):
-            already_labeled = "_" in fname
-            if fname.endswith(".jpg") and not already_labeled:
-                self.to_label.append(fname)
+    def prelabel(self, runner, batch_size):
+        """Suggest a label for the images that don't have one yet"""
+        fnames = [
+            fname for fname in self.session.pending
+            if fname not in self.session.suggestions
+        ]
+        logging.info(f"Pre-labelling {len(fnames)} images")
+        self.session.add_suggestions(
+            suggest_labels(runner, self.session.directory, fnames, batch_size)
+        )
 
     def label(self):
-        for fname in self.to_label:
-            # reading the image
-            self.current_path = os.path.join(self.directory, fname)
-            self.current_img = cv2.imread(self.current_path, 1)
-
-            # displaying the image
-            imshow_fullscreen(self.current_img)
-
-            # setting mouse handler for the image
-            # and calling the click_event() function
-            cv2.setMouseCallback("image", self.click_event)
+        # the window is created once, images are decoded in the background
+        imshow_fullscreen(None)
+        cv2.setMouseCallback("image", self.click_event)
+
+        for fname, image in self.session.images():
+            if image is None:
+                logging.warning(f"Couldn't read {fname}, skipping it")
+                continue
+
+            self.current_fname = fname
+            self.current_img = image
+            suggestion = self.session.suggestion(fname)
+            if suggestion is not None:
+                image = image.copy()
+                cv2.circle(image, suggestion, 5, (0, 0, 255), 2)
+            cv2.imshow("image", image)
 
             # wait for key to be pressed
             key = cv2.waitKey(0)
-            if key == 100:  # d
-                os.remove(self.current_path)
-                self.count_deleted += 1
-                logging.info(f"deleted {self.current_path}")
+            if key == 97 and suggestion is not None:  # a
+                self.session.label(fname, *suggestion)
+                logging.debug(f"accepted {suggestion} for {fname}")
+            elif key == 100:  # d
+                self.session.delete(fname)
+                logging.info(f"deleted {fname}")
             elif key == 113:  # q
-                cv2.destroyAllWindows()
                 break
 
-            cv2.destroyAllWindows()
+        cv2.destroyAllWindows()
 
     def click_event(self, event, x, y, flags, param):
-        """Display the clicked coordinates and add those the image filename"""
+        """Display the clicked coordinates and record them as the label"""
 
         # checking for left mouse clicks
         if event == cv2.EVENT_LBUTTONDOWN:
             # displaying the coordinates
             logging.debug(f"{x}, {y} clicked")
-            self.current_path = label_img(x, y, self.current_path)
+            self.session.label(self.current_fname, x, y)
 
             tmp = self.current_img.copy()
             cv2.circle(tmp, (x, y), 5, (0, 255, 0), 2)
@@ -81,7 +87,20 @@ def imshow_fullscreen(img):
         cv2.WND_PROP_FULLSCREEN,
         cv2.WINDOW_FULLSCREEN
     )
-    cv2.imshow("image", img)
+    if img is not None:
+        cv2.imshow("image", img)
+
+
+def load_model(run, config):
+    # torch is only needed to pre-label
+    from wandb_jetracer.utils.runners import MODEL_FILES, load_runner
+
+    logging.info(f"Downloading {config.model}")
+    artifact = run.use_artifact(config.model)
+    model_path = os.path.join(artifact.download(), MODEL_FILES["torch"])
+    architecture = artifact.logged_by().config["architecture"]
+
+    return load_runner("torch", model_path, architecture, device="cpu")
 
 
 def main(args):
@@ -96,28 +115,36 @@ def main(args):
 
         setup_logging(config)
 
-        # download dataset
-        artifact_loc = f"{config.entity}/{config.project}/" +\
-            f"{config.dataset}:latest"
-        logging.info(f"downloading {artifact_loc}")
-        dataset = run.use_artifact(artifact_loc, type="dataset")
-        artifact_dir = dataset.download()
-
-        labeller = ImageLabeller(artifact_dir)
-
-        if labeller.count_labelled > 0:
+        # only download the images that still need a label
+        logging.info(f"downloading {config.dataset}:latest")
+        sync = DatasetSync(
+            WandbStore(run),
+            config.dataset,
+            os.path.join("artifacts", config.dataset)
+        )
+        sync.pull(select=lambda path: "_" not in os.path.basename(path))
+
+        runner = load_model(run, config) if config.prelabel else None
+        labeller = ImageLabeller(
+            sync.directory,
+            prefetch=config.prefetch,
+            runner=runner,
+            batch_size=config.batch_size,
+        )
+
+        if labeller.count_labelled > 0 or labeller.count_deleted > 0:
             logging.info("Saving changes to artifact")
-            artifact = wandb.Artifact(config.dataset, type="dataset")
-            artifact.add_dir(artifact_dir)
-            run.log_artifact(artifact)
+            sync.push()
 
 
 def parse_args():
     parser = argparse.ArgumentParser(
         description="Tool to label images for regression. "
                     "Save x,y coords in the filename. \n"
-                    "Controls: Label: click, delete img: d, quit: q, "
-                    "next image: any key",
+                    "Controls: Label: click, accept suggestion: a, "
+                    "delete img: d, quit: q, next image: any key. "
+                    "Labels are saved when quitting, an interrupted "
+                    "session is resumed.",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
     )
     parser.add_argument("dataset", type=str, help="Dataset artifact to label")
@@ -134,6 +161,30 @@ def parse_args():
         default=None,
         help="Entity the project belongs to. None = you."
     )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=8,
+        help="Number of images decoded ahead of the one being labelled."
+    )
+    parser.add_argument(
+        "--prelabel",
+        action="store_true",
+        help="Suggest labels with a trained model (needs torch), \
+             the most uncertain images are shown first."
+    )
+    parser.add_argument(
+        "--model",
+        type=str,
+        default="model:latest",
+        help="Model artifact used to pre-label."
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=32,
+        help="Number of images pre-labelled at once, on cpu."
+    )
     parser.add_argument(
         "-d",
         "--debug",
@@ -0,0 +1,127 @@
+import json
+import logging
+import time
+
+import numpy as np
+
+from drive import (control_policy,
+                   drive,
+                   infer,
+                   load_model,
+                   make_parser,
+                   make_telemetry)
+from wandb_jetracer.utils.instrumentation import StartupTimer
+from wandb_jetracer.utils.replay import (EndOfSession,
+                                         FakeCamera,
+                                         FakeCar,
+                                         FakeDetector,
+                                         FakeJtop,
+                                         FakeMPU,
+                                         ReplayClock,
+                                         Session,
+                                         make_report)
+from wandb_jetracer.utils.utils import setup_logging
+
+
+def reference_steering(session, runner, config):
+    """Steering of the model run on every frame, without latency"""
+    return [
+        control_policy(infer(frame, runner), None, config)[1]
+        for frame in session.frames
+    ]
+
+
+def replay(session, runner, config, startup=None):
+    clock = ReplayClock(fast=not config.realtime)
+    camera = FakeCamera(session, clock, realtime=config.realtime)
+    car = FakeCar(camera, clock)
+    mpu = FakeMPU(session, camera)
+    detector = None
+    if config.fake_detector_seconds is not None:
+        detector = FakeDetector(config.fake_detector_seconds)
+
+    jetson = FakeJtop()
+    telemetry = make_telemetry(config, jetson)
+
+    start = time.time()
+    try:
+        drive(car, camera, mpu, runner, detector, telemetry, config,
+              jetson=jetson, startup=startup, clock=clock,
+              sleep=clock.sleep)
+    except EndOfSession:
+        pass
+    finally:
+        telemetry.close()
+    wall_seconds = time.time() - start
+
+    reference = None
+    if config.steering_error:
+        logging.info("Computing the reference steering of every frame")
+        reference = reference_steering(session, runner, config)
+
+    return make_report(camera, car, wall_seconds, reference)
+
+
+def main(args):
+    setup_logging(args)
+
+    logging.info(f"Loading session {args.session}")
+    session = Session.load(args.session)
+
+    startup = StartupTimer()
+    runner = load_model(args, startup)
+    report, trace = replay(session, runner, args, startup)
+
+    print(json.dumps(report, indent=2))
+    if args.trace is not None:
+        np.savetxt(args.trace, trace, delimiter=",", fmt="%.6f",
+                   header="time,frame,steering,throttle", comments="")
+
+
+def parse_args():
+    parser = make_parser()
+    parser.description = "Run the drive loop on a recorded session, " \
+                         "without the car."
+    parser.add_argument(
+        "session",
+        type=str,
+        help="Session .npz file or directory of collected images."
+    )
+    parser.add_argument(
+        "--realtime",
+        action="store_true",
+        help="If specified, replay frames at their original timing. \
+             Otherwise every frame is processed as fast as possible.",
+    )
+    parser.add_argument(
+        "--fake_detector_seconds",
+        type=float,
+        default=None,
+        help="Run a stand-in detector taking that long per frame \
+             in the background, see --detection_rate.",
+    )
+    parser.add_argument(
+        "--steering_error",
+        action="store_true",
+        help="If specified, also run the model on every frame and report \
+             how far the steering commands were from it when sent, \
+             e.g to compare --estimator and --infer_every settings.",
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        help="Where to save the steering trace (csv).",
+    )
+    parser.set_defaults(telemetry_backend="file", flight_recorder_seconds=0)
+
+    args = parser.parse_args()
+    if args.local_model is None:
+        parser.error("--local_model is required to replay a session")
+
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
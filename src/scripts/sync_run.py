@@ -0,0 +1,97 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+import wandb
+
+from wandb_jetracer.utils.run_store import SYNCED_FILE, RunReader
+from wandb_jetracer.utils.telemetry import to_wandb
+from wandb_jetracer.utils.utils import setup_logging
+
+
+def sync(reader, run):
+    """Log every stored row to run, returns the number of rows"""
+    count = 0
+    for step, row in reader.rows():
+        # rows without scalars leave gaps, keep them aligned
+        run.log(to_wandb(row, wandb), step=step)
+        count += 1
+
+    return count
+
+
+def main(args):
+    setup_logging()
+    synced_path = os.path.join(args.store, SYNCED_FILE)
+    if os.path.exists(synced_path) and not args.force:
+        with open(synced_path) as f:
+            logging.error(f"{args.store} was already synced to run "
+                          f"{json.load(f)['id']}, use --force to sync "
+                          "it again")
+        return False
+
+    reader = RunReader(args.store)
+    config = reader.config
+    run = wandb.init(
+        project=args.project or config.get("project", "racecar"),
+        entity=args.entity or config.get("entity"),
+        job_type="inference",
+        config=config,
+        name=args.name,
+    )
+    with run:
+        count = sync(reader, run)
+        logging.info(f"Synced {count} rows to {run.url}")
+
+    with open(synced_path, "w") as f:
+        json.dump({"id": run.id, "url": run.url}, f)
+
+    return True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Upload a run stored offline by drive.py "
+                    "(--telemetry_backend store) to wandb.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument(
+        "store",
+        type=str,
+        help="Run store directory, e.g runs/20210101-120000."
+    )
+    parser.add_argument(
+        "--project",
+        type=str,
+        default=None,
+        help="Project to log the run in. None = the one it was driven with."
+    )
+    parser.add_argument(
+        "-e",
+        "--entity",
+        type=str,
+        default=None,
+        help="Entity the project belongs to. None = the one it was \
+             driven with, or you."
+    )
+    parser.add_argument(
+        "--name",
+        type=str,
+        default=None,
+        help="Name of the wandb run. None = generated by wandb."
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="If specified, sync the run even if it already was."
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not main(args):
+        sys.exit(1)
@@ -1,31 +1,107 @@
 import argparse
 import logging
 import os
+import sys
 
-import torch
-import torchvision
 import wandb
 
+from wandb_jetracer.utils.model_cache import (DEFAULT_CACHE_DIR,
+                                              MODEL_ARTIFACTS,
+                                              ModelCache,
+                                              cache_key)
+from wandb_jetracer.utils.quantization import (accuracy_regressed,
+                                               calibration_batches,
+                                               evaluate,
+                                               quantize_onnx,
+                                               quantize_trt)
+from wandb_jetracer.utils.runners import (IMG_SIZE,
+                                          MODEL_FILES,
+                                          TorchRunner,
+                                          export_model,
+                                          load_model,
+                                          load_runner,
+                                          max_abs_error)
 from wandb_jetracer.utils.utils import setup_logging
-from torch2trt import torch2trt
+from wandb_jetracer.utils.xy_dataset import XYDataset
+
+INPUT_SHAPE = (1, 3, IMG_SIZE, IMG_SIZE)
+# precision each backend is exported with, unless quantized
+PRECISIONS = {
+    "trt": "fp16",
+    "torchscript": "fp32",
+    "onnx": "fp32",
+}
+
+
+def convert(model, backend, int8=False, calibration=None):
+    logging.info(f"Optimizing model for {backend}"
+                 f"{' in int8' if int8 else ''}...")
+    path = MODEL_FILES[backend]
+    if not int8:
+        return export_model(model, backend, path)
+
+    if backend == "trt":
+        return quantize_trt(model, path, calibration)
+    elif backend == "onnx":
+        fp32_path = export_model(model, backend, "model.fp32.onnx")
+        return quantize_onnx(fp32_path, path, calibration)
+    raise ValueError(f"int8 isn't supported for {backend}, "
+                     "use the trt or onnx backend")
+
+
+def optimize(config, artifact, architecture, dataset_artifact):
+    """
+    Convert and evaluate the model, returns the optimized model path and
+    its metadata, None if its accuracy regressed too much.
+    """
+    logging.info("Downloading non optimized model")
+    model_pth = os.path.join(artifact.download(), "model.pth")
+
+    logging.info(f"Downloading {config.dataset}")
+    dataset_dir = dataset_artifact.download()
+    test_set = XYDataset(os.path.join(dataset_dir, "test"), train=False)
 
-
-def convert(model_pth, model_architecture, model_out_dims):
     logging.info("Creating model architecture")
-    model = torchvision.models.__dict__[model_architecture](pretrained=False)
-
-    model.fc = torch.nn.Linear(model.fc.in_features, model_out_dims)
-    model = model.cuda().eval().half()
-
-    model.load_state_dict(torch.load(model_pth))
-
-    # dummy input
-    data = torch.zeros((1, 3, 224, 224)).cuda().half()
-
-    logging.info("Optimizing model...")
-    model_trt = torch2trt(model, [data], fp16_mode=True)
-
-    return model_trt
+    model = load_model(model_pth, architecture, 2)
+    reference = evaluate(TorchRunner(model, half=False), test_set)
+
+    calibration = None
+    if config.int8:
+        logging.info(f"Calibrating on {config.calibration_size} images")
+        calibration = calibration_batches(
+            XYDataset(os.path.join(dataset_dir, "train"), train=False),
+            config.calibration_size,
+        )
+    model_path = convert(model, config.backend, config.int8, calibration)
+
+    # make sure the optimized model still agrees with the original one
+    runner = load_runner(config.backend, model_path)
+    error = max_abs_error(model, runner)
+    logging.info(f"Max abs error vs original model: {error}")
+
+    metrics = evaluate(runner, test_set)
+    if accuracy_regressed(
+        metrics["test_mse"],
+        reference["test_mse"],
+        config.max_mse_regression,
+    ):
+        logging.error(f"Test mse went from {reference['test_mse']:.5f} "
+                      f"to {metrics['test_mse']:.5f}, more than "
+                      f"{config.max_mse_regression:.0%} worse. "
+                      "Not uploading the model.")
+        return None
+
+    metadata = {
+        "backend": config.backend,
+        "architecture": architecture,
+        "dtype": str(runner.dtype),
+        "max_abs_error": error,
+        "dataset": config.dataset,
+        **metrics,
+        **{f"reference_{k}": v for k, v in reference.items()},
+    }
+
+    return model_path, metadata
 
 
 def main(args):
@@ -35,29 +111,70 @@ def main(args):
         job_type="trt-optimization",
         entity=args.entity
     ) as run:
+        config = run.config
         setup_logging()
 
-        logging.info("Downloading non optimized model")
         artifact = run.use_artifact("model:latest")
-        artifact_dir = artifact.download()
+        dataset_artifact = run.use_artifact(config.dataset)
 
         # fetching the model architecture from the producer run
         producer_run = artifact.logged_by()
         model_architecture = producer_run.config["architecture"]
-        model_pth = os.path.join(artifact_dir, "model.pth")
 
-        model_trt = convert(model_pth, model_architecture, 2)
-
-        # evaluate model
-        # TODO
-
-        # save the model for inference
-        logging.info("Saving model and uploading it to wandb...")
-        torch.save(model_trt.state_dict(), "trt-model.pth")
-
-        trt_artifact = wandb.Artifact("trt-model", type="model")
-        trt_artifact.add_file("trt-model.pth")
-        run.log_artifact(trt_artifact)
+        precision = "int8" if config.int8 else PRECISIONS[config.backend]
+        # int8 models also depend on the images they're calibrated on
+        calibration = {}
+        if config.int8:
+            calibration = dict(
+                calibration_digest=dataset_artifact.digest,
+                calibration_size=config.calibration_size,
+            )
+        key = cache_key(
+            artifact.digest,
+            model_architecture,
+            config.backend,
+            precision,
+            INPUT_SHAPE,
+            **calibration,
+        )
+
+        cache = ModelCache(config.model_cache)
+        cached = cache.get(key)
+        if cached is None:
+            optimized = optimize(
+                config, artifact, model_architecture, dataset_artifact
+            )
+            if optimized is None:
+                return False
+            model_path, metadata = optimized
+            metadata.update(
+                precision=precision,
+                source_digest=artifact.digest,
+                cache_key=key,
+            )
+            model_path = cache.put(key, model_path, metadata)
+        else:
+            logging.info(f"{artifact.digest} was already optimized for "
+                         f"{config.backend} ({precision}), using the cache")
+            model_path, metadata = cached
+        run.summary.update(metadata)
+
+        logging.info("Uploading model to wandb...")
+        name = MODEL_ARTIFACTS[config.backend]
+        optimized_artifact = wandb.Artifact(
+            name,
+            type="model",
+            metadata=metadata
+        )
+        optimized_artifact.add_file(
+            model_path, name=MODEL_FILES[config.backend]
+        )
+        run.log_artifact(optimized_artifact)
+
+        # drive.py can now find it without asking wandb
+        cache.set_alias(f"{name}:latest", key)
+
+    return True
 
 
 def parse_args():
@@ -78,10 +195,50 @@ def parse_args():
         default="racecar",
         help="Project the dataset belongs to."
     )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        default="trt",
+        choices=["trt", "torchscript", "onnx"],
+        help="What to optimize the model for."
+    )
+    parser.add_argument(
+        "--int8",
+        action="store_true",
+        help="Quantize the model to int8 (trt or onnx backend), \
+             calibrated on images of the dataset's train split."
+    )
+    parser.add_argument(
+        "--dataset",
+        type=str,
+        default="mix_ready:latest",
+        help="Split dataset to calibrate on (train) and evaluate on (test)."
+    )
+    parser.add_argument(
+        "--calibration_size",
+        type=int,
+        default=256,
+        help="Number of images to calibrate int8 quantization on."
+    )
+    parser.add_argument(
+        "--max_mse_regression",
+        type=float,
+        default=0.1,
+        help="Don't upload the model if its test mse is worse than the \
+             original model's by more than this fraction."
+    )
+    parser.add_argument(
+        "--model_cache",
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+        help="Where optimized models are cached. A model is only \
+             optimized again if it, or how it's optimized, changed."
+    )
 
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_args()
-    main(args)
+    if not main(args):
+        sys.exit(1)
@@ -0,0 +1,113 @@
+import math
+
+import torch
+from torch.utils.data.dataloader import default_collate
+
+# same weights as torchvision, channels are taken in the stored order
+GRAYSCALE_WEIGHTS = (0.2989, 0.587, 0.114)
+
+
+def _hue_rotation(angles):
+    """Nx3x3 rotations of angles (radians) around the grey (1, 1, 1) axis"""
+    cos, sin = torch.cos(angles), torch.sin(angles)
+    u = torch.full((3,), 1 / math.sqrt(3), dtype=angles.dtype)
+    cross = torch.tensor([[0., -u[2], u[1]],
+                          [u[2], 0., -u[0]],
+                          [-u[1], u[0], 0.]], dtype=angles.dtype)
+    eye = torch.eye(3, dtype=angles.dtype)
+
+    return cos.view(-1, 1, 1) * eye \
+        + sin.view(-1, 1, 1) * cross \
+        + (1 - cos).view(-1, 1, 1) * torch.outer(u, u)
+
+
+class BatchAugment:
+    """
+    Color jitter and random horizontal flip applied to a whole batch at
+    once, with per sample random factors. A vectorized replacement for
+    XYDataset's per sample ColorJitter and hflip.
+
+    Brightness, saturation and hue are linear in the pixel values and
+    contrast is affine, so all four are folded into a single 3x3 matrix
+    plus offset per image and applied in one batched matmul. Hue is a
+    rotation around the grey axis, which approximates torchvision's HSV
+    hue shift. Values are only clamped once, at the end.
+
+    Takes Nx3xHxW images (uint8 or float in [0, 1]) and Nx2 x, y targets,
+    returns float images and targets, with x negated for flipped images.
+    Works on cpu or gpu tensors, e.g in a collate_fn (see
+    augmented_collate) or in LightningDataModule.on_after_batch_transfer.
+    """
+
+    def __init__(self, brightness=0.2, contrast=0.2, saturation=0.2,
+                 hue=0.2, hflip=0.5, generator=None):
+        self.brightness = brightness
+        self.contrast = contrast
+        self.saturation = saturation
+        self.hue = hue
+        self.hflip = hflip
+        self.generator = generator
+
+    def _uniform(self, n, low, high):
+        return low + (high - low) * torch.rand(n, generator=self.generator)
+
+    def color_transforms(self, n):
+        """Per image gain matrix and the weight of the mean grey level"""
+        brightness = self._uniform(
+            n, 1 - self.brightness, 1 + self.brightness
+        )
+        contrast = self._uniform(n, 1 - self.contrast, 1 + self.contrast)
+        saturation = self._uniform(
+            n, 1 - self.saturation, 1 + self.saturation
+        )
+        hue = self._uniform(n, -self.hue, self.hue)
+
+        weights = torch.tensor(GRAYSCALE_WEIGHTS)
+        # blend with the grey image: s * x + (1 - s) * w.x
+        saturate = saturation.view(-1, 1, 1) * torch.eye(3) \
+            + (1 - saturation).view(-1, 1, 1) * weights.expand(3, 3)
+        rotate = _hue_rotation(2 * math.pi * hue)
+
+        gain = (brightness * contrast).view(-1, 1, 1) * (rotate @ saturate)
+        # contrast blends with the mean grey level of the brightened image
+        # saturation and hue leave grey levels (nearly) unchanged
+        mean_weight = (1 - contrast) * brightness
+
+        return gain, mean_weight
+
+    def __call__(self, images, targets):
+        if images.dtype == torch.uint8:
+            images = images.float().div_(255)
+        targets = targets.clone()
+        n, c, h, w = images.shape
+
+        gain, mean_weight = self.color_transforms(n)
+        gain = gain.to(images.device, images.dtype)
+        mean_weight = mean_weight.to(images.device, images.dtype)
+
+        pixels = images.reshape(n, c, h * w)
+        weights = torch.tensor(
+            GRAYSCALE_WEIGHTS, device=images.device, dtype=images.dtype
+        )
+        grey_mean = pixels.mean(dim=2) @ weights
+        offset = (mean_weight * grey_mean).view(n, 1, 1).expand(n, c, 1)
+
+        images = torch.baddbmm(offset, gain, pixels).clamp_(0, 1)
+        images = images.view(n, c, h, w)
+
+        if self.hflip:
+            flip = torch.rand(n, generator=self.generator) < self.hflip
+            flip = flip.to(images.device)
+            images[flip] = images[flip].flip(-1)
+            targets[flip.to(targets.device), 0] *= -1
+
+        return images, targets
+
+
+def augmented_collate(augment):
+    """DataLoader collate_fn applying augment to each collated batch"""
+    def collate(samples):
+        images, targets = default_collate(samples)
+        return augment(images, targets)
+
+    return collate
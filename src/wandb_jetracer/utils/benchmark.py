@@ -0,0 +1,114 @@
+import resource
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+from wandb_jetracer.utils.runners import IMG_SIZE
+
+# metric -> whether higher is better, used to spot regressions
+METRICS = {
+    "load_seconds": False,
+    "first_inference_ms": False,
+    "latency_p50_ms": False,
+    "latency_p99_ms": False,
+    "throughput_fps": True,
+    "peak_rss_mb": False,
+    "peak_cuda_mb": False,
+    "mse": False,
+    "mae": False,
+}
+
+
+def _synchronize(runner):
+    if runner.device.type == "cuda":
+        torch.cuda.synchronize()
+
+
+@torch.no_grad()
+def latency(runner, n=100, warmup=10):
+    """
+    Single frame latency in ms: the first call (lazy initializations,
+    kernel selection...), then p50 and p99 after warmup calls.
+    """
+    image = torch.rand(1, 3, IMG_SIZE, IMG_SIZE).to(
+        runner.device, runner.dtype
+    )
+    timings = []
+    for _ in range(1 + warmup + n):
+        start = time.perf_counter()
+        runner(image)
+        _synchronize(runner)
+        timings.append(1000 * (time.perf_counter() - start))
+
+    measured = timings[1 + warmup:]
+    return {
+        "first_inference_ms": timings[0],
+        "latency_p50_ms": float(np.percentile(measured, 50)),
+        "latency_p99_ms": float(np.percentile(measured, 99)),
+    }
+
+
+@torch.no_grad()
+def throughput(runner, batch_size=16, n=10):
+    """Frames per second when running batches of batch_size frames"""
+    images = torch.rand(batch_size, 3, IMG_SIZE, IMG_SIZE).to(
+        runner.device, runner.dtype
+    )
+    runner(images)
+    _synchronize(runner)
+
+    start = time.perf_counter()
+    for _ in range(n):
+        runner(images)
+    _synchronize(runner)
+
+    return batch_size * n / (time.perf_counter() - start)
+
+
+@torch.no_grad()
+def prediction_errors(runner, dataset, batch_size=16):
+    """Mean squared and absolute error of the runner on an XYDataset"""
+    squared, absolute, count = 0.0, 0.0, 0
+    for images, targets in DataLoader(dataset, batch_size=batch_size):
+        output = runner(images.to(runner.device, runner.dtype))
+        diff = output.float().cpu() - targets
+        squared += float((diff ** 2).sum())
+        absolute += float(diff.abs().sum())
+        count += targets.numel()
+
+    return {"mse": squared / count, "mae": absolute / count}
+
+
+def peak_memory():
+    """Peak resident memory of the process and peak cuda memory, in MB"""
+    # ru_maxrss is in kilobytes on linux
+    memory = {
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        / 1024
+    }
+    if torch.cuda.is_available():
+        memory["peak_cuda_mb"] = torch.cuda.max_memory_allocated() / 2**20
+
+    return memory
+
+
+def regressions(results, baseline, max_regression):
+    """
+    Metrics of results more than max_regression (relative) worse than
+    in baseline, as {metric: (baseline, result)}.
+    """
+    regressed = {}
+    for metric, higher_is_better in METRICS.items():
+        if results.get(metric) is None or baseline.get(metric) is None:
+            continue
+        before, after = baseline[metric], results[metric]
+        if higher_is_better:
+            worse = after < before * (1 - max_regression)
+        else:
+            worse = after > before * (1 + max_regression)
+        if worse:
+            regressed[metric] = (before, after)
+
+    return regressed
@@ -0,0 +1,258 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+STATE_FILE = ".dataset_sync.json"
+
+
+def file_digest(path):
+    """base64 md5 of a file, the digest wandb artifacts use"""
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            md5.update(chunk)
+
+    return base64.b64encode(md5.digest()).decode()
+
+
+class LocalStore:
+    """
+    Artifact store on the local filesystem, a stand-in for wandb.
+    Each version is a manifest (path -> digest) and file contents
+    are stored once, by digest.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+
+    def _versions(self, name):
+        directory = os.path.join(self.root, name)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(int(v[1:-len(".json")]) for v in os.listdir(directory))
+
+    def _object(self, digest):
+        # base64 digests can contain "/"
+        return os.path.join(self.root, "objects", digest.replace("/", "_"))
+
+    def manifest(self, name):
+        """path -> digest of the latest version, None if there is none"""
+        versions = self._versions(name)
+        if not versions:
+            return None
+        path = os.path.join(self.root, name, f"v{versions[-1]}.json")
+        with open(path) as f:
+            return json.load(f)
+
+    def fetch(self, name, paths, directory):
+        manifest = self.manifest(name)
+        for path in paths:
+            destination = os.path.join(directory, path)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            shutil.copyfile(self._object(manifest[path]), destination)
+
+    def commit(self, name, added, removed):
+        """
+        New version of name: the latest one plus added
+        (path -> (local file, digest)) minus removed paths.
+        """
+        manifest = self.manifest(name) or {}
+        for path in removed:
+            del manifest[path]
+        for path, (local_file, digest) in added.items():
+            if not os.path.exists(self._object(digest)):
+                shutil.copyfile(local_file, self._object(digest))
+            manifest[path] = digest
+
+        versions = self._versions(name)
+        version = versions[-1] + 1 if versions else 0
+        os.makedirs(os.path.join(self.root, name), exist_ok=True)
+        with open(os.path.join(self.root, name, f"v{version}.json"), "w") as f:
+            json.dump(manifest, f)
+
+        return version
+
+
+class WandbStore:
+    """
+    Dataset artifacts on wandb. Sticks to what wandb 0.10.30 (the
+    labelling env) has: a new version is a new artifact, entries that
+    didn't change are references to the latest version's, so they
+    aren't uploaded again.
+    """
+
+    def __init__(self, run, artifact_type="dataset"):
+        self.run = run
+        self.artifact_type = artifact_type
+        self._latest = {}
+
+    def _artifact(self, name):
+        import wandb
+
+        if name not in self._latest:
+            try:
+                self._latest[name] = self.run.use_artifact(
+                    f"{name}:latest", type=self.artifact_type
+                )
+            except wandb.errors.CommError:
+                self._latest[name] = None
+        return self._latest[name]
+
+    def manifest(self, name):
+        artifact = self._artifact(name)
+        if artifact is None:
+            return None
+        # public before wandb 0.15, private after
+        manifest = getattr(artifact, "manifest", None)
+        if manifest is None:
+            manifest = artifact._load_manifest()
+        return {path: entry.digest for path, entry in manifest.entries.items()}
+
+    def fetch(self, name, paths, directory):
+        artifact = self._artifact(name)
+        for path in paths:
+            artifact.get_path(path).download(directory)
+
+    def commit(self, name, added, removed):
+        import wandb
+
+        kept = set(self.manifest(name) or {}) - set(removed) - set(added)
+        latest = self._artifact(name)
+        artifact = wandb.Artifact(name, type=self.artifact_type)
+        for path in sorted(kept):
+            artifact.add_reference(latest.get_path(path).ref_url(), name=path)
+        for path, (local_file, _) in added.items():
+            artifact.add_file(local_file, name=path)
+
+        self.run.log_artifact(artifact)
+        self._latest.pop(name)
+
+
+class DatasetSync:
+    """
+    Keeps a local directory and a dataset artifact in sync, only
+    transferring and hashing what changed.
+
+    The directory doesn't need to hold every file of the artifact:
+    pull() fetches the files you ask for, push() uploads files that are
+    new or modified locally and removes the ones deleted locally.
+    Renamed files are a removal plus an addition with a known digest.
+    Files are only hashed when their size or mtime changed since the
+    last sync, this state is kept in the directory (STATE_FILE).
+    """
+
+    def __init__(self, store, name, directory):
+        self.store = store
+        self.name = name
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        self.state_path = os.path.join(directory, STATE_FILE)
+        try:
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+        except FileNotFoundError:
+            # path -> [size, mtime_ns, digest] of synced local files
+            self.state = {"files": {}}
+
+        self.remote = self.store.manifest(name) or {}
+
+    def _save_state(self):
+        with open(self.state_path + ".tmp", "w") as f:
+            json.dump(self.state, f)
+        os.replace(self.state_path + ".tmp", self.state_path)
+
+    def _scan(self):
+        """path -> (size, mtime_ns) of the files in the directory"""
+        files = {}
+        for root, _, fnames in os.walk(self.directory):
+            for fname in fnames:
+                full_path = os.path.join(root, fname)
+                path = os.path.relpath(full_path, self.directory)
+                # hidden files are local state, e.g STATE_FILE, and so
+                # are the index sidecars XYDataset writes
+                if (fname.startswith(".") or fname.endswith(".tmp")
+                        or fname.endswith(".index.npz")):
+                    continue
+                stat = os.stat(full_path)
+                files[path] = (stat.st_size, stat.st_mtime_ns)
+
+        return files
+
+    def _digest(self, path, size, mtime):
+        known = self.state["files"].get(path)
+        if known is not None and known[:2] == [size, mtime]:
+            return known[2]
+        return file_digest(os.path.join(self.directory, path))
+
+    def pull(self, select=lambda path: True):
+        """Download the remote files matching select that we don't have"""
+        paths = [
+            path for path in self.remote
+            if select(path) and path not in self.state["files"]
+        ]
+        logging.info(f"Downloading {len(paths)} of {len(self.remote)} files")
+        self.store.fetch(self.name, paths, self.directory)
+
+        for path in paths:
+            stat = os.stat(os.path.join(self.directory, path))
+            self.state["files"][path] = [
+                stat.st_size, stat.st_mtime_ns, self.remote[path]
+            ]
+        self._save_state()
+
+        return paths
+
+    def diff(self):
+        """
+        Returns added (path -> digest) and removed paths. Remote files
+        that were never pulled are not considered removed.
+        """
+        local = {}
+        for path, (size, mtime) in self._scan().items():
+            local[path] = (size, mtime, self._digest(path, size, mtime))
+
+        added = {
+            path: digest for path, (_, _, digest) in local.items()
+            if self.remote.get(path) != digest
+        }
+        removed = [
+            path for path in self.state["files"]
+            if path not in local and path in self.remote
+        ]
+
+        return added, removed, local
+
+    def push(self):
+        """Commit local changes as a new version, returns what changed"""
+        added, removed, local = self.diff()
+        if not added and not removed:
+            logging.info("Nothing to sync")
+            return added, removed
+
+        renamed = set(added.values()) & {self.remote[p] for p in removed}
+        logging.info(f"Syncing {len(added)} added ({len(renamed)} renamed) "
+                     f"and {len(removed)} removed files")
+        self.store.commit(
+            self.name,
+            {
+                path: (os.path.join(self.directory, path), digest)
+                for path, digest in added.items()
+            },
+            removed,
+        )
+
+        for path in removed:
+            del self.remote[path]
+        self.remote.update(added)
+        self.state["files"] = {
+            path: [size, mtime, digest]
+            for path, (size, mtime, digest) in local.items()
+        }
+        self._save_state()
+
+        return added, removed
@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+
+from wandb_jetracer.utils.pipeline import LatestQueue, RateMeter
+
+# keys of DetectorWorker.stats()
+DETECTOR_STATS_KEYS = [
+    "detector/hz",
+    "detector/seconds",
+    "detector/skipped_frames",
+    "detector/errors",
+    "detector/max_staleness_seconds",
+]
+
+
+class Detections:
+    """Objects detected on the frame captured at frame_time"""
+
+    def __init__(self, objects, frame_time, done_time):
+        self.objects = objects
+        self.frame_time = frame_time
+        self.done_time = done_time
+
+
+class DetectorWorker:
+    """
+    Runs a (slow) detector on its own thread, on the latest submitted
+    frame, so that detection never delays steering.
+
+    Only every Nth submitted frame is considered and the detector runs
+    at most once per min_period seconds, older frames are skipped.
+    latest() never blocks: it returns the last published detections and
+    how old the frame they were computed on is.
+    """
+
+    def __init__(self, detect, every=1, min_period=0.0,
+                 clock=time.monotonic):
+        self.detect = detect
+        self.every = every
+        self.min_period = min_period
+        self.clock = clock
+
+        self._inbox = LatestQueue()
+        self._detections = None
+        self._submitted = 0
+        self.rate = RateMeter(clock=clock)
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_staleness = 0.0
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="detector", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, frame, frame_time=None):
+        """Offer a frame to the detector, never blocks"""
+        self._submitted += 1
+        if (self._submitted - 1) % self.every:
+            return
+        if frame_time is None:
+            frame_time = self.clock()
+        self._inbox.put((frame, frame_time))
+
+    def _run(self):
+        last_start = None
+        while not self._stop.is_set():
+            if last_start is not None:
+                wait = last_start + self.min_period - self.clock()
+                if wait > 0 and self._stop.wait(wait):
+                    break
+
+            item = self._inbox.get(timeout=0.1)
+            if item is None:
+                continue
+
+            frame, frame_time = item
+            last_start = self.clock()
+            try:
+                objects = self.detect(frame)
+            except Exception:
+                logging.exception("Detector failed")
+                self.errors += 1
+                continue
+
+            done_time = self.clock()
+            self.seconds = done_time - last_start
+            # a single assignment, readers see the old or the new value
+            self._detections = Detections(objects, frame_time, done_time)
+            self.rate.tick()
+
+    def latest(self, now=None):
+        """Last detections (None if there are none yet) and their age"""
+        detections = self._detections
+        if detections is None:
+            return None, None
+        if now is None:
+            now = self.clock()
+
+        staleness = now - detections.frame_time
+        self.max_staleness = max(self.max_staleness, staleness)
+
+        return detections.objects, staleness
+
+    def stats(self):
+        return {
+            "detector/hz": self.rate.rate,
+            "detector/seconds": self.seconds,
+            "detector/skipped_frames": self._inbox.dropped,
+            "detector/errors": self.errors,
+            "detector/max_staleness_seconds": self.max_staleness,
+        }
+
+    def stop(self):
+        self._stop.set()
+        self._inbox.close()
+        if self._thread.is_alive():
+            self._thread.join()
@@ -0,0 +1,152 @@
+import numpy as np
+
+ESTIMATORS = ["none", "kalman"]
+
+
+class LastValue:
+    """
+    No estimation: the road center is the last prediction, whenever
+    it is asked for. What control_policy() used to steer on.
+    """
+
+    STATS_KEYS = []
+
+    def __init__(self):
+        self.road_center = None
+
+    def update(self, road_center, t):
+        self.road_center = road_center
+
+    def update_yaw_rate(self, yaw_rate, t):
+        pass
+
+    def estimate(self, t):
+        return self.road_center
+
+    def stats(self):
+        return {}
+
+
+class RoadCenterKalman:
+    """
+    Constant velocity Kalman filter on the road center (x, y).
+
+    Predictions are measurements of where the road center was when
+    their frame was captured, update() them with that time. estimate(t)
+    projects the state forward to t, e.g when the steering command
+    will take effect, so the car doesn't steer on where the road was
+    a pipeline latency ago, and keeps tracking between predictions when
+    the network runs at a lower rate than the control loop.
+
+    The car turning moves the road center sideways: when gyro_gain is
+    set, gyro_gain * yaw rate (gyroscope z) is fused as a measurement
+    of the x velocity.
+
+    process_noise is the variance of the road center acceleration
+    (per second^2), measurement_noise and gyro_noise the variances of
+    the predictions and of the x velocity derived from the gyroscope.
+    Estimates are clipped to [-1, 1], the range of the predictions.
+    """
+
+    STATS_KEYS = ["estimator/innovation", "estimator/velocity_x"]
+
+    def __init__(self, process_noise=10.0, measurement_noise=0.01,
+                 gyro_gain=None, gyro_noise=0.05):
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.gyro_gain = gyro_gain
+        self.gyro_noise = gyro_noise
+
+        # x, y, x velocity, y velocity
+        self.state = np.zeros(4)
+        self.covariance = np.eye(4)
+        self.t = None
+        self.innovation = 0.0
+
+    def _transition(self, dt):
+        F = np.eye(4)
+        F[0, 2] = F[1, 3] = dt
+        q = self.process_noise
+        Q = np.zeros((4, 4))
+        Q[[0, 1], [0, 1]] = q * dt ** 3 / 3
+        Q[[0, 1, 2, 3], [2, 3, 0, 1]] = q * dt ** 2 / 2
+        Q[[2, 3], [2, 3]] = q * dt
+
+        return F, Q
+
+    def _predict(self, t):
+        """Advance the state to t, late measurements are applied now"""
+        if t <= self.t:
+            return
+        F, Q = self._transition(t - self.t)
+        self.state = F @ self.state
+        self.covariance = F @ self.covariance @ F.T + Q
+        self.t = t
+
+    def _correct(self, H, z, R):
+        innovation = z - H @ self.state
+        S = H @ self.covariance @ H.T + R
+        K = self.covariance @ H.T @ np.linalg.inv(S)
+        self.state = self.state + K @ innovation
+        self.covariance = (np.eye(4) - K @ H) @ self.covariance
+
+        return innovation
+
+    def update(self, road_center, t):
+        z = np.asarray(road_center, dtype=np.float64)
+        if self.t is None:
+            self.state[:2] = z
+            self.covariance = np.diag([self.measurement_noise] * 2 + [1, 1])
+            self.t = t
+            return
+
+        self._predict(t)
+        innovation = self._correct(
+            np.eye(2, 4), z, self.measurement_noise * np.eye(2)
+        )
+        self.innovation = float(np.linalg.norm(innovation))
+
+    def update_yaw_rate(self, yaw_rate, t):
+        if self.gyro_gain is None or self.t is None:
+            return
+
+        self._predict(t)
+        H = np.zeros((1, 4))
+        H[0, 2] = 1
+        self._correct(
+            H, np.array([self.gyro_gain * yaw_rate]),
+            np.array([[self.gyro_noise]]),
+        )
+
+    def estimate(self, t):
+        """Road center (x, y) projected to t, None before any update"""
+        if self.t is None:
+            return None
+        dt = max(t - self.t, 0.0)
+        x, y = np.clip(self.state[:2] + dt * self.state[2:], -1, 1)
+
+        return float(x), float(y)
+
+    def stats(self):
+        return {
+            "estimator/innovation": self.innovation,
+            "estimator/velocity_x": float(self.state[2]),
+        }
+
+
+def estimator_class(name):
+    """Class of one of ESTIMATORS"""
+    if name == "none":
+        return LastValue
+    if name == "kalman":
+        return RoadCenterKalman
+    raise ValueError(f"Unknown estimator: {name}. "
+                     f"Choose one of {ESTIMATORS}")
+
+
+def make_estimator(name, **kwargs):
+    """One of ESTIMATORS, kwargs configure RoadCenterKalman"""
+    cls = estimator_class(name)
+    if cls is LastValue:
+        return LastValue()
+    return cls(**kwargs)
@@ -0,0 +1,142 @@
+import glob
+import logging
+import os
+import time
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from wandb_jetracer.utils.imu import IMU_KEYS
+
+DEFAULT_RECORDER_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "wandb_jetracer", "flight_recorder"
+)
+RECORD_DTYPE = np.dtype([
+    ("time", np.float64),
+    ("prediction", np.float32, (2,)),
+    ("steering", np.float32),
+    ("throttle", np.float32),
+    ("imu", np.float32, (len(IMU_KEYS),)),
+])
+FILES = ["frames.npy", "records.npy", "header.npy"]
+DUMP_GLOB = "flight-*.npz"
+# a 30s dump is tens of MB
+DEFAULT_MAX_DUMPS = 5
+
+
+class FlightRecorder:
+    """
+    Black box of the last capacity frames, with the prediction (NaN if
+    the model didn't run), command and IMU sample of each, in a ring of
+    memory-mapped .npy files in directory.
+
+    record() copies the frame in the ring and nothing else, the kernel
+    writes it back to disk. The ring survives the process: a ring that
+    wasn't dumped, e.g after a segfault, is dumped by recover().
+    dump() writes a compressed replay Session (see replay.Session),
+    with the predictions and commands as extra arrays. Only the last
+    max_dumps timestamped dumps are kept in directory.
+    """
+
+    def __init__(self, directory, capacity, frame_shape, mode="w+",
+                 max_dumps=DEFAULT_MAX_DUMPS):
+        self.directory = directory
+        self.capacity = capacity
+        self.max_dumps = max_dumps
+        # the slot being written isn't part of the last capacity
+        # records, so a partial write is never dumped
+        slots = capacity + 1
+
+        if mode == "w+":
+            os.makedirs(directory, exist_ok=True)
+        paths = [os.path.join(directory, fname) for fname in FILES]
+        self._frames = open_memmap(
+            paths[0], mode=mode, dtype=np.uint8, shape=(slots, *frame_shape)
+        )
+        self._records = open_memmap(
+            paths[1], mode=mode, dtype=RECORD_DTYPE, shape=(slots,)
+        )
+        # number of records written and whether they were dumped
+        self._header = open_memmap(
+            paths[2], mode=mode, dtype=np.int64, shape=(2,)
+        )
+        self.count = int(self._header[0])
+
+    @classmethod
+    def open(cls, directory, max_dumps=DEFAULT_MAX_DUMPS):
+        """The ring left in directory by a previous recorder"""
+        frames = np.load(os.path.join(directory, FILES[0]), mmap_mode="r")
+        return cls(directory, len(frames) - 1, frames.shape[1:], mode="r+",
+                   max_dumps=max_dumps)
+
+    @property
+    def dumped(self):
+        return bool(self._header[1])
+
+    def record(self, t, frame, prediction, steering, throttle, imu_values):
+        """Record one control loop period, imu_values is an imu_log()"""
+        slot = self.count % len(self._records)
+        self._frames[slot] = frame
+        self._records[slot] = (
+            t,
+            (np.nan, np.nan) if prediction is None else prediction,
+            steering,
+            throttle,
+            [imu_values.get(key, 0.0) for key in IMU_KEYS],
+        )
+        # written last, the record is complete once it's counted
+        self.count += 1
+        self._header[:] = self.count, 0
+
+    def dump(self, path=None):
+        """
+        Write the last capacity records to path (default: a timestamped
+        file in directory), returns the path or None if there are none.
+        """
+        n = min(self.count, self.capacity)
+        if n == 0:
+            return None
+        timestamped = path is None
+        if timestamped:
+            path = os.path.join(
+                self.directory,
+                f"flight-{time.strftime('%Y%m%d-%H%M%S')}.npz"
+            )
+
+        slots = np.arange(self.count - n, self.count) % len(self._records)
+        records = self._records[slots]
+        np.savez_compressed(
+            path,
+            frames=self._frames[slots],
+            timestamps=records["time"],
+            imu=records["imu"],
+            prediction=records["prediction"],
+            steering=records["steering"],
+            throttle=records["throttle"],
+        )
+        self._header[1] = 1
+        if timestamped:
+            self._prune()
+
+        return path
+
+    def _prune(self):
+        """Delete the oldest timestamped dumps past max_dumps"""
+        dumps = sorted(glob.glob(os.path.join(self.directory, DUMP_GLOB)))
+        for path in dumps[:max(len(dumps) - self.max_dumps, 0)]:
+            os.remove(path)
+
+
+def recover(directory, max_dumps=DEFAULT_MAX_DUMPS):
+    """Dump the ring left in directory if it wasn't, returns the path"""
+    if not all(os.path.exists(os.path.join(directory, f)) for f in FILES):
+        return None
+    try:
+        recorder = FlightRecorder.open(directory, max_dumps)
+    except ValueError:
+        logging.exception(f"Can't read the flight recorder in {directory}")
+        return None
+    if recorder.dumped:
+        return None
+
+    return recorder.dump()
@@ -0,0 +1,109 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+
+class FrameWriter:
+    """
+    Encodes frames to jpeg and writes them to output_dir on a pool of
+    threads (cv2 releases the GIL while encoding) so that capture never
+    waits on the encoder or the SD card.
+
+    Frames go through a bounded queue. When it is full submit() blocks
+    (block=True, no frame is lost) or drops the frame, either way it is
+    counted in stats(). Frames must not be modified after submit().
+    """
+
+    def __init__(self, output_dir, workers=2, max_queue=64, quality=95,
+                 block=True):
+        self.output_dir = output_dir
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        self.block = block
+        self._queue = queue.Queue(maxsize=max_queue)
+
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.blocked = 0
+        self.blocked_seconds = 0.0
+        self.max_depth = 0
+        self._lock = threading.Lock()
+
+        self._workers = [
+            threading.Thread(
+                target=self._run, name=f"frame-writer-{i}", daemon=True
+            )
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, image, fname):
+        """Queue image to be written as fname, returns False if dropped"""
+        item = (image, fname)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if not self.block:
+                self.dropped += 1
+                return False
+
+            self.blocked += 1
+            start = time.perf_counter()
+            self._queue.put(item)
+            self.blocked_seconds += time.perf_counter() - start
+
+        self.submitted += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+        return True
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            image, fname = item
+            path = os.path.join(self.output_dir, fname)
+            ok, encoded = cv2.imencode(".jpg", image, self.params)
+            if ok:
+                with open(path, "wb") as f:
+                    f.write(encoded.tobytes())
+            else:
+                logging.error(f"Failed to encode {path}")
+
+            with self._lock:
+                if ok:
+                    self.written += 1
+                else:
+                    self.failed += 1
+
+    def close(self):
+        """Wait for every queued frame to be written"""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "blocked": self.blocked,
+            "blocked_seconds": self.blocked_seconds,
+            "max_queue_depth": self.max_depth,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
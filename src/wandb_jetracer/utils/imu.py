@@ -0,0 +1,158 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+IMU_KEYS = [
+    "car/accelerometer_x",
+    "car/accelerometer_y",
+    "car/accelerometer_z",
+    "car/gyrosope_x",
+    "car/gyroscope_y",
+    "car/gyroscope_z",
+    "car/magnetometer_x",
+    "car/magnetometer_y",
+    "car/magnetometer_z",
+]
+# keys of IMUSampler.stats()
+IMU_STATS_KEYS = ["imu/samples", "imu/errors", "imu/overruns"]
+
+
+def read_sample(mpu):
+    """One accelerometer, gyroscope and magnetometer sample (9 values)"""
+    return (
+        list(mpu.readAccelerometerMaster())
+        + list(mpu.readGyroscopeMaster())
+        + list(mpu.readMagnetometerMaster())
+    )
+
+
+def imu_log(sample):
+    """Sample as {IMU_KEYS: value}, ready to be logged"""
+    return {key: float(value) for key, value in zip(IMU_KEYS, sample)}
+
+
+class IMUSampler:
+    """
+    Polls the IMU at rate Hz on a background thread into a preallocated
+    ring buffer of the last capacity samples and their timestamps.
+
+    Readers never touch the bus: latest() returns the newest sample and
+    at(t) the sample interpolated at time t, e.g a frame's capture time.
+    Timestamps come from clock, which must be the one frame times are
+    taken with. Looking up a recent time only walks back a few samples.
+    """
+
+    def __init__(self, mpu, rate=100, capacity=1024, clock=time.monotonic,
+                 sleep=time.sleep):
+        self.mpu = mpu
+        self.period = 1 / rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+
+        self._times = np.zeros(capacity, dtype=np.float64)
+        self._samples = np.zeros((capacity, len(IMU_KEYS)), dtype=np.float64)
+        # total number of samples written, the next one goes to
+        # count % capacity
+        self.count = 0
+        self.errors = 0
+        self.overruns = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="imu-sampler", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def sample(self):
+        """Read the IMU once and store the sample"""
+        start = self.clock()
+        try:
+            values = read_sample(self.mpu)
+        except Exception:
+            logging.exception("Failed to read the IMU")
+            self.errors += 1
+            return
+        # the sample time is the middle of the three reads
+        now = (start + self.clock()) / 2
+
+        with self._lock:
+            slot = self.count % self.capacity
+            self._samples[slot] = values
+            self._times[slot] = now
+            self.count += 1
+
+    def _run(self):
+        next_time = self.clock()
+        while not self._stop.is_set():
+            self.sample()
+            next_time += self.period
+            wait = next_time - self.clock()
+            if wait > 0:
+                self.sleep(wait)
+            else:
+                # late, don't try to catch up
+                self.overruns += 1
+                next_time = self.clock()
+
+    def latest(self):
+        """(time, sample) of the newest sample, None if there is none"""
+        with self._lock:
+            if self.count == 0:
+                return None
+            slot = (self.count - 1) % self.capacity
+            return self._times[slot], self._samples[slot].copy()
+
+    def at(self, t):
+        """
+        Sample linearly interpolated at time t, None if there is none.
+        Times outside of the buffered samples get the closest sample.
+        """
+        with self._lock:
+            if self.count == 0:
+                return None
+            available = min(self.count, self.capacity)
+            newest = self.count - 1
+
+            # walk back from the newest sample to the first one before t
+            i = newest
+            while i > newest - available + 1 and \
+                    self._times[i % self.capacity] > t:
+                i -= 1
+            before = i % self.capacity
+            if i == newest or self._times[before] > t:
+                return self._samples[before].copy()
+
+            after = (i + 1) % self.capacity
+            t0, t1 = self._times[before], self._times[after]
+            weight = (t - t0) / (t1 - t0) if t1 > t0 else 1.0
+
+            return (1 - weight) * self._samples[before] \
+                + weight * self._samples[after]
+
+    def log_at(self, t=None):
+        """imu_log() of the sample at t (newest if None), {} if none"""
+        if t is None:
+            latest = self.latest()
+            sample = None if latest is None else latest[1]
+        else:
+            sample = self.at(t)
+
+        return {} if sample is None else imu_log(sample)
+
+    def stats(self):
+        return {
+            "imu/samples": self.count,
+            "imu/errors": self.errors,
+            "imu/overruns": self.overruns,
+        }
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
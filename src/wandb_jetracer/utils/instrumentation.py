@@ -0,0 +1,210 @@
+import bisect
+import contextlib
+import threading
+import time
+
+
+def log_buckets(low_ns=10_000, high_ns=10_000_000_000, per_decade=10):
+    """Bucket upper bounds, log spaced between low_ns and high_ns"""
+    bounds = []
+    bound = float(low_ns)
+    while bound < high_ns:
+        bounds.append(int(bound))
+        bound *= 10 ** (1 / per_decade)
+    bounds.append(int(high_ns))
+
+    return bounds
+
+
+DEFAULT_BUCKETS = log_buckets()
+# reported by Profiler.report()
+PERCENTILES = (50, 95, 99)
+
+
+class Histogram:
+    """Fixed bucket latency histogram, record() is O(log(buckets))"""
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = bounds
+        # last bucket holds everything above the highest bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def record(self, value_ns):
+        i = bisect.bisect_left(self.bounds, value_ns)
+        with self._lock:
+            self.counts[i] += 1
+            self.total += 1
+
+    def percentile(self, q):
+        """Approximate q-th percentile (q in [0, 100]), in ns"""
+        if self.total == 0:
+            return None
+
+        rank = q / 100 * self.total
+        cumulated = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulated + count >= rank:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[i - 1] if i > 0 else 0
+                upper = self.bounds[i]
+                fraction = (rank - cumulated) / count
+                return lower + fraction * (upper - lower)
+            cumulated += count
+
+        return self.bounds[-1]
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter_ns() - self.start)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """
+    Times named hot path stages into per stage histograms.
+
+    with profiler.span("preprocess"):
+        ...
+
+    When disabled span() returns a shared no-op context manager
+    so leaving the instrumentation in the code is almost free.
+    """
+
+    def __init__(self, enabled=True, bounds=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.bounds = bounds
+        self.histograms = {}
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, value_ns):
+        if not self.enabled:
+            return
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms.setdefault(
+                name, Histogram(self.bounds)
+            )
+        histogram.record(value_ns)
+
+    @staticmethod
+    def report_keys(names, percentiles=PERCENTILES):
+        """Keys of report(), once the spans names have been recorded"""
+        return [f"latency/{name}_p{q}_ms"
+                for name in names for q in percentiles]
+
+    def report(self, percentiles=PERCENTILES):
+        """p50/p95/p99 of every stage, in ms, ready to be logged"""
+        report = {}
+        for name, histogram in list(self.histograms.items()):
+            for q in percentiles:
+                value = histogram.percentile(q)
+                if value is not None:
+                    report[f"latency/{name}_p{q}_ms"] = value / 1e6
+
+        return report
+
+
+NULL_PROFILER = Profiler(enabled=False)
+
+
+class StartupTimer:
+    """
+    Timeline of the startup: when each (possibly concurrent) setup task
+    started and ended and when milestones, e.g the first steering
+    command, were reached. Times are in seconds since the timer started.
+
+    with startup.task("camera"):
+        ...
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.start = clock()
+        self.tasks = {}
+        self.marks = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def task(self, name):
+        start = self.clock() - self.start
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.tasks[name] = (start, self.clock() - self.start)
+
+    def timed(self, name, fn):
+        """fn wrapped in task(name), e.g to be run on another thread"""
+        def run():
+            with self.task(name):
+                return fn()
+
+        return run
+
+    def mark(self, name):
+        """Record the first time the name milestone is reached"""
+        with self._lock:
+            self.marks.setdefault(name, self.clock() - self.start)
+
+    @staticmethod
+    def report_keys(tasks, marks):
+        """Keys of report(), once those tasks and marks are recorded"""
+        return [
+            *(f"startup/{name}_seconds" for name in tasks),
+            *(f"startup/{name}_at" for name in marks),
+        ]
+
+    def report(self):
+        report = {
+            f"startup/{name}_seconds": end - start
+            for name, (start, end) in self.tasks.items()
+        }
+        report.update({
+            f"startup/{name}_at": at for name, at in self.marks.items()
+        })
+
+        return report
+
+    def summary(self):
+        """Human readable timeline"""
+        events = [
+            (start, f"{name:<20} {start:7.3f}s -> {end:7.3f}s "
+                    f"({end - start:.3f}s)")
+            for name, (start, end) in self.tasks.items()
+        ]
+        events += [
+            (at, f"{name:<20} {at:7.3f}s") for name, at in self.marks.items()
+        ]
+
+        events.sort(key=lambda event: event[0])
+        return "\n".join(line for _, line in events)
@@ -0,0 +1,284 @@
+import csv
+import logging
+import os
+import queue
+import threading
+
+import cv2
+
+from wandb_jetracer.utils.utils import label_img
+
+# hidden so that they are neither labelled nor synced with the dataset
+LABELS_FILE = ".labels.csv"
+SUGGESTIONS_FILE = ".suggestions.csv"
+
+
+def is_labelled(fname):
+    return "_" in fname
+
+
+class LabelIndex:
+    """
+    Append-only csv of labelling decisions: (action, fname, x, y) rows
+    with action "label" or "delete". The last decision for an image
+    wins. Every row is flushed as it is written so that a crash loses
+    at most the image being labelled.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.decisions = {}
+
+        if os.path.exists(path):
+            with open(path, newline="") as f:
+                for row in csv.reader(f):
+                    # a crash can leave a truncated last row
+                    if len(row) == 4:
+                        self._apply(*row)
+
+        self._file = open(path, "a", newline="")
+        self._writer = csv.writer(self._file)
+
+    def _apply(self, action, fname, x, y):
+        if action == "label":
+            self.decisions[fname] = (action, int(x), int(y))
+        else:
+            self.decisions[fname] = (action, None, None)
+
+    def _append(self, action, fname, x="", y=""):
+        self._writer.writerow([action, fname, x, y])
+        self._file.flush()
+        self._apply(action, fname, x, y)
+
+    def label(self, fname, x, y):
+        self._append("label", fname, x, y)
+
+    def delete(self, fname):
+        self._append("delete", fname)
+
+    def __contains__(self, fname):
+        return fname in self.decisions
+
+    def __len__(self):
+        return len(self.decisions)
+
+    def close(self):
+        self._file.close()
+
+
+class Prefetcher:
+    """
+    Decodes the next images on a background thread, keeping up to depth
+    of them ready. Iterating yields (fname, image) in order, image is
+    None if it couldn't be read.
+    """
+
+    def __init__(self, directory, fnames, depth=8):
+        self.directory = directory
+        self.fnames = list(fnames)
+        self._queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="label-prefetch", daemon=True
+        )
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run(self):
+        for fname in self.fnames:
+            image = cv2.imread(os.path.join(self.directory, fname), 1)
+            if not self._put((fname, image)):
+                return
+        self._put(None)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            yield item
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def load_suggestions(path):
+    """fname -> (x, y, uncertainty) saved by save_suggestions()"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline="") as f:
+        return {
+            fname: (int(x), int(y), float(uncertainty))
+            for fname, x, y, uncertainty in csv.reader(f)
+        }
+
+
+def save_suggestions(path, suggestions):
+    with open(path + ".tmp", "w", newline="") as f:
+        writer = csv.writer(f)
+        for fname, (x, y, uncertainty) in suggestions.items():
+            writer.writerow([fname, x, y, f"{uncertainty:.6f}"])
+    os.replace(path + ".tmp", path)
+
+
+def suggest_labels(runner, directory, fnames, batch_size=32):
+    """
+    Predict the road center of images with a runners.ModelRunner, in
+    batches. Returns fname -> (x, y, uncertainty), x, y in pixels.
+
+    The model is a single regressor, so its uncertainty is estimated as
+    the disagreement between the prediction on the image and on its
+    mirror image (flipped back), in [-1, 1] coordinates.
+    """
+    import numpy as np
+    import torch
+
+    from wandb_jetracer.utils.runners import IMG_SIZE
+
+    suggestions = {}
+    for start in range(0, len(fnames), batch_size):
+        batch_fnames, images, sizes = [], [], []
+        for fname in fnames[start:start + batch_size]:
+            image = cv2.imread(os.path.join(directory, fname), 1)
+            if image is None:
+                logging.warning(f"Couldn't read {fname}, no suggestion")
+                continue
+            sizes.append(image.shape[:2])
+            # same input as the model gets while driving, see Preprocessor
+            images.append(cv2.resize(image, (IMG_SIZE, IMG_SIZE)))
+            batch_fnames.append(fname)
+        if not images:
+            continue
+
+        batch = torch.from_numpy(np.stack(images)).permute(0, 3, 1, 2)
+        batch = batch.to(runner.device, runner.dtype).div_(255)
+        with torch.no_grad():
+            output = runner(batch).float().cpu()
+            flipped = runner(batch.flip(-1)).float().cpu()
+        flipped[:, 0] *= -1
+        uncertainty = (output - flipped).norm(dim=1)
+
+        for fname, (height, width), (x, y), u in zip(
+            batch_fnames, sizes, output.tolist(), uncertainty.tolist()
+        ):
+            x = int(round(min(max((x + 1) / 2, 0), 1) * (width - 1)))
+            y = int(round(min(max((y + 1) / 2, 0), 1) * (height - 1)))
+            suggestions[fname] = (x, y, u)
+
+        logging.info(f"Pre-labelled {start + len(images)}/{len(fnames)}")
+
+    return suggestions
+
+
+class LabellingSession:
+    """
+    Labelling state of a directory of images. Decisions go to a
+    LabelIndex (LABELS_FILE) instead of renaming or deleting files one
+    by one, commit() applies them all at the end.
+
+    A session that was interrupted before commit() is resumed: images
+    already in the index are not labelled again and are committed with
+    the new ones.
+
+    If model suggestions were saved (SUGGESTIONS_FILE), the most
+    uncertain images come first, images without one before them all.
+    """
+
+    def __init__(self, directory, prefetch=8):
+        self.directory = directory
+        self.prefetch = prefetch
+        self.index = LabelIndex(os.path.join(directory, LABELS_FILE))
+
+        fnames = [
+            fname for fname in sorted(os.listdir(directory))
+            if fname.endswith(".jpg")
+        ]
+        self.total = len(fnames)
+        self.pending = [
+            fname for fname in fnames
+            if not is_labelled(fname) and fname not in self.index
+        ]
+        self.suggestions_path = os.path.join(directory, SUGGESTIONS_FILE)
+        self.suggestions = load_suggestions(self.suggestions_path)
+        self.order_by_uncertainty()
+        if len(self.index):
+            logging.info(f"Resuming session, {len(self.index)} images "
+                         "already labelled or deleted")
+
+    def add_suggestions(self, suggestions):
+        self.suggestions.update(suggestions)
+        save_suggestions(self.suggestions_path, self.suggestions)
+        self.order_by_uncertainty()
+
+    def order_by_uncertainty(self):
+        self.pending.sort(
+            key=lambda fname: -self.suggestions.get(
+                fname, (None, None, float("inf"))
+            )[2]
+        )
+
+    def suggestion(self, fname):
+        """Suggested x, y for fname, None if there is none"""
+        if fname not in self.suggestions:
+            return None
+        x, y, _ = self.suggestions[fname]
+        return x, y
+
+    def images(self):
+        """Iterate over (fname, image) of the images left to label"""
+        prefetcher = Prefetcher(self.directory, self.pending, self.prefetch)
+        try:
+            for item in prefetcher:
+                yield item
+        finally:
+            prefetcher.close()
+
+    def label(self, fname, x, y):
+        self.index.label(fname, x, y)
+
+    def delete(self, fname):
+        self.index.delete(fname)
+
+    def commit(self):
+        """
+        Rename labelled images and delete the others, returns the number
+        of labelled and deleted images. Safe to run again after a crash.
+        """
+        self.index.close()
+        labelled, deleted = 0, 0
+        for fname, (action, x, y) in self.index.decisions.items():
+            path = os.path.join(self.directory, fname)
+            if not os.path.exists(path):
+                # already committed
+                continue
+
+            if action == "label":
+                label_img(x, y, path)
+                labelled += 1
+            else:
+                os.remove(path)
+                deleted += 1
+
+        os.remove(self.index.path)
+        # suggestions of the images that are left are kept for next time
+        self.suggestions = {
+            fname: suggestion
+            for fname, suggestion in self.suggestions.items()
+            if fname not in self.index.decisions
+        }
+        if self.suggestions:
+            save_suggestions(self.suggestions_path, self.suggestions)
+        elif os.path.exists(self.suggestions_path):
+            os.remove(self.suggestions_path)
+        logging.debug(f"Committed {labelled} labels and {deleted} deletions")
+
+        return labelled, deleted
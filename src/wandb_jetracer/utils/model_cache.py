@@ -0,0 +1,99 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "wandb_jetracer", "models"
+)
+
+# artifact each backend is logged to by trt_optim.py
+MODEL_ARTIFACTS = {
+    "trt": "trt-model",
+    "torchscript": "torchscript-model",
+    "onnx": "onnx-model",
+    "torch": "model",
+}
+
+
+def cache_key(source_digest, architecture, backend, precision, input_shape,
+              **extra):
+    """
+    Key of an optimized model: everything the conversion depends on.
+    extra holds anything else it depends on, e.g the calibration data.
+    """
+    fields = dict(
+        source_digest=source_digest,
+        architecture=architecture,
+        backend=backend,
+        precision=precision,
+        input_shape=list(input_shape),
+        **extra,
+    )
+    blob = json.dumps(fields, sort_keys=True).encode()
+
+    return hashlib.sha1(blob).hexdigest()
+
+
+class ModelCache:
+    """
+    Optimized models on disk, by key: {root}/{key}/ holds the model
+    file and metadata.json. Aliases (e.g "onnx-model:latest") point to
+    a key so that a model can be found without asking wandb.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR):
+        self.root = root
+        self.aliases_path = os.path.join(root, "aliases.json")
+
+    def get(self, key):
+        """(model path, metadata) or None if key isn't cached"""
+        directory = os.path.join(self.root, key)
+        try:
+            with open(os.path.join(directory, "metadata.json")) as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        return os.path.join(directory, entry["file"]), entry["metadata"]
+
+    def put(self, key, model_path, metadata):
+        """Copy model_path in the cache, returns the cached path"""
+        directory = os.path.join(self.root, key)
+        fname = os.path.basename(model_path)
+        tmp = directory + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        shutil.copyfile(model_path, os.path.join(tmp, fname))
+        # written last, its presence marks a complete entry
+        with open(os.path.join(tmp, "metadata.json"), "w") as f:
+            json.dump({"file": fname, "metadata": metadata}, f)
+
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp, directory)
+        logging.debug(f"Cached {model_path} as {key}")
+
+        return os.path.join(directory, fname)
+
+    def _aliases(self):
+        try:
+            with open(self.aliases_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def set_alias(self, alias, key):
+        aliases = self._aliases()
+        aliases[alias] = key
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.aliases_path + ".tmp", "w") as f:
+            json.dump(aliases, f)
+        os.replace(self.aliases_path + ".tmp", self.aliases_path)
+
+    def resolve(self, alias):
+        """(model path, metadata) the alias points to, or None"""
+        key = self._aliases().get(alias)
+        if key is None:
+            return None
+        return self.get(key)
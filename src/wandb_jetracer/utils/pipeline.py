@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from collections import deque
+
+
+class LatestQueue:
+    """
+    Bounded queue where the newest value always wins.
+    Putting into a full queue drops the oldest item and get() only ever
+    returns the newest item, discarding anything older.
+    """
+
+    def __init__(self, maxsize=1):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """Return the newest item, None on timeout or once closed"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._items or self._closed, timeout
+            )
+            if not self._items:
+                return None
+
+            item = self._items.pop()
+            self.dropped += len(self._items)
+            self._items.clear()
+
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def qsize(self):
+        return len(self._items)
+
+
+class RateMeter:
+    """Exponentially smoothed rate (in Hz) of calls to tick()"""
+
+    def __init__(self, smoothing=0.9, clock=time.monotonic):
+        self.smoothing = smoothing
+        self.clock = clock
+        self.count = 0
+        self.rate = 0.0
+        self._last = None
+
+    def tick(self):
+        now = self.clock()
+        if self._last is not None and now > self._last:
+            instant_rate = 1.0 / (now - self._last)
+            if self.count == 1:
+                self.rate = instant_rate
+            else:
+                self.rate = self.smoothing * self.rate + \
+                    (1 - self.smoothing) * instant_rate
+        self._last = now
+        self.count += 1
+
+
+class Stage(threading.Thread):
+    """
+    Run fn on the newest item of inbox and push the result to outbox.
+    A stage without inbox is a source: fn is called without arguments.
+    Returning None from fn drops the item.
+    """
+
+    def __init__(self, name, fn, inbox=None, outbox=None, poll_timeout=0.1):
+        super(Stage, self).__init__(name=name, daemon=True)
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.poll_timeout = poll_timeout
+        self.meter = RateMeter()
+        self.error = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                if self.inbox is None:
+                    out = self.fn()
+                else:
+                    item = self.inbox.get(timeout=self.poll_timeout)
+                    if item is None:
+                        continue
+                    out = self.fn(item)
+            except Exception as e:
+                logging.exception(f"Stage {self.name} failed")
+                self.error = e
+                break
+
+            self.meter.tick()
+            if self.outbox is not None and out is not None:
+                self.outbox.put(out)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class Pipeline:
+    """
+    Chain of stages connected by latest-value-wins queues:
+    stages[i] reads from queues[i-1] and writes to queues[i].
+    """
+
+    def __init__(self, stages, maxsize=1):
+        names = [name for name, _ in stages]
+        self.queues = {
+            name: LatestQueue(maxsize) for name in names[:-1]
+        }
+
+        self.stages = []
+        inbox = None
+        for name, fn in stages:
+            outbox = self.queues.get(name)
+            self.stages.append(Stage(name, fn, inbox, outbox))
+            inbox = outbox
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self, timeout=1.0):
+        for stage in self.stages:
+            stage.stop()
+        for queue in self.queues.values():
+            queue.close()
+        for stage in self.stages:
+            if stage.is_alive():
+                stage.join(timeout)
+
+    @property
+    def failed(self):
+        return any(stage.error is not None for stage in self.stages)
+
+    @staticmethod
+    def stats_keys(names):
+        """Keys of stats(), for a pipeline of stages with those names"""
+        return [
+            *(f"pipeline/{name}_hz" for name in names),
+            *(f"pipeline/{name}_queue_{stat}"
+              for name in names[:-1] for stat in ["depth", "dropped"]),
+        ]
+
+    def stats(self):
+        """Per stage rate and per queue depth/drops, ready to be logged"""
+        stats = {}
+        for stage in self.stages:
+            stats[f"pipeline/{stage.name}_hz"] = stage.meter.rate
+        for name, queue in self.queues.items():
+            stats[f"pipeline/{name}_queue_depth"] = queue.qsize()
+            stats[f"pipeline/{name}_queue_dropped"] = queue.dropped
+
+        return stats
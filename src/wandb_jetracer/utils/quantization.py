@@ -0,0 +1,100 @@
+import logging
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Subset
+
+from wandb_jetracer.utils.benchmark import latency, prediction_errors
+from wandb_jetracer.utils.runners import IMG_SIZE
+
+
+def calibration_batches(dataset, size=256, batch_size=16, seed=0):
+    """
+    Random subset of size images of an XYDataset (built with
+    train=False so that they are not augmented), as Nx3xHxW batches.
+    """
+    generator = np.random.default_rng(seed)
+    indices = generator.permutation(len(dataset))[:size]
+    loader = DataLoader(Subset(dataset, indices.tolist()),
+                        batch_size=batch_size)
+
+    return [images for images, _ in loader]
+
+
+def quantize_onnx(fp32_path, path, batches):
+    """
+    Static INT8 quantization of an ONNX model with ONNX Runtime,
+    activation ranges are calibrated on batches.
+    """
+    from onnxruntime.quantization import (CalibrationDataReader,
+                                          QuantFormat,
+                                          QuantType,
+                                          quantize_static)
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self.batches = iter(batches)
+
+        def get_next(self):
+            images = next(self.batches, None)
+            if images is None:
+                return None
+            return {"input": images.numpy()}
+
+    quantize_static(
+        fp32_path,
+        path,
+        Reader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+
+    return path
+
+
+def quantize_trt(model, path, batches):
+    """
+    INT8 torch2trt engine, calibrated on batches. Layers TensorRT can't
+    run in int8 fall back to fp16 and, like the fp16 engines of
+    runners.export_model(), the input is half: what TRTRunner feeds it.
+    """
+    from torch2trt import torch2trt
+
+    model = model.cuda().half().eval()
+    # torch2trt calibrates on one sample at a time
+    calibration = [
+        [image.unsqueeze(0).cuda().half()]
+        for images in batches for image in images
+    ]
+    data = torch.zeros((1, 3, IMG_SIZE, IMG_SIZE)).cuda().half()
+    model_trt = torch2trt(
+        model,
+        [data],
+        fp16_mode=True,
+        int8_mode=True,
+        int8_calib_dataset=calibration,
+    )
+    torch.save(model_trt.state_dict(), path)
+
+    return path
+
+
+def evaluate(runner, dataset):
+    """Accuracy and latency of a runner"""
+    # torch2trt engines are built for a batch of 1
+    batch_size = 1 if runner.backend == "trt" else 16
+    metrics = {
+        "test_mse": prediction_errors(runner, dataset, batch_size)["mse"],
+        "ms_per_frame": latency(runner, n=50)["latency_p50_ms"],
+    }
+    logging.info(f"{runner.backend}: test mse {metrics['test_mse']:.5f} "
+                 f"at {metrics['ms_per_frame']:.2f} ms/frame")
+
+    return metrics
+
+
+def accuracy_regressed(mse, reference_mse, max_regression):
+    """True if mse is more than max_regression (relative) worse"""
+    return mse > reference_mse * (1 + max_regression)
@@ -0,0 +1,292 @@
+import glob
+import os
+import time
+import uuid
+
+import cv2
+import numpy as np
+
+from wandb_jetracer.utils.imu import IMU_KEYS
+
+
+class EndOfSession(Exception):
+    pass
+
+
+class Session:
+    """
+    Recorded drive: N frames (uint8 NxHxWx3), their capture times in
+    seconds from the start of the session and optionally one IMU sample
+    (Nx9, same order as IMU_KEYS) per frame.
+    """
+
+    def __init__(self, frames, timestamps, imu=None):
+        self.frames = frames
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.timestamps = self.timestamps - self.timestamps[0]
+        if imu is None:
+            imu = np.zeros((len(frames), len(IMU_KEYS)), dtype=np.float32)
+        self.imu = imu
+
+    def __len__(self):
+        return len(self.frames)
+
+    def save(self, path):
+        np.savez(path, frames=self.frames, timestamps=self.timestamps,
+                 imu=self.imu)
+
+    @classmethod
+    def load(cls, path):
+        """Load a session saved with save() or a directory of images"""
+        if os.path.isdir(path):
+            return cls.from_images(path)
+        data = np.load(path)
+
+        return cls(data["frames"], data["timestamps"], data["imu"])
+
+    @classmethod
+    def from_images(cls, directory):
+        """
+        Build a session from images collected with collect_data.py.
+        Their uuid1 names hold the capture time.
+        """
+        times = []
+        paths = glob.glob(os.path.join(directory, "*.jpg"))
+        for path in paths:
+            # labelled images are named x_y_uuid.jpg
+            name = os.path.basename(path).split("_")[-1][:-len(".jpg")]
+            # uuid1 time is in 100ns intervals
+            times.append(uuid.UUID(name).time * 1e-7)
+
+        order = np.argsort(times)
+        frames = np.stack(
+            [cv2.imread(paths[i], cv2.IMREAD_COLOR) for i in order]
+        )
+
+        return cls(frames, np.asarray(times)[order])
+
+
+class ReplayClock:
+    """
+    Monotonic clock for the replay. When fast, sleep() skips ahead
+    in time instead of waiting.
+    """
+
+    def __init__(self, fast=True):
+        self.fast = fast
+        self.offset = 0.0
+
+    def __call__(self):
+        return time.monotonic() + self.offset
+
+    def sleep(self, seconds):
+        if seconds <= 0:
+            return
+        if self.fast:
+            self.offset += seconds
+        else:
+            time.sleep(seconds)
+
+
+class FakeCamera:
+    """
+    Stands in for jetcam's CSICamera. In realtime mode camera.value is
+    the frame that would have been captured at the current (replay)
+    time; otherwise every frame is served once, one per access.
+    Raises EndOfSession once all frames have been served.
+    """
+
+    def __init__(self, session, clock, realtime=False):
+        self.session = session
+        self.clock = clock
+        self.realtime = realtime
+        self.running = False
+        self.index = -1
+        self.served_at = np.full(len(session), np.nan)
+        self.start = None
+        self._frame = None
+
+        # last frame is shown for as long as the one before it
+        timestamps = session.timestamps
+        self.duration = 2 * timestamps[-1] - timestamps[-2] \
+            if len(session) > 1 else 0.0
+
+    @property
+    def value(self):
+        now = self.clock()
+        if self.start is None:
+            self.start = now
+
+        if self.realtime:
+            if now - self.start > self.duration:
+                raise EndOfSession()
+            index = np.searchsorted(
+                self.session.timestamps, now - self.start, side="right"
+            ) - 1
+        else:
+            index = self.index + 1
+
+        if index >= len(self.session):
+            raise EndOfSession()
+        if index != self.index:
+            self.index = index
+            self.served_at[index] = now
+            # same object until the next frame, like jetcam's value
+            self._frame = self.session.frames[index]
+
+        return self._frame
+
+    def read(self):
+        return self.value
+
+
+class FakeCar:
+    """Stands in for NvidiaRacecar and records every command"""
+
+    def __init__(self, camera, clock):
+        self.camera = camera
+        self.clock = clock
+        self.throttle = 0.0
+        self._steering = 0.0
+        # time, frame index, steering, throttle
+        self.trace = []
+
+    @property
+    def steering(self):
+        return self._steering
+
+    @steering.setter
+    def steering(self, value):
+        self._steering = value
+        self.trace.append(
+            (self.clock(), self.camera.index, value, self.throttle)
+        )
+
+
+class FakeMPU:
+    """Stands in for MPU9250, returns the sample of the current frame"""
+
+    def __init__(self, session, camera):
+        self.session = session
+        self.camera = camera
+
+    def _sample(self, start):
+        index = max(self.camera.index, 0)
+        return list(self.session.imu[index, start:start + 3])
+
+    def readAccelerometerMaster(self):
+        return self._sample(0)
+
+    def readGyroscopeMaster(self):
+        return self._sample(3)
+
+    def readMagnetometerMaster(self):
+        return self._sample(6)
+
+    def configure(self):
+        pass
+
+
+class SyntheticMPU:
+    """
+    Stands in for MPU9250, the 9 values are signal(time), e.g to test
+    sampling and interpolation against a known function of time.
+    """
+
+    def __init__(self, signal, clock=time.monotonic):
+        self.signal = signal
+        self.clock = clock
+        self.reads = 0
+
+    def _sample(self, start):
+        self.reads += 1
+        return list(self.signal(self.clock())[start:start + 3])
+
+    def readAccelerometerMaster(self):
+        return self._sample(0)
+
+    def readGyroscopeMaster(self):
+        return self._sample(3)
+
+    def readMagnetometerMaster(self):
+        return self._sample(6)
+
+    def configure(self):
+        pass
+
+
+class FakeJtop:
+    def __init__(self):
+        self.stats = {
+            "GPU": 0, "Temp GPU": 0, "Temp CPU": 0,
+            "power avg": 0, "power cur": 0,
+        }
+
+    def start(self):
+        pass
+
+
+class FakeDetector:
+    """
+    Cpu stand-in for drive.YoloDetector: takes seconds to find nothing,
+    the output of non max suppression on a frame without objects.
+    """
+
+    names = []
+
+    def __init__(self, seconds=0.1, sleep=time.sleep):
+        self.seconds = seconds
+        self.sleep = sleep
+        self.calls = 0
+
+    def __call__(self, image):
+        self.calls += 1
+        self.sleep(self.seconds)
+        return [np.zeros((0, 6), dtype=np.float32)]
+
+
+def steering_errors(camera, trace, reference):
+    """
+    How far each steering command was from the reference steering
+    (computed on every frame) at the time it was sent. The reference
+    is interpolated between the frames shown around that time.
+    """
+    served = ~np.isnan(camera.served_at)
+    expected = np.interp(
+        trace[:, 0], camera.served_at[served],
+        np.asarray(reference, dtype=np.float64)[served]
+    )
+
+    return trace[:, 2] - expected
+
+
+def make_report(camera, car, wall_seconds, reference=None):
+    """
+    Throughput, per frame latency and steering trace of a replay.
+    With the reference steering of each frame, also how well the
+    commands tracked it.
+    """
+    trace = np.array(car.trace, dtype=np.float64).reshape(-1, 4)
+    frame_indices = trace[:, 1].astype(int)
+    latencies = trace[:, 0] - camera.served_at[frame_indices]
+    errors = None
+    if reference is not None and len(trace):
+        errors = np.abs(steering_errors(camera, trace, reference))
+    if len(trace):
+        trace[:, 0] -= camera.start
+
+    report = {
+        "frames": len(camera.session),
+        "frames_processed": len(trace),
+        "wall_seconds": wall_seconds,
+        "throughput_fps": len(trace) / wall_seconds,
+    }
+    if len(trace):
+        for q in [50, 95, 99]:
+            report[f"latency_p{q}_ms"] = \
+                float(np.percentile(latencies, q)) * 1e3
+    if errors is not None:
+        report["steering_error_rms"] = float(np.sqrt(np.mean(errors ** 2)))
+        report["steering_error_max"] = float(errors.max())
+
+    return report, trace
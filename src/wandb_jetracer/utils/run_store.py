@@ -0,0 +1,256 @@
+import glob
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+
+import cv2
+import numpy as np
+
+from wandb_jetracer.utils.telemetry import Image, Video, is_scalar
+
+CONFIG_FILE = "config.json"
+SCHEMA_FILE = "schema.json"
+IMAGES_FILE = "images.bin"
+IMAGES_INDEX = "images.jsonl"
+VIDEOS_INDEX = "videos.jsonl"
+CHUNK_PATTERN = "scalars-{:06d}.npz"
+CHUNK_GLOB = "scalars-*.npz"
+SYNCED_FILE = "synced.json"
+
+
+class RunStore:
+    """
+    Append-only local store of a run's telemetry, to analyze or sync
+    to wandb later (see sync_run.py) when there was no connection.
+
+    The scalar columns are declared up front and saved in schema.json.
+    Scalars are written in a preallocated rows x columns float64 buffer,
+    NaN where a row doesn't have a column, which is saved as a chunk
+    every chunk_rows rows or flush_seconds, whichever comes first.
+    Scalars that weren't declared are skipped, with a warning. Images
+    are appended to images.bin as PNGs, indexed by images.jsonl. Videos
+    stay where they were recorded, videos.jsonl holds their path and
+    frame times. Every row written gets a step, like wandb.log.
+    """
+
+    def __init__(self, directory, columns, config=None, chunk_rows=64,
+                 flush_seconds=5.0):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.flush_seconds = flush_seconds
+        if glob.glob(self._path(CHUNK_GLOB)):
+            raise ValueError(f"{directory} already holds a run")
+        if config is not None:
+            with open(self._path(CONFIG_FILE), "w") as f:
+                json.dump(config, f, indent=2, default=repr)
+
+        self.columns = list(columns)
+        with open(self._path(SCHEMA_FILE), "w") as f:
+            json.dump({"columns": self.columns}, f, indent=2)
+        self._column_index = {key: i for i, key in enumerate(self.columns)}
+
+        self.step = 0
+        self._values = np.full((chunk_rows, len(self.columns)), np.nan)
+        self._steps = np.zeros(chunk_rows, dtype=np.int64)
+        self._times = np.zeros(chunk_rows)
+        self._len = 0
+        self._last_flush = time.monotonic()
+        self._chunks = 0
+        self._images = open(self._path(IMAGES_FILE), "ab")
+        self._index = open(self._path(IMAGES_INDEX), "a")
+        self._videos = open(self._path(VIDEOS_INDEX), "a")
+        self._skipped = set()
+
+    def _path(self, fname):
+        return os.path.join(self.directory, fname)
+
+    def write(self, row):
+        now = time.time()
+        values = self._values[self._len]
+        has_scalars = False
+        for key, value in row.items():
+            if is_scalar(value):
+                i = self._column_index.get(key)
+                if i is not None:
+                    values[i] = value
+                    has_scalars = True
+                else:
+                    self._skip(key, "it isn't a declared column")
+            elif isinstance(value, Image):
+                self._write_image(key, value, now)
+            elif isinstance(value, Video):
+                self._write_video(key, value, now)
+            else:
+                self._skip(key, f"of type {type(value).__name__}")
+
+        if has_scalars:
+            self._steps[self._len] = self.step
+            self._times[self._len] = now
+            self._len += 1
+            if (self._len == self.chunk_rows or time.monotonic()
+                    - self._last_flush >= self.flush_seconds):
+                self.flush()
+        self.step += 1
+
+    def _skip(self, key, reason):
+        if key not in self._skipped:
+            self._skipped.add(key)
+            logging.warning(f"Can't store {key} values, {reason}, "
+                            "skipping them")
+
+    def _write_image(self, key, image, now):
+        _, png = cv2.imencode(
+            ".png", cv2.cvtColor(image.data, cv2.COLOR_RGB2BGR)
+        )
+        offset = self._images.tell()
+        self._images.write(png.tobytes())
+        self._images.flush()
+        # indexed once the data is written
+        self._index.write(json.dumps({
+            "step": self.step, "time": now, "key": key, "offset": offset,
+            "size": len(png), "boxes": image.boxes,
+        }) + "\n")
+        self._index.flush()
+
+    def _write_video(self, key, video, now):
+        self._videos.write(json.dumps({
+            "step": self.step, "time": now, "key": key,
+            "path": os.path.abspath(video.path), "fps": video.fps,
+            "timestamps": list(video.timestamps),
+        }) + "\n")
+        self._videos.flush()
+
+    def flush(self):
+        """Write the buffered scalars as a chunk"""
+        self._last_flush = time.monotonic()
+        if self._len == 0:
+            return
+
+        n = self._len
+        path = self._path(CHUNK_PATTERN.format(self._chunks))
+        # readers never see a partial chunk
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, values=self._values[:n], step=self._steps[:n],
+                     time=self._times[:n])
+        os.replace(path + ".tmp", path)
+        self._chunks += 1
+        self._values[:n] = np.nan
+        self._len = 0
+
+    def close(self):
+        self.flush()
+        self._images.close()
+        self._index.close()
+        self._videos.close()
+
+
+class RunReader:
+    """Reads a RunStore directory, only needs numpy and opencv"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, fname):
+        return os.path.join(self.directory, fname)
+
+    @property
+    def config(self):
+        try:
+            with open(self._path(CONFIG_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    @property
+    def columns(self):
+        with open(self._path(SCHEMA_FILE)) as f:
+            return json.load(f)["columns"]
+
+    def scalars(self):
+        """
+        {column: values} of every scalar row, with their "step" and
+        "time" (unix seconds), e.g for pandas.DataFrame(...)
+        """
+        paths = sorted(glob.glob(self._path(CHUNK_GLOB)))
+        if not paths:
+            return {"step": np.zeros(0, dtype=np.int64), "time": np.zeros(0)}
+        chunks = [np.load(path) for path in paths]
+
+        columns = self.columns
+        values = np.concatenate([chunk["values"] for chunk in chunks])
+
+        table = {
+            "step": np.concatenate([chunk["step"] for chunk in chunks]),
+            "time": np.concatenate([chunk["time"] for chunk in chunks]),
+        }
+        table.update(
+            {column: values[:, i] for i, column in enumerate(columns)}
+        )
+
+        return table
+
+    def images(self):
+        """(step, key, RGB image, boxes) of every image, in order"""
+        try:
+            index = open(self._path(IMAGES_INDEX))
+        except FileNotFoundError:
+            return
+        with index, open(self._path(IMAGES_FILE), "rb") as data:
+            for line in index:
+                entry = json.loads(line)
+                data.seek(entry["offset"])
+                png = np.frombuffer(data.read(entry["size"]), np.uint8)
+                image = cv2.cvtColor(
+                    cv2.imdecode(png, cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB
+                )
+                yield entry["step"], entry["key"], image, entry["boxes"]
+
+    def videos(self):
+        """(step, key, Video) of every video, in order"""
+        try:
+            index = open(self._path(VIDEOS_INDEX))
+        except FileNotFoundError:
+            return
+        with index:
+            for line in index:
+                entry = json.loads(line)
+                video = Video(entry["path"], entry["timestamps"], entry["fps"])
+                yield entry["step"], entry["key"], video
+
+    def rows(self):
+        """
+        (step, row) of every row written, in order, as they were logged:
+        scalars, Images and Videos
+        """
+        scalars = self.scalars()
+        steps = scalars.pop("step")
+        scalars.pop("time")
+        scalar_rows = (
+            (int(step), {
+                key: float(values[i]) for key, values in scalars.items()
+                if not np.isnan(values[i])
+            })
+            for i, step in enumerate(steps)
+        )
+        image_rows = (
+            (step, {key: Image(image, boxes)})
+            for step, key, image, boxes in self.images()
+        )
+
+        video_rows = (
+            (step, {key: video}) for step, key, video in self.videos()
+        )
+
+        # all in step order, images are only decoded when reached
+        merged = heapq.merge(
+            scalar_rows, image_rows, video_rows, key=lambda r: r[0]
+        )
+        for step, group in itertools.groupby(merged, key=lambda r: r[0]):
+            row = {}
+            for _, values in group:
+                row.update(values)
+            yield step, row
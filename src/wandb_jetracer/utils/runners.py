@@ -0,0 +1,204 @@
+import logging
+
+import numpy as np
+import torch
+import torchvision
+
+IMG_SIZE = 224
+
+# default file name of a model exported for each backend
+MODEL_FILES = {
+    "trt": "trt-model.pth",
+    "torchscript": "model.ts",
+    "onnx": "model.onnx",
+    "torch": "model.pth",
+}
+
+
+def default_device():
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+def build_model(architecture, out_dims=2):
+    """torchvision model with its fc layer resized to out_dims"""
+    model = torchvision.models.__dict__[architecture](pretrained=False)
+    model.fc = torch.nn.Linear(model.fc.in_features, out_dims)
+
+    return model
+
+
+def load_model(model_pth, architecture, out_dims=2, device=None):
+    model = build_model(architecture, out_dims)
+    model.load_state_dict(torch.load(model_pth, map_location="cpu"))
+
+    return model.to(device or default_device()).eval()
+
+
+class ModelRunner:
+    """
+    Common interface to run the road center model whatever the backend.
+    Takes a Nx3xHxW tensor (see xy_dataset.Preprocessor, built with the
+    runner's device and dtype) and returns a Nx2 tensor.
+    """
+
+    backend = None
+
+    def __init__(self, device, dtype):
+        self.device = torch.device(device)
+        self.dtype = dtype
+
+    def __call__(self, images):
+        raise NotImplementedError
+
+
+class TorchRunner(ModelRunner):
+    """Eager pytorch module"""
+
+    backend = "torch"
+
+    def __init__(self, model, device=None, half=None):
+        device = torch.device(device or default_device())
+        # half precision is only worth it (and supported) on gpu
+        if half is None:
+            half = device.type == "cuda"
+        dtype = torch.half if half else torch.float32
+        super(TorchRunner, self).__init__(device, dtype)
+
+        self.model = model.to(device, dtype).eval()
+
+    @torch.no_grad()
+    def __call__(self, images):
+        return self.model(images)
+
+
+class TorchScriptRunner(ModelRunner):
+    """
+    Frozen TorchScript module. Weights are baked in as constants
+    so the model runs in the dtype it was exported with.
+    """
+
+    backend = "torchscript"
+
+    def __init__(self, path, device=None):
+        device = torch.device(device or default_device())
+        super(TorchScriptRunner, self).__init__(device, torch.float32)
+
+        self.model = torch.jit.load(path, map_location=device)
+
+    @torch.no_grad()
+    def __call__(self, images):
+        return self.model(images)
+
+
+class TRTRunner(ModelRunner):
+    """torch2trt engine, fp16 on cuda"""
+
+    backend = "trt"
+
+    def __init__(self, path):
+        from torch2trt import TRTModule
+
+        super(TRTRunner, self).__init__("cuda", torch.half)
+        self.model = TRTModule()
+        self.model.load_state_dict(torch.load(path))
+
+    def __call__(self, images):
+        return self.model(images)
+
+
+class OnnxRunner(ModelRunner):
+    """ONNX Runtime session on cpu"""
+
+    backend = "onnx"
+
+    def __init__(self, path, providers=("CPUExecutionProvider",)):
+        import onnxruntime
+
+        super(OnnxRunner, self).__init__("cpu", torch.float32)
+        self.session = onnxruntime.InferenceSession(
+            path, providers=list(providers)
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, images):
+        images = np.ascontiguousarray(images.detach().cpu().numpy())
+        output, = self.session.run(None, {self.input_name: images})
+
+        return torch.from_numpy(output)
+
+
+def load_runner(backend, path, architecture=None, device=None):
+    """Load a model exported with export_model()"""
+    logging.info(f"Loading {backend} model: {path}")
+    if backend == "trt":
+        return TRTRunner(path)
+    elif backend == "torchscript":
+        return TorchScriptRunner(path, device)
+    elif backend == "onnx":
+        return OnnxRunner(path)
+    elif backend == "torch":
+        if architecture is None:
+            raise ValueError("The torch backend needs the model architecture")
+        return TorchRunner(load_model(path, architecture), device)
+    raise ValueError(f"Unknown backend: {backend}. "
+                     f"Choose one of {list(MODEL_FILES)}")
+
+
+def export_model(model, backend, path, device=None):
+    """
+    Optimize a trained eager model for backend and save it to path.
+    """
+    model = model.eval()
+    if backend == "trt":
+        from torch2trt import torch2trt
+
+        model = model.cuda().half()
+        data = torch.zeros((1, 3, IMG_SIZE, IMG_SIZE)).cuda().half()
+        model_trt = torch2trt(model, [data], fp16_mode=True)
+        torch.save(model_trt.state_dict(), path)
+        return path
+
+    device = torch.device(device or default_device())
+    model = model.to(device)
+    data = torch.zeros((1, 3, IMG_SIZE, IMG_SIZE), device=device)
+
+    if backend == "torchscript":
+        with torch.no_grad():
+            traced = torch.jit.trace(model, data)
+            frozen = torch.jit.freeze(traced)
+        frozen.save(path)
+    elif backend == "onnx":
+        torch.onnx.export(
+            model.cpu(), data.cpu(), path,
+            input_names=["input"],
+            output_names=["output"],
+            dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}},
+        )
+    elif backend == "torch":
+        torch.save(model.state_dict(), path)
+    else:
+        raise ValueError(f"Unknown backend: {backend}. "
+                         f"Choose one of {list(MODEL_FILES)}")
+
+    return path
+
+
+@torch.no_grad()
+def max_abs_error(reference, runner, n=8, seed=0):
+    """
+    Largest difference between the outputs of the reference eager model
+    and the runner on n random images.
+    """
+    generator = torch.Generator().manual_seed(seed)
+    images = torch.rand((n, 3, IMG_SIZE, IMG_SIZE), generator=generator)
+    param = next(reference.parameters())
+
+    error = 0.0
+    # one image at a time, trt engines are built for a batch size of 1
+    for image in images.split(1):
+        expected = reference(image.to(param.device, param.dtype))
+        output = runner(image.to(runner.device, runner.dtype))
+        diff = (expected.float().cpu() - output.float().cpu()).abs().max()
+        error = max(error, float(diff))
+
+    return error
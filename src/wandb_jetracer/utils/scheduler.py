@@ -0,0 +1,247 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from wandb_jetracer.utils.instrumentation import NULL_PROFILER
+
+
+class Watchdog:
+    """
+    Stops the car if it hasn't been fed a fresh prediction
+    for more than timeout seconds.
+
+    check() can be called by the control loop, or every interval
+    seconds by a background thread (start()) so that the car is
+    stopped even when the control loop hangs.
+    """
+
+    def __init__(self, car, timeout, clock=time.monotonic):
+        self.car = car
+        self.timeout = timeout
+        self.clock = clock
+        self.last_fed = clock()
+        self.tripped = False
+        self.trips = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def feed(self):
+        with self._lock:
+            self.last_fed = self.clock()
+            self.tripped = False
+
+    def check(self):
+        """Returns True if the car has been stopped"""
+        with self._lock:
+            if self.clock() - self.last_fed > self.timeout:
+                if not self.tripped:
+                    logging.warning("No fresh prediction for "
+                                    f"{self.timeout}s, stopping the car")
+                    self.trips += 1
+                self.tripped = True
+                self.car.throttle = 0
+
+            return self.tripped
+
+    def start(self, interval):
+        """check() every interval seconds on a background thread"""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(interval,), name="watchdog",
+            daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            self.check()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+
+class LatestFrame:
+    """
+    Non blocking reader for a camera that keeps updating camera.value
+    in the background (e.g jetcam with camera.running = True).
+    Returns (frame, timestamp) for a new frame and None if
+    camera.value hasn't changed since the last call.
+
+    Frames are timestamped when they arrive, through the camera's
+    traitlets observe(), so their age is how long they waited to be
+    read. Cameras that can't be observed (e.g replay.FakeCamera) are
+    timestamped when read.
+    """
+
+    def __init__(self, camera, clock=time.monotonic):
+        self.camera = camera
+        self.clock = clock
+        self._last = None
+        # (frame, arrival time), swapped as a whole by the camera thread
+        self._latest = None
+        self.observed = hasattr(camera, "observe")
+        if self.observed:
+            camera.observe(self._on_frame, names="value")
+
+    def _on_frame(self, change):
+        self._latest = change["new"], self.clock()
+
+    def __call__(self):
+        if self.observed:
+            latest = self._latest
+        else:
+            latest = self.camera.value, self.clock()
+        if latest is None:
+            return None
+
+        frame, timestamp = latest
+        if frame is None or frame is self._last:
+            return None
+        self._last = frame
+
+        return frame, timestamp
+
+    def close(self):
+        if self.observed:
+            self.camera.unobserve(self._on_frame, names="value")
+
+
+class ControlScheduler:
+    """
+    Run a control step every period seconds, on the latest frame and
+    the time it was captured: step(image, timestamp).
+
+    - frames older than max_frame_age are skipped instead of processed
+    - steps taking longer than period are counted as overruns and
+      the missed periods are dropped rather than caught up on
+    - stages timed with stage() are checked against their budget
+    - the watchdog stops the car when no fresh frame made it
+      through step for watchdog_timeout seconds. With
+      watchdog_interval, it is checked that often on its own thread
+      during run(), so a step that hangs still stops the car; without,
+      it is checked between steps.
+
+    Stage timings are also recorded in profiler's histograms.
+    """
+
+    def __init__(self, car, period, watchdog_timeout, budgets=None,
+                 max_frame_age=None, watchdog_interval=None,
+                 profiler=NULL_PROFILER, clock=time.monotonic,
+                 sleep=time.sleep):
+        self.period = period
+        self.profiler = profiler
+        self.budgets = budgets or {}
+        self.max_frame_age = period if max_frame_age is None \
+            else max_frame_age
+        self.clock = clock
+        self.sleep = sleep
+        self.watchdog = Watchdog(car, watchdog_timeout, clock)
+        self.watchdog_interval = watchdog_interval
+        self._watchdog_thread = False
+
+        self.ticks = 0
+        self.steps = 0
+        self.overruns = 0
+        self.missed_periods = 0
+        self.stale_frames = 0
+        self.over_budget = {name: 0 for name in self.budgets}
+        self.jitter_max = 0.0
+        self.jitter_sum = 0.0
+
+    @contextmanager
+    def stage(self, name):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            elapsed = self.clock() - start
+            self.profiler.record(name, int(elapsed * 1e9))
+            budget = self.budgets.get(name)
+            if budget is not None and elapsed > budget:
+                self.over_budget[name] += 1
+
+    def tick(self, read_frame, step):
+        """Run step on the latest frame if it is fresh enough"""
+        self.ticks += 1
+        frame = read_frame()
+        if frame is None:
+            self._check_watchdog()
+            return False
+
+        image, timestamp = frame
+        if self.clock() - timestamp > self.max_frame_age:
+            self.stale_frames += 1
+            self._check_watchdog()
+            return False
+
+        step(image, timestamp)
+        self.steps += 1
+        self.watchdog.feed()
+
+        return True
+
+    def _check_watchdog(self):
+        if not self._watchdog_thread:
+            self.watchdog.check()
+
+    def run(self, read_frame, step, should_stop=lambda: False):
+        if self.watchdog_interval is not None:
+            self.watchdog.start(self.watchdog_interval)
+            self._watchdog_thread = True
+        try:
+            self._run(read_frame, step, should_stop)
+        finally:
+            self.watchdog.stop()
+            self._watchdog_thread = False
+
+    def _run(self, read_frame, step, should_stop):
+        deadline = self.clock()
+        while not should_stop():
+            start = self.clock()
+            jitter = abs(start - deadline)
+            self.jitter_max = max(self.jitter_max, jitter)
+            self.jitter_sum += jitter
+
+            self.tick(read_frame, step)
+
+            deadline += self.period
+            now = self.clock()
+            if now > deadline:
+                self.overruns += 1
+                missed = int((now - deadline) // self.period) + 1
+                self.missed_periods += missed
+                deadline += missed * self.period
+            self.sleep(deadline - now)
+
+    @staticmethod
+    def stats_keys(budgets=()):
+        """Keys of stats(), for a scheduler with those stage budgets"""
+        return [
+            "scheduler/overruns",
+            "scheduler/missed_periods",
+            "scheduler/stale_frames",
+            "scheduler/jitter_max_ms",
+            "scheduler/jitter_mean_ms",
+            "scheduler/watchdog_trips",
+            *(f"scheduler/{name}_over_budget" for name in budgets),
+        ]
+
+    def stats(self):
+        stats = {
+            "scheduler/overruns": self.overruns,
+            "scheduler/missed_periods": self.missed_periods,
+            "scheduler/stale_frames": self.stale_frames,
+            "scheduler/jitter_max_ms": self.jitter_max * 1e3,
+            "scheduler/jitter_mean_ms":
+                self.jitter_sum / max(self.ticks, 1) * 1e3,
+            "scheduler/watchdog_trips": self.watchdog.trips,
+        }
+        for name, count in self.over_budget.items():
+            stats[f"scheduler/{name}_over_budget"] = count
+
+        return stats
@@ -0,0 +1,154 @@
+import glob
+import logging
+import os
+import threading
+import time
+
+JTOP_KEYS = ["GPU", "Temp GPU", "Temp CPU", "power avg", "power cur"]
+# how old the snapshot is, logged along with the stats
+STATS_AGE_KEY = "system/stats_age_seconds"
+
+
+class JtopSource:
+    """GPU load, temperatures and power of a started jtop instance"""
+
+    def __init__(self, jetson):
+        self.jetson = jetson
+
+    @staticmethod
+    def keys():
+        return list(JTOP_KEYS)
+
+    def read(self):
+        stats = self.jetson.stats
+        return {key: stats[key] for key in JTOP_KEYS}
+
+
+class ProcSource:
+    """
+    CPU load and RAM usage (%) from /proc and temperatures (C) from
+    /sys/class/thermal, for linux machines that aren't jetsons.
+    """
+
+    def __init__(self, root="/"):
+        self.root = root
+        self._last_cpu = None
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def _cpu(self):
+        with open(self._path("proc", "stat")) as f:
+            values = [int(v) for v in f.readline().split()[1:]]
+        # idle and iowait
+        idle, total = values[3] + values[4], sum(values)
+
+        load = None
+        if self._last_cpu is not None:
+            last_idle, last_total = self._last_cpu
+            if total > last_total:
+                load = 100 * (1 - (idle - last_idle) / (total - last_total))
+        self._last_cpu = idle, total
+
+        return load
+
+    def _ram(self):
+        meminfo = {}
+        with open(self._path("proc", "meminfo")) as f:
+            for line in f:
+                name, value = line.split(":", 1)
+                meminfo[name] = int(value.split()[0])
+
+        return 100 * (1 - meminfo["MemAvailable"] / meminfo["MemTotal"])
+
+    def _temperatures(self):
+        temperatures = {}
+        pattern = self._path("sys", "class", "thermal", "thermal_zone*")
+        for zone in sorted(glob.glob(pattern)):
+            try:
+                with open(os.path.join(zone, "type")) as f:
+                    name = f.read().strip()
+                with open(os.path.join(zone, "temp")) as f:
+                    temperature = int(f.read()) / 1000
+            except (OSError, ValueError):
+                continue
+            temperatures[f"Temp {name}"] = temperature
+
+        return temperatures
+
+    @staticmethod
+    def keys(root="/"):
+        """What read() returns on this machine, without reading it"""
+        pattern = os.path.join(root, "sys", "class", "thermal",
+                               "thermal_zone*")
+        temperatures = []
+        for zone in sorted(glob.glob(pattern)):
+            try:
+                with open(os.path.join(zone, "type")) as f:
+                    temperatures.append(f"Temp {f.read().strip()}")
+            except OSError:
+                continue
+
+        return ["RAM", *temperatures, "CPU"]
+
+    def read(self):
+        stats = {"RAM": self._ram(), **self._temperatures()}
+        cpu = self._cpu()
+        if cpu is not None:
+            stats["CPU"] = cpu
+
+        return stats
+
+
+class SystemStats:
+    """
+    Samples a source (JtopSource, ProcSource) rate times per second on
+    a background thread. snapshot() never waits: it returns the last
+    stats along with how old they are, system/stats_age_seconds.
+    """
+
+    def __init__(self, source, rate=1.0, clock=time.monotonic):
+        self.source = source
+        self.period = 1 / rate
+        self.clock = clock
+        self.errors = 0
+
+        self._snapshot = ({}, None)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="system-stats", daemon=True
+        )
+
+    def start(self):
+        # the first snapshot is available right away
+        self.sample()
+        self._thread.start()
+        return self
+
+    def sample(self):
+        try:
+            stats = self.source.read()
+        except Exception:
+            logging.exception("Failed to read system stats")
+            self.errors += 1
+            return
+        # a single assignment, readers see the old or the new snapshot
+        self._snapshot = (stats, self.clock())
+
+    def _run(self):
+        while not self._stop.wait(self.period):
+            self.sample()
+
+    def snapshot(self, now=None):
+        stats, sampled_at = self._snapshot
+        if sampled_at is None:
+            return {}
+        if now is None:
+            now = self.clock()
+
+        return {**stats, STATS_AGE_KEY: now - sampled_at}
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
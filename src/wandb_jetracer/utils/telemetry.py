@@ -0,0 +1,266 @@
+import json
+import logging
+import numbers
+import threading
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Preallocated, fixed size buffer. append() is O(1) and overwrites
+    the oldest item once the buffer is full.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._items = [None] * capacity
+        self._head = 0  # next slot to write
+        self._count = 0
+        self._lock = threading.Lock()
+        self.overwritten = 0
+
+    def append(self, item):
+        with self._lock:
+            self._items[self._head] = item
+            self._head = (self._head + 1) % self.capacity
+            if self._count == self.capacity:
+                self.overwritten += 1
+            else:
+                self._count += 1
+
+    def drain(self):
+        """Remove and return all items, oldest first"""
+        with self._lock:
+            start = (self._head - self._count) % self.capacity
+            items = [self._items[(start + i) % self.capacity]
+                     for i in range(self._count)]
+            for i in range(self._count):
+                self._items[(start + i) % self.capacity] = None
+            self._count = 0
+
+        return items
+
+    def __len__(self):
+        return self._count
+
+
+class Image:
+    """
+    RGB image (HxWx3 uint8) and optional wandb bounding boxes, turned
+    into whatever the backend stores on the telemetry thread.
+    """
+
+    def __init__(self, data, boxes=None):
+        self.data = data
+        self.boxes = boxes
+
+    def __repr__(self):
+        return f"Image(shape={self.data.shape})"
+
+
+class Video:
+    """Video file and the time (unix seconds) of each of its frames"""
+
+    def __init__(self, path, timestamps, fps):
+        self.path = path
+        self.timestamps = timestamps
+        self.fps = fps
+
+    def __repr__(self):
+        return f"Video(path={self.path!r}, frames={len(self.timestamps)})"
+
+
+class MemoryBackend:
+    """Keeps every flushed row in memory, used as a stand-in for tests"""
+
+    def __init__(self):
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(row)
+
+    def close(self):
+        pass
+
+
+class FileBackend:
+    """Appends flushed rows to a json lines file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "a")
+
+    def write(self, row):
+        # non serializable values (e.g images) are stored as their repr
+        self._file.write(json.dumps(row, default=repr) + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+class WandbBackend:
+    def __init__(self, run=None):
+        import wandb
+        self._wandb = wandb
+        self._log = run.log if run is not None else wandb.log
+
+    def write(self, row):
+        self._log(to_wandb(row, self._wandb))
+
+    def close(self):
+        pass
+
+
+def to_wandb(row, wandb):
+    """
+    row with its Images as wandb.Image and its Videos as wandb.Video,
+    with their frame index -> time table as {key}_timestamps
+    """
+    converted = {}
+    for k, v in row.items():
+        if isinstance(v, Image):
+            converted[k] = wandb.Image(v.data, boxes=v.boxes)
+        elif isinstance(v, Video):
+            converted[k] = wandb.Video(v.path)
+            converted[f"{k}_timestamps"] = wandb.Table(
+                columns=["frame", "time"],
+                data=[[i, t] for i, t in enumerate(v.timestamps)],
+            )
+        else:
+            converted[k] = v
+
+    return converted
+
+
+def is_scalar(value):
+    return isinstance(value, numbers.Number) and not isinstance(value, bool)
+
+
+def downsample(records):
+    """Keep the last value of every scalar"""
+    row = {}
+    for record in records:
+        row.update(record)
+
+    return row
+
+
+def aggregate(records):
+    """Summarize every scalar with its mean, min, max and p99"""
+    columns = {}
+    for record in records:
+        for k, v in record.items():
+            columns.setdefault(k, []).append(v)
+
+    row = {}
+    for k, values in columns.items():
+        values = np.asarray(values, dtype=np.float64)
+        row[k] = float(values.mean())
+        row[f"{k}/min"] = float(values.min())
+        row[f"{k}/max"] = float(values.max())
+        row[f"{k}/p99"] = float(np.percentile(values, 99))
+
+    return row
+
+
+REDUCERS = {
+    "downsample": downsample,
+    "aggregate": aggregate,
+}
+
+
+def reduced_columns(columns, mode):
+    """Scalars in the rows REDUCERS[mode] makes of columns"""
+    if mode == "aggregate":
+        return [
+            f"{k}{suffix}" for k in columns
+            for suffix in ["", "/min", "/max", "/p99"]
+        ]
+
+    return list(columns)
+
+
+class TelemetrySink:
+    """
+    Collects telemetry from the control loop and flushes it
+    to a backend from a background thread.
+
+    log() only appends the record to a ring buffer. Every 1/flush_hz
+    seconds the buffered scalars are reduced to a single row (see
+    REDUCERS) while non scalar values (images, boxes...) are written
+    as they were logged.
+    """
+
+    def __init__(self, backend, flush_hz=1.0, mode="downsample",
+                 capacity=1024):
+        if mode not in REDUCERS:
+            raise ValueError(f"Unknown telemetry mode: {mode}. "
+                             f"Choose one of {list(REDUCERS)}")
+
+        self.backend = backend
+        self.period = 1.0 / flush_hz
+        self.reduce = REDUCERS[mode]
+        self.buffer = RingBuffer(capacity)
+
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="telemetry", daemon=True
+        )
+        self._thread.start()
+
+    def log(self, record):
+        self.buffer.append(record)
+
+    def flush(self):
+        records = self.buffer.drain()
+        if not records:
+            return
+
+        scalars = []
+        for record in records:
+            scalars.append({k: v for k, v in record.items() if is_scalar(v)})
+            others = {k: v for k, v in record.items() if not is_scalar(v)}
+            if others:
+                self.backend.write(others)
+
+        row = self.reduce(scalars)
+        if row:
+            self.backend.write(row)
+
+        if self.buffer.overwritten:
+            logging.debug(f"{self.buffer.overwritten} telemetry records "
+                          "overwritten before being flushed")
+
+    def _run(self):
+        while not self._stop_event.wait(self.period):
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("Failed to flush telemetry")
+
+    def close(self):
+        self._stop_event.set()
+        self._thread.join()
+        self.flush()
+        self.backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def make_backend(name, path=None, config=None, columns=()):
+    """columns are the scalars the run store keeps, see RunStore"""
+    if name == "wandb":
+        return WandbBackend()
+    elif name == "file":
+        return FileBackend(path)
+    elif name == "store":
+        from wandb_jetracer.utils.run_store import RunStore
+        return RunStore(path, columns, config)
+    elif name == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown telemetry backend: {name}")
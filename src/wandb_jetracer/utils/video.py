@@ -0,0 +1,168 @@
+import logging
+import os
+import queue
+import threading
+
+import cv2
+
+from wandb_jetracer.utils.telemetry import Video
+
+# fourcc: file extension. Browsers, hence wandb, play VP80 and avc1
+# (h264, rarely in opencv builds) but not mp4v
+CODECS = {
+    "VP80": ".webm",
+    "avc1": ".mp4",
+    "mp4v": ".mp4",
+}
+DEFAULT_CODEC = "VP80"
+# keys of VideoRecorder.stats()
+VIDEO_STATS_KEYS = [
+    "video/frames", "video/dropped", "video/failed", "video/segments"
+]
+
+
+def can_encode(directory, codec):
+    """Whether opencv can write codec videos in directory"""
+    path = os.path.join(directory, f".probe{CODECS[codec]}")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), 10,
+                             (32, 32))
+    opened = writer.isOpened()
+    writer.release()
+    if os.path.exists(path):
+        os.remove(path)
+
+    return opened
+
+
+def write_timestamps(path, timestamps):
+    """frame index -> time csv, next to a video segment"""
+    with open(path, "w") as f:
+        f.write("frame,time\n")
+        for i, t in enumerate(timestamps):
+            f.write(f"{i},{t:.6f}\n")
+
+
+class VideoRecorder:
+    """
+    Encodes frames (BGR) into video segments of segment_frames frames
+    in directory, on a background thread, so the control loop only pays
+    for a queue put. Frames must not be modified after submit().
+
+    overlay(frame, *args) draws on a copy of each frame before it is
+    encoded, with the args it was submitted with. Once a segment is
+    complete, its frame index -> time sidecar (.csv) is written and
+    on_segment is called with it as a Video, e.g to log it.
+    When the queue is full, frames are dropped and counted in stats().
+    Raises ValueError right away if opencv can't encode codec.
+    """
+
+    def __init__(self, directory, fps, segment_frames, codec=DEFAULT_CODEC,
+                 overlay=None, on_segment=None, max_queue=32):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec}. "
+                             f"Choose one of {list(CODECS)}")
+
+        os.makedirs(directory, exist_ok=True)
+        if not can_encode(directory, codec):
+            available = [c for c in CODECS if can_encode(directory, c)]
+            raise ValueError(f"opencv can't encode {codec} videos. "
+                             f"Choose one of {available}")
+        self.directory = directory
+        self.fps = fps
+        self.segment_frames = segment_frames
+        self.codec = codec
+        self.overlay = overlay
+        self.on_segment = on_segment
+
+        self.frames = 0
+        self.dropped = 0
+        self.failed = 0
+        self.segments = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(
+            target=self._run, name="video-recorder", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, frame, t, *args):
+        """Queue frame, taken at t, returns False if it was dropped"""
+        try:
+            self._queue.put_nowait((frame, t, args))
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+        return True
+
+    def _open(self, shape):
+        path = os.path.join(
+            self.directory, f"segment-{self.segments:04d}"
+            f"{CODECS[self.codec]}"
+        )
+        height, width = shape[:2]
+        writer = cv2.VideoWriter(
+            path, cv2.VideoWriter_fourcc(*self.codec), self.fps,
+            (width, height)
+        )
+        if not writer.isOpened():
+            logging.error(f"Can't encode {self.codec} to {path}, "
+                          "debug frames won't be recorded")
+            return None, path
+
+        return writer, path
+
+    def _finish(self, writer, path, timestamps):
+        writer.release()
+        write_timestamps(os.path.splitext(path)[0] + ".csv", timestamps)
+        self.segments += 1
+        if self.on_segment is not None:
+            self.on_segment(Video(path, timestamps, self.fps))
+
+    def _run(self):
+        writer, path, timestamps = None, None, []
+        broken = False
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            frame, t, args = item
+            if writer is None and not broken:
+                writer, path = self._open(frame.shape)
+                # e.g the frame size can't be encoded, don't retry
+                # every frame
+                broken = writer is None
+            if broken:
+                self.failed += 1
+                continue
+
+            try:
+                if self.overlay is not None:
+                    frame = self.overlay(frame.copy(), *args)
+                writer.write(frame)
+            except Exception:
+                logging.exception("Failed to encode a debug frame")
+                self.failed += 1
+                continue
+            timestamps.append(t)
+            self.frames += 1
+
+            if len(timestamps) == self.segment_frames:
+                self._finish(writer, path, timestamps)
+                writer, path, timestamps = None, None, []
+
+        if writer is not None:
+            self._finish(writer, path, timestamps)
+
+    def close(self):
+        """Encode the queued frames and finish the last segment"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        return {
+            "video/frames": self.frames,
+            "video/dropped": self.dropped,
+            "video/failed": self.failed,
+            "video/segments": self.segments,
+        }
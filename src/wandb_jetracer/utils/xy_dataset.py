@@ -1,20 +1,226 @@
 import torch
 import os
+import csv
 import glob
+import hashlib
+import logging
 import uuid
 import PIL.Image
 import torch.utils.data
-import subprocess
 import cv2
 import numpy as np
 from torchvision import transforms
 
+INDEX_SUFFIX = ".index.npz"
+JOURNAL_SUFFIX = ".journal.csv"
+# entries journaled by save_entry() before they are compacted in the index
+COMPACT_EVERY = 256
+
+
+def _directory_key(directory):
+    return hashlib.sha1(os.path.abspath(directory).encode()).hexdigest()
+
+
+def index_path(directory, cache_dir):
+    """The index of a directory is saved in cache_dir, named after it"""
+    return os.path.join(cache_dir, _directory_key(directory) + INDEX_SUFFIX)
+
+
+def journal_path(directory, cache_dir):
+    """Entries saved since the index was, appended next to it"""
+    return os.path.join(
+        cache_dir, _directory_key(directory) + JOURNAL_SUFFIX
+    )
+
+
+class AnnotationIndex:
+    """
+    Image names and x, y labels held in a few flat numpy arrays:
+    names are concatenated in a single uint8 buffer sliced by offsets,
+    labels are int16. Unlike a list of dicts, forked DataLoader workers
+    can read it without touching refcounts (and copying pages).
+    append() is amortized O(1).
+    """
+
+    def __init__(self, capacity=1024, name_size=48):
+        self._names = np.zeros(capacity * name_size, dtype=np.uint8)
+        self._offsets = np.zeros(capacity + 1, dtype=np.int64)
+        self._xy = np.zeros((capacity, 2), dtype=np.int16)
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self._len
+        if not 0 <= idx < self._len:
+            raise IndexError(idx)
+
+        start, end = self._offsets[idx], self._offsets[idx + 1]
+        name = self._names[start:end].tobytes().decode()
+        x, y = self._xy[idx]
+
+        return name, int(x), int(y)
+
+    @property
+    def xy(self):
+        return self._xy[:self._len]
+
+    def append(self, name, x, y):
+        encoded = np.frombuffer(name.encode(), dtype=np.uint8)
+        start = self._offsets[self._len]
+        end = start + len(encoded)
+
+        if self._len == len(self._xy):
+            capacity = max(2 * self._len, 16)
+            self._xy = np.resize(self._xy, (capacity, 2))
+            self._offsets = np.resize(self._offsets, capacity + 1)
+        if end > len(self._names):
+            self._names = np.resize(self._names, 2 * end)
+
+        self._names[start:end] = encoded
+        self._offsets[self._len + 1] = end
+        self._xy[self._len] = x, y
+        self._len += 1
+
+    def save(self, path, directory_mtime):
+        # write then rename so readers never see a partial index
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                names=self._names[:self._offsets[self._len]],
+                offsets=self._offsets[:self._len + 1],
+                xy=self.xy,
+                directory_mtime=directory_mtime,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Returns the index and the directory mtime it was saved with"""
+        index = cls(capacity=0)
+        with np.load(path) as data:
+            index._names = data["names"]
+            index._offsets = data["offsets"]
+            index._xy = data["xy"]
+            directory_mtime = int(data["directory_mtime"])
+        index._len = len(index._xy)
+
+        return index, directory_mtime
+
+
+def directory_hash(directory, names):
+    """
+    Hash of the names (which hold the labels), sizes and mtimes of the
+    images, a rewritten image changes its mtime even if not its size
+    """
+    sha = hashlib.sha1()
+    for name in names:
+        stat = os.stat(os.path.join(directory, name))
+        sha.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+
+    return sha.hexdigest()
+
+
+class FrameCache:
+    """
+    Every image of a directory decoded and resized once into a single
+    uint8 NxHxWx3 memory mapped file, next to their normalized labels.
+    Files are named after the directory and directory_hash() so any
+    added, removed, renamed or modified image invalidates the cache,
+    the stale files of the directory are then deleted.
+    """
+
+    def __init__(self, directory, index, cache_dir, size=224):
+        self.size = size
+        names = sorted(index[i][0] for i in range(len(index)))
+        key = directory_hash(directory, names)
+        prefix = _directory_key(directory)
+        frames_path = os.path.join(cache_dir, f"{prefix}-{key}.frames.u8")
+        labels_path = os.path.join(cache_dir, f"{prefix}-{key}.labels.npy")
+
+        if not os.path.exists(labels_path):
+            os.makedirs(cache_dir, exist_ok=True)
+            self._remove_stale(cache_dir, prefix, key)
+            self._build(directory, names, frames_path, labels_path)
+
+        self.labels = np.load(labels_path)
+        if len(self.labels) == 0:
+            self.frames = np.zeros((0, size, size, 3), dtype=np.uint8)
+        else:
+            self.frames = np.memmap(
+                frames_path, dtype=np.uint8, mode="r",
+                shape=(len(self.labels), size, size, 3)
+            )
+
+    @staticmethod
+    def _remove_stale(cache_dir, prefix, key):
+        """Files cached for the directory before its last change"""
+        for fname in os.listdir(cache_dir):
+            if not fname.startswith(f"{prefix}-") \
+                    or fname.startswith(f"{prefix}-{key}."):
+                continue
+            try:
+                os.remove(os.path.join(cache_dir, fname))
+            except OSError as e:
+                logging.warning(f"Can't remove {fname}: {e}")
+
+    def _build(self, directory, names, frames_path, labels_path):
+        labels = np.zeros((len(names), 2), dtype=np.float32)
+        if names:
+            frames = np.memmap(
+                frames_path + ".tmp", dtype=np.uint8, mode="w+",
+                shape=(len(names), self.size, self.size, 3)
+            )
+            for i, name in enumerate(names):
+                image = cv2.imread(os.path.join(directory, name),
+                                   cv2.IMREAD_COLOR)
+                height, width, _ = image.shape
+                # same resizing as transforms.Resize
+                image = PIL.Image.fromarray(image).resize(
+                    (self.size, self.size), PIL.Image.BILINEAR
+                )
+                frames[i] = np.asarray(image)
+
+                x, y = XYDataset._parse(name)
+                labels[i] = 2.0 * (x / width - 0.5), 2.0 * (y / height - 0.5)
+            frames.flush()
+            del frames
+            os.replace(frames_path + ".tmp", frames_path)
+
+        # labels are written last, their presence marks a complete cache
+        np.save(labels_path, labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, idx):
+        x, y = self.labels[idx]
+        return self.frames[idx], float(x), float(y)
+
 
 class XYDataset(torch.utils.data.Dataset):
-    def __init__(self, directory, train=True):
+    """
+    Images labelled with x, y coordinates in their filename.
+    If cache_dir is specified images are decoded and resized once
+    into a FrameCache, augmentations are still applied on the fly, and
+    the index of the images is kept there so it isn't rebuilt until
+    the directory changes. save_entry() appends to a journal next to
+    the index, compacted into it every COMPACT_EVERY entries and on
+    close().
+    If uint8, images are returned as resized uint8 CHW tensors without
+    any augmentation, to be augmented by batch (see augment.BatchAugment).
+    """
+
+    def __init__(self, directory, train=True, cache_dir=None, uint8=False):
         super(XYDataset, self).__init__()
         self.directory = directory
-        if train:
+        self.uint8 = uint8
+        if uint8:
+            self.transform = transforms.Resize((224, 224))
+        elif train:
             self.transform = transforms.Compose(
                 [
                     transforms.ColorJitter(0.2, 0.2, 0.2, 0.2),
@@ -30,63 +236,263 @@ class XYDataset(torch.utils.data.Dataset):
                 ]
             )
 
-        self.refresh()
+        self.cache_dir = cache_dir
+        self._journal = None
+        self._journaled = 0
+        self.index = self._load_index()
+
+        self.cache = None
+        if cache_dir is not None:
+            self.cache = FrameCache(self.directory, self.index, cache_dir)
 
         # augment the training set only
-        self.random_hflip = train
+        self.random_hflip = train and not uint8
 
     def __len__(self):
-        return len(self.annotations)
+        return len(self.index)
 
-    def __getitem__(self, idx):
-        ann = self.annotations[idx]
-        image = cv2.imread(ann["image_path"], cv2.IMREAD_COLOR)
+    def _load(self, idx):
+        if self.cache is not None:
+            return self.cache[idx]
+
+        name, ann_x, ann_y = self.index[idx]
+        image_path = os.path.join(self.directory, name)
+        image = cv2.imread(image_path, cv2.IMREAD_COLOR)
         image = PIL.Image.fromarray(image)
         width = image.width
         height = image.height
+
+        x = 2.0 * (ann_x / width - 0.5)  # -1 left, +1 right
+        y = 2.0 * (ann_y / height - 0.5)  # -1 top, +1 bottom
+
+        return image, x, y
+
+    def __getitem__(self, idx):
+        image, x, y = self._load(idx)
+
+        if self.uint8:
+            if isinstance(image, PIL.Image.Image):
+                image = self.transform(image)
+            image = torch.from_numpy(np.array(image)).permute(2, 0, 1)
+            return image, torch.Tensor([x, y])
+
+        if isinstance(image, np.ndarray):
+            image = PIL.Image.fromarray(np.asarray(image))
         if self.transform is not None:
             image = self.transform(image)
 
-        x = 2.0 * (ann["x"] / width - 0.5)  # -1 left, +1 right
-        y = 2.0 * (ann["y"] / height - 0.5)  # -1 top, +1 bottom
-
-        if self.random_hflip and float(np.random.random(1)) > 0.5:
+        if self.random_hflip and np.random.random() > 0.5:
             image = torch.from_numpy(image.numpy()[..., ::-1].copy())
             x = -x
 
         return image, torch.Tensor([x, y])
 
-    def _parse(self, path):
+    @staticmethod
+    def _parse(path):
         basename = os.path.basename(path)
         items = basename.split("_")
         x = items[0]
         y = items[1]
         return int(x), int(y)
 
+    def _load_index(self):
+        """Load the saved index, unless the directory changed since"""
+        if self.cache_dir is not None:
+            try:
+                index, mtime = AnnotationIndex.load(
+                    index_path(self.directory, self.cache_dir)
+                )
+                mtime = self._replay_journal(index, mtime)
+                if mtime == os.stat(self.directory).st_mtime_ns:
+                    return index
+            except (OSError, KeyError, ValueError):
+                pass
+
+        self.refresh()
+        return self.index
+
+    def _replay_journal(self, index, mtime):
+        """
+        Append the entries journaled since the index was saved, returns
+        the directory mtime after the last of them
+        """
+        path = journal_path(self.directory, self.cache_dir)
+        if not os.path.exists(path):
+            return mtime
+
+        with open(path, newline="") as f:
+            for row in csv.reader(f):
+                # a crash can leave a truncated last row
+                if len(row) != 2:
+                    continue
+                name, mtime = row[0], int(row[1])
+                index.append(name, *self._parse(name))
+                self._journaled += 1
+
+        return mtime
+
     def refresh(self):
-        self.annotations = []
+        """Rebuild the index from the images in the directory"""
+        self.index = AnnotationIndex()
+        if not os.path.isdir(self.directory):
+            return
+
+        # stat before listing so changes made meanwhile invalidate the index
+        mtime = os.stat(self.directory).st_mtime_ns
         for image_path in glob.glob(os.path.join(self.directory, "*.jpg")):
             x, y = self._parse(image_path)
-            self.annotations += [{"image_path": image_path, "x": x, "y": y}]
+            self.index.append(os.path.basename(image_path), x, y)
+        self._save_index(mtime)
+
+    def _save_index(self, mtime):
+        if self.cache_dir is None:
+            return
+        try:
+            # removed first: if saving fails, the index left without
+            # the journaled entries doesn't match the directory mtime
+            self._close_journal()
+            self._journaled = 0
+            path = journal_path(self.directory, self.cache_dir)
+            if os.path.exists(path):
+                os.remove(path)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.index.save(index_path(self.directory, self.cache_dir), mtime)
+        except OSError as e:
+            # only costs a rebuild next time
+            logging.warning(f"Can't save the index of {self.directory}: {e}")
+
+    def save_index(self):
+        """Persist the index in cache_dir, if there is one"""
+        self._save_index(os.stat(self.directory).st_mtime_ns)
+
+    def _journal_entry(self, filename):
+        if self.cache_dir is None:
+            return
+        if self._journaled + 1 >= COMPACT_EVERY:
+            self.save_index()
+            return
+
+        try:
+            if self._journal is None:
+                # nothing to append to yet
+                if not os.path.exists(
+                    index_path(self.directory, self.cache_dir)
+                ):
+                    self.save_index()
+                    return
+                self._journal = open(
+                    journal_path(self.directory, self.cache_dir), "a",
+                    newline=""
+                )
+            csv.writer(self._journal).writerow(
+                [filename, os.stat(self.directory).st_mtime_ns]
+            )
+            self._journal.flush()
+            self._journaled += 1
+        except OSError as e:
+            logging.warning(f"Can't journal {filename}: {e}")
+
+    def _close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
 
     def save_entry(self, category, image, x, y):
-        if not os.path.exists(self.directory):
-            subprocess.call(["mkdir", "-p", self.directory])
+        os.makedirs(self.directory, exist_ok=True)
 
         filename = "%d_%d_%s.jpg" % (x, y, str(uuid.uuid1()))
 
         image_path = os.path.join(self.directory, filename)
         cv2.imwrite(image_path, image)
-        self.refresh()
+        self.index.append(filename, x, y)
+        # the image changed the directory mtime, keep the index valid
+        self._journal_entry(filename)
+
+    def close(self):
+        """Compact the journaled entries into the index"""
+        if self._journaled:
+            self.save_index()
+        self._close_journal()
+
+
+MEAN = (0.485, 0.456, 0.406)
+STD = (0.229, 0.224, 0.225)
+
+
+class Preprocessor:
+    """
+    Converts HWC uint8 frames into 1xCxHxW float tensors ready for the
+    model, reusing the same preallocated (and pinned if on cuda) buffers
+    for every frame. The returned tensor is overwritten by the next call.
+
+    By default the output matches what XYDataset feeds the model during
+    training: channels in the camera's BGR order, scaled to [0, 1].
+    The channel swap and normalization, if enabled, are folded into the
+    uint8 -> float conversion.
+    """
+
+    def __init__(self, height=224, width=224, device=None,
+                 dtype=torch.float32, bgr2rgb=False, normalize=False):
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = torch.device(device)
+        self.on_cuda = self.device.type == "cuda"
+        self.shape = (height, width, 3)
+        self.channels = (2, 1, 0) if bgr2rgb else (0, 1, 2)
+
+        if self.on_cuda:
+            self.host = torch.empty(
+                self.shape, dtype=torch.uint8, pin_memory=True
+            )
+            self.staging = torch.empty(
+                self.shape, dtype=torch.uint8, device=self.device
+            )
+        self.input = torch.empty(
+            (1, 3, height, width), dtype=dtype, device=self.device
+        )
+
+        # x / 255 then (x - mean) / std as a single x * scale + shift
+        # MEAN and STD are in RGB order
+        mean = torch.tensor(MEAN if normalize else (0., 0., 0.))
+        std = torch.tensor(STD if normalize else (1., 1., 1.))
+        if not bgr2rgb:
+            mean, std = mean.flip(0), std.flip(0)
+        self.scale = (1 / (255 * std)).view(1, 3, 1, 1).to(self.device, dtype)
+        self.shift = (-mean / std).view(1, 3, 1, 1).to(self.device, dtype)
+
+    def __call__(self, image):
+        if image.shape != self.shape:
+            raise ValueError(f"Expected a {self.shape} image, "
+                             f"got {image.shape}")
+
+        if self.on_cuda:
+            self.host.numpy()[...] = image
+            self.staging.copy_(self.host, non_blocking=True)
+            source = self.staging
+        else:
+            source = torch.from_numpy(image)
+
+        chw = source.permute(2, 0, 1)
+        for dst, src in enumerate(self.channels):
+            self.input[0, dst].copy_(chw[src])
+        self.input.mul_(self.scale).add_(self.shift)
+
+        return self.input
+
 
+_preprocessors = {}
 
-mean = torch.Tensor([0.485, 0.456, 0.406]).cuda()
-std = torch.Tensor([0.229, 0.224, 0.225]).cuda()
 
+def preprocess(image, dtype=torch.float32, device=None):
+    """
+    Shortcut to a shared Preprocessor for the given dtype and device.
+    The returned tensor is reused by the next call.
+    """
+    key = (image.shape, dtype, device)
+    if key not in _preprocessors:
+        height, width, _ = image.shape
+        _preprocessors[key] = Preprocessor(
+            height, width, device=device, dtype=dtype
+        )
 
-def preprocess(image):
-    device = torch.device('cuda')
-    image = PIL.Image.fromarray(image)
-    image = transforms.functional.to_tensor(image).to(device)
-    # image.sub_(mean[:, None, None]).div_(std[:, None, None])
-    return image[None, ...]
+    return _preprocessors[key](image)
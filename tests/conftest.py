@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+
+class ManualClock:
+    """Time only moves when set, or when sleeping"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 0)
+
+
+@pytest.fixture
+def clock():
+    return ManualClock()
+
+
+@pytest.fixture(scope="session")
+def dataset(tmp_path_factory):
+    """Test split of 6 random 224x224 images with random labels"""
+    # imported here so that tests without torch still run
+    from wandb_jetracer.utils.xy_dataset import XYDataset
+
+    directory = str(tmp_path_factory.mktemp("test"))
+    rng = np.random.default_rng(0)
+    writer = XYDataset(directory)
+    for _ in range(6):
+        image = rng.integers(0, 256, (224, 224, 3), dtype=np.uint8)
+        writer.save_entry(None, image, *rng.integers(0, 224, 2))
+
+    return XYDataset(directory, train=False)
@@ -0,0 +1,96 @@
+import pytest
+
+# not in the labelling env the CI runs in
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+
+from torch.utils.data import DataLoader  # noqa: E402
+from torchvision.transforms import functional as F  # noqa: E402
+
+from wandb_jetracer.utils.augment import (BatchAugment,  # noqa: E402
+                                          augmented_collate)
+
+
+@pytest.fixture
+def images():
+    generator = torch.Generator().manual_seed(0)
+    # mid range values so torchvision never has to clamp between ops
+    return torch.randint(64, 192, (4, 3, 8, 8), dtype=torch.uint8,
+                         generator=generator)
+
+
+def only(**kwargs):
+    params = dict(brightness=0, contrast=0, saturation=0, hue=0, hflip=0)
+    params.update(kwargs)
+    return BatchAugment(generator=torch.Generator().manual_seed(1), **params)
+
+
+def draws(position, n=4):
+    """Random numbers drawn for the op at position, in call order"""
+    rand = torch.rand(5 * n, generator=torch.Generator().manual_seed(1))
+    return rand[position * n:(position + 1) * n]
+
+
+def test_identity(images):
+    out, targets = only()(images, torch.zeros(4, 2))
+
+    assert out.dtype == torch.float32
+    assert torch.allclose(out, images.float() / 255, atol=1e-6)
+
+
+@pytest.mark.parametrize("position, op, adjust", [
+    (0, "brightness", F.adjust_brightness),
+    (1, "contrast", F.adjust_contrast),
+    (2, "saturation", F.adjust_saturation),
+])
+def test_matches_torchvision_per_sample(images, position, op, adjust):
+    out, _ = only(**{op: 0.2})(images, torch.zeros(4, 2))
+
+    floats = images.float() / 255
+    factors = 0.8 + 0.4 * draws(position)
+    for image, factor, result in zip(floats, factors, out):
+        expected = adjust(image, float(factor))
+        assert torch.allclose(result, expected, atol=1e-4)
+
+
+def test_hue_rotates_around_grey(images):
+    grey = torch.full((4, 3, 8, 8), 100, dtype=torch.uint8)
+    out, _ = only(hue=0.5)(torch.cat([images, grey]), torch.zeros(8, 2))
+
+    assert torch.allclose(out[4:], grey.float() / 255, atol=1e-5)
+    # the sum of the channels is preserved
+    floats = images.float() / 255
+    assert torch.allclose(out[:4].sum(1), floats.sum(1), atol=1e-4)
+    assert not torch.allclose(out[:4], floats, atol=1e-2)
+
+
+def test_hflip_negates_x(images):
+    targets = torch.tensor([[0.5, 0.1]] * 4)
+
+    out, new_targets = only(hflip=0.5)(images, targets)
+
+    flipped = draws(4) < 0.5
+    assert 0 < int(flipped.sum()) < 4
+    floats = images.float() / 255
+    for i in range(4):
+        if flipped[i]:
+            assert torch.allclose(out[i], floats[i].flip(-1))
+            assert new_targets[i].tolist() == pytest.approx([-0.5, 0.1])
+        else:
+            assert torch.allclose(out[i], floats[i])
+            assert new_targets[i].tolist() == pytest.approx([0.5, 0.1])
+    # inputs are left untouched
+    assert targets[:, 0].tolist() == [0.5] * 4
+
+
+def test_augmented_collate(images):
+    samples = [(image, torch.tensor([0.5, 0.5])) for image in images]
+    loader = DataLoader(samples, batch_size=4,
+                        collate_fn=augmented_collate(BatchAugment()))
+
+    batch, targets = next(iter(loader))
+
+    assert batch.shape == (4, 3, 8, 8)
+    assert batch.dtype == torch.float32
+    assert 0 <= float(batch.min()) and float(batch.max()) <= 1
+    assert targets.abs().tolist() == [[0.5, 0.5]] * 4
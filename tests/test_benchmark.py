@@ -0,0 +1,56 @@
+import pytest
+
+# not in the labelling env the CI runs in
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+
+from wandb_jetracer.utils.benchmark import (latency,  # noqa: E402
+                                            peak_memory,
+                                            prediction_errors,
+                                            regressions,
+                                            throughput)
+
+
+class ConstantRunner:
+    backend = "constant"
+    device = torch.device("cpu")
+    dtype = torch.float32
+
+    def __call__(self, images):
+        return torch.zeros(len(images), 2)
+
+
+def test_prediction_errors(dataset):
+    targets = torch.stack([target for _, target in dataset])
+
+    errors = prediction_errors(ConstantRunner(), dataset, batch_size=2)
+
+    assert errors["mse"] == pytest.approx(float((targets ** 2).mean()))
+    assert errors["mae"] == pytest.approx(float(targets.abs().mean()))
+
+
+def test_latency_and_throughput():
+    results = latency(ConstantRunner(), n=20, warmup=2)
+
+    assert set(results) == {
+        "first_inference_ms", "latency_p50_ms", "latency_p99_ms"
+    }
+    assert 0 < results["latency_p50_ms"] <= results["latency_p99_ms"]
+    assert throughput(ConstantRunner(), batch_size=4, n=2) > 0
+
+
+def test_peak_memory():
+    assert peak_memory()["peak_rss_mb"] > 0
+
+
+def test_regressions():
+    baseline = {"latency_p50_ms": 10.0, "throughput_fps": 100.0,
+                "mse": 0.1, "backend": "onnx"}
+    results = {"latency_p50_ms": 10.5, "throughput_fps": 80.0,
+               "mse": 0.2, "mae": 0.3, "backend": "onnx"}
+
+    assert regressions(results, baseline, 0.1) == {
+        "throughput_fps": (100.0, 80.0),
+        "mse": (0.1, 0.2),
+    }
+    assert regressions(results, results, 0.1) == {}
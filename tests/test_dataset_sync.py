@@ -0,0 +1,154 @@
+import os
+from unittest import mock
+
+import pytest
+
+from wandb_jetracer.utils.dataset_sync import (DatasetSync,
+                                               LocalStore,
+                                               WandbStore,
+                                               file_digest)
+
+
+def write(directory, name, content):
+    with open(os.path.join(directory, name), "w") as f:
+        f.write(content)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalStore(str(tmp_path / "store"))
+
+
+def test_file_digest(tmp_path):
+    write(tmp_path, "a.jpg", "hello")
+
+    # base64 md5, like wandb
+    assert file_digest(tmp_path / "a.jpg") == "XUFAKrxLKna5cZ2REBfFkg=="
+
+
+def test_push_only_new_files(store, tmp_path):
+    collect = DatasetSync(store, "dataset", str(tmp_path / "collect"))
+    assert collect.remote == {}
+    write(collect.directory, "a.jpg", "a")
+    write(collect.directory, "b.jpg", "b")
+    added, removed = collect.push()
+    assert set(added) == {"a.jpg", "b.jpg"}
+
+    # a new session starts without downloading anything
+    session = DatasetSync(store, "dataset", str(tmp_path / "session"))
+    assert set(session.remote) == {"a.jpg", "b.jpg"}
+    write(session.directory, "c.jpg", "c")
+    added, removed = session.push()
+
+    assert set(added) == {"c.jpg"}
+    assert removed == []
+    assert set(store.manifest("dataset")) == {"a.jpg", "b.jpg", "c.jpg"}
+
+
+def test_pull_selected_then_rename_and_delete(store, tmp_path):
+    source = DatasetSync(store, "dataset", str(tmp_path / "source"))
+    for name in ["a.jpg", "b.jpg", "1_2_c.jpg"]:
+        write(source.directory, name, name)
+    source.push()
+
+    labelling = DatasetSync(store, "dataset", str(tmp_path / "labelling"))
+    pulled = labelling.pull(select=lambda path: "_" not in path)
+    assert sorted(pulled) == ["a.jpg", "b.jpg"]
+    assert not os.path.exists(os.path.join(labelling.directory, "1_2_c.jpg"))
+
+    os.rename(os.path.join(labelling.directory, "a.jpg"),
+              os.path.join(labelling.directory, "3_4_a.jpg"))
+    os.remove(os.path.join(labelling.directory, "b.jpg"))
+    added, removed = labelling.push()
+
+    assert list(added) == ["3_4_a.jpg"]
+    assert sorted(removed) == ["a.jpg", "b.jpg"]
+    assert sorted(store.manifest("dataset")) == ["1_2_c.jpg", "3_4_a.jpg"]
+
+    fresh = DatasetSync(store, "dataset", str(tmp_path / "fresh"))
+    fresh.pull()
+    with open(os.path.join(fresh.directory, "3_4_a.jpg")) as f:
+        assert f.read() == "a.jpg"
+
+
+def test_unchanged_files_are_not_rehashed(store, tmp_path):
+    sync = DatasetSync(store, "dataset", str(tmp_path / "data"))
+    write(sync.directory, "a.jpg", "a")
+    sync.push()
+
+    reopened = DatasetSync(store, "dataset", sync.directory)
+    write(sync.directory, "b.jpg", "b")
+    with mock.patch("wandb_jetracer.utils.dataset_sync.file_digest",
+                    wraps=file_digest) as digest:
+        added, removed = reopened.push()
+
+    digest.assert_called_once()
+    assert list(added) == ["b.jpg"]
+    assert reopened.push() == ({}, [])
+
+
+def test_index_sidecars_are_not_synced(store, tmp_path):
+    collect = DatasetSync(store, "dataset", str(tmp_path / "collect"))
+    os.makedirs(os.path.join(collect.directory, "train"))
+    write(collect.directory, "train/a.jpg", "a")
+    write(collect.directory, "train.index.npz", "index")
+
+    added, _ = collect.push()
+    assert set(added) == {"train/a.jpg"}
+
+
+class FakeEntry:
+    def __init__(self, artifact, path, digest):
+        self.artifact = artifact
+        self.path = path
+        self.digest = digest
+
+    def ref_url(self):
+        return f"wandb-artifact://{self.artifact.name}/{self.path}"
+
+
+class FakeArtifact:
+    """What wandb 0.10.30 artifacts have, and nothing else"""
+
+    def __init__(self, name, type):
+        self.name = name
+        self.entries = {}
+
+    def add_file(self, local_file, name):
+        self.entries[name] = FakeEntry(self, name, file_digest(local_file))
+
+    def add_reference(self, uri, name):
+        source, path = uri[len("wandb-artifact://"):].split("/", 1)
+        assert path == name
+        self.entries[name] = FakeEntry(self, name, f"ref:{source}")
+
+    def get_path(self, path):
+        return self.entries[path]
+
+    def _load_manifest(self):
+        return mock.Mock(entries=self.entries)
+
+
+def test_wandb_store_references_unchanged_entries(tmp_path, monkeypatch):
+    wandb = pytest.importorskip("wandb")
+    monkeypatch.setattr(wandb, "Artifact", FakeArtifact)
+
+    latest = FakeArtifact("dataset", "dataset")
+    for path in ["a.jpg", "b.jpg", "c.jpg"]:
+        latest.entries[path] = FakeEntry(latest, path, path)
+    run = mock.Mock()
+    run.use_artifact.return_value = latest
+    store = WandbStore(run)
+    assert store.manifest("dataset") == {
+        "a.jpg": "a.jpg", "b.jpg": "b.jpg", "c.jpg": "c.jpg"
+    }
+
+    write(tmp_path, "b.jpg", "new b")
+    store.commit("dataset", {"b.jpg": (str(tmp_path / "b.jpg"), None)},
+                 ["c.jpg"])
+
+    artifact = run.log_artifact.call_args[0][0]
+    assert {p: e.digest for p, e in artifact.entries.items()} == {
+        "a.jpg": "ref:dataset",
+        "b.jpg": file_digest(tmp_path / "b.jpg"),
+    }
@@ -0,0 +1,93 @@
+import threading
+import time
+
+from wandb_jetracer.utils.detector import (DETECTOR_STATS_KEYS,
+                                           DetectorWorker)
+from wandb_jetracer.utils.replay import FakeDetector
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_latest_never_blocks():
+    release = threading.Event()
+    worker = DetectorWorker(lambda frame: release.wait() and frame).start()
+    try:
+        assert worker.latest() == (None, None)
+        worker.submit("frame", frame_time=1.0)
+
+        start = time.monotonic()
+        assert worker.latest() == (None, None)
+        assert time.monotonic() - start < 0.05
+
+        release.set()
+        wait_for(lambda: worker.latest()[0] is not None)
+        objects, staleness = worker.latest(now=1.5)
+        assert objects == "frame"
+        assert staleness == 0.5
+    finally:
+        release.set()
+        worker.stop()
+
+
+def test_detects_latest_frame_only():
+    detector = FakeDetector(seconds=0.05)
+    worker = DetectorWorker(detector).start()
+    try:
+        for i in range(10):
+            worker.submit(i, frame_time=i)
+        wait_for(lambda: worker.latest()[0] is not None)
+        time.sleep(0.1)
+    finally:
+        worker.stop()
+
+    # frames submitted while it was busy are skipped
+    assert detector.calls < 10
+    assert worker.stats()["detector/skipped_frames"] > 0
+    assert list(worker.stats()) == DETECTOR_STATS_KEYS
+    assert worker.latest(now=10)[1] == 1
+
+
+def test_every_nth_frame():
+    # not started, offered frames stay in its inbox
+    worker = DetectorWorker(None, every=3)
+    offered = []
+    for i in range(7):
+        worker.submit(i, frame_time=i)
+        item = worker._inbox.get(timeout=0)
+        if item is not None:
+            offered.append(item[0])
+
+    assert offered == [0, 3, 6]
+
+
+def test_min_period():
+    calls = []
+    worker = DetectorWorker(calls.append, min_period=0.2).start()
+    try:
+        start = time.monotonic()
+        while time.monotonic() - start < 0.3:
+            worker.submit("frame")
+            time.sleep(0.01)
+    finally:
+        worker.stop()
+
+    assert len(calls) == 2
+
+
+def test_errors_are_counted():
+    def fail(frame):
+        raise RuntimeError("no gpu")
+
+    worker = DetectorWorker(fail).start()
+    try:
+        worker.submit("frame")
+        wait_for(lambda: worker.errors == 1)
+    finally:
+        worker.stop()
+
+    assert worker.latest() == (None, None)
@@ -0,0 +1,147 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from wandb_jetracer.utils.model_cache import ModelCache
+from wandb_jetracer.utils.replay import EndOfSession, FakeJtop, SyntheticMPU
+
+# the scripts aren't part of the package
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), os.pardir, "src", "scripts")
+)
+import drive  # noqa: E402
+
+
+class DelayedCamera:
+    """
+    Observable camera whose frames arrive halfway through each of the
+    scheduler's sleeps, so they are picked up half a period late.
+    """
+
+    def __init__(self, clock, frames):
+        self.clock = clock
+        self.frames = frames
+        self.running = False
+        self.value = None
+        self.observers = []
+        self.arrivals = []
+
+    def observe(self, handler, names):
+        self.observers.append(handler)
+
+    def unobserve(self, handler, names):
+        self.observers.remove(handler)
+
+    def sleep(self, seconds):
+        self.clock.now += seconds / 2
+        if len(self.arrivals) == self.frames:
+            raise EndOfSession()
+        self.value = np.zeros((224, 224, 3), dtype=np.uint8)
+        self.arrivals.append(self.clock.now)
+        for handler in self.observers:
+            handler({"new": self.value})
+        self.clock.now += seconds / 2
+
+
+class SpyEstimator:
+    def __init__(self, estimator):
+        self.estimator = estimator
+        self.updates = []
+
+    def update(self, prediction, timestamp):
+        self.updates.append(timestamp)
+        self.estimator.update(prediction, timestamp)
+
+    def __getattr__(self, name):
+        return getattr(self.estimator, name)
+
+
+class ListTelemetry:
+    def __init__(self):
+        self.logs = []
+
+    def log(self, data):
+        self.logs.append(data)
+
+
+def run_drive(monkeypatch, clock, frames, jetson):
+    """drive() on frames delayed frames, returns camera, estimator, logs"""
+    config = drive.make_parser().parse_args(
+        ["--flight_recorder_seconds", "0"]
+    )
+    camera = DelayedCamera(clock, frames)
+    estimator = SpyEstimator(drive.make_road_estimator(config))
+    telemetry = ListTelemetry()
+    monkeypatch.setattr(drive, "make_road_estimator", lambda c: estimator)
+    monkeypatch.setattr(drive, "infer", lambda *args: (0.0, 0.0))
+
+    with pytest.raises(EndOfSession):
+        drive.drive(SimpleNamespace(throttle=0.0, steering=0.0), camera,
+                    SyntheticMPU(lambda t: np.zeros(9), clock), None, None,
+                    telemetry, config, jetson=jetson, clock=clock,
+                    sleep=camera.sleep)
+
+    return camera, estimator, telemetry.logs
+
+
+def test_estimator_gets_the_capture_time(monkeypatch, clock):
+    camera, estimator, _ = run_drive(monkeypatch, clock, 5, FakeJtop())
+
+    # not the time the frames were picked up, half a period later
+    assert estimator.updates == camera.arrivals
+
+
+def test_stats_are_logged_once_per_second(monkeypatch, clock):
+    _, _, logs = run_drive(monkeypatch, clock, 25, FakeJtop())
+
+    assert len(logs) == 25
+    # at --framerate 10
+    assert [i for i, log in enumerate(logs)
+            if "scheduler/overruns" in log] == [9, 19]
+    assert [i for i, log in enumerate(logs) if "GPU" in log] == [9, 19]
+
+
+def test_drive_without_jtop_reads_proc(monkeypatch, clock):
+    def start_jtop():
+        raise AssertionError("setup() already tried")
+
+    monkeypatch.setattr(drive, "start_jtop", start_jtop)
+    _, _, logs = run_drive(monkeypatch, clock, 10, jetson=None)
+
+    assert "RAM" in logs[9]
+
+
+def store_config(tmp_path, *args):
+    return drive.make_parser().parse_args([
+        "--telemetry_backend", "store", "--backend", "onnx",
+        "--model_cache", str(tmp_path / "cache"), *args
+    ])
+
+
+def test_store_backend_needs_an_offline_model(tmp_path):
+    config = store_config(tmp_path)
+
+    with pytest.raises(ValueError, match="onnx-model:latest"):
+        drive.check_offline_model(config)
+
+    drive.check_offline_model(
+        store_config(tmp_path, "--local_model", "model.onnx")
+    )
+
+
+def test_store_backend_uses_the_cached_model(tmp_path):
+    model_path = tmp_path / "model.onnx"
+    model_path.write_bytes(b"model")
+    cache = ModelCache(str(tmp_path / "cache"))
+    cache.put("key", str(model_path), {"backend": "onnx"})
+    cache.set_alias("onnx-model:latest", "key")
+    config = store_config(tmp_path)
+
+    drive.check_offline_model(config)
+    with pytest.raises(ValueError, match="refresh_model"):
+        drive.check_offline_model(
+            store_config(tmp_path, "--refresh_model")
+        )
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from wandb_jetracer.utils.estimator import (ESTIMATORS,
+                                            LastValue,
+                                            RoadCenterKalman,
+                                            estimator_class,
+                                            make_estimator)
+
+
+def track(estimator, period, every, latency, seconds=1.6):
+    """
+    Road center moving at 1/s, predicted every period * every seconds
+    with a small noise, estimated latency seconds after each period.
+    Returns the errors of the estimates.
+    """
+    rng = np.random.default_rng(0)
+    errors = []
+    for i in range(int(seconds / period)):
+        t = i * period
+        if i % every == 0:
+            estimator.update((-0.8 + t + rng.normal(0, 0.005), 0.5), t)
+        x, y = estimator.estimate(t + latency)
+        errors.append(x - (-0.8 + t + latency))
+
+    # once it converged
+    return np.abs(errors[len(errors) // 2:])
+
+
+def test_last_value():
+    estimator = make_estimator("none")
+
+    assert estimator.estimate(0) is None
+    estimator.update((0.1, 0.2), 1)
+    estimator.update_yaw_rate(3, 2)
+    assert estimator.estimate(5) == (0.1, 0.2)
+
+
+def test_kalman_compensates_latency():
+    lagging = track(LastValue(), period=0.05, every=1, latency=0.05)
+    kalman = track(RoadCenterKalman(), period=0.05, every=1, latency=0.05)
+
+    # steering on the last prediction is always 0.05s late
+    assert lagging.mean() == pytest.approx(0.05, abs=0.005)
+    assert kalman.mean() < lagging.mean() / 2
+
+
+def test_kalman_tracks_between_predictions():
+    lagging = track(LastValue(), period=0.05, every=4, latency=0.0)
+    kalman = track(RoadCenterKalman(), period=0.05, every=4, latency=0.0)
+
+    assert kalman.mean() < lagging.mean() / 2
+
+
+def test_kalman_fuses_yaw_rate():
+    estimator = RoadCenterKalman(gyro_gain=-0.5)
+    estimator.update((0.0, 0.0), 0.0)
+
+    # the car turns, the road center moves to the left at 0.5/s
+    for i in range(1, 5):
+        estimator.update_yaw_rate(1.0, i * 0.01)
+    x, _ = estimator.estimate(0.24)
+
+    assert x == pytest.approx(-0.1, abs=0.03)
+    assert estimator.stats()["estimator/velocity_x"] < -0.4
+
+
+def test_kalman_ignores_yaw_rate_without_gain():
+    estimator = RoadCenterKalman()
+    estimator.update((0.0, 0.0), 0.0)
+    estimator.update_yaw_rate(1.0, 0.1)
+
+    assert estimator.estimate(1.0) == (0.0, 0.0)
+
+
+def test_kalman_estimates_are_clipped():
+    estimator = RoadCenterKalman()
+    estimator.update((0.9, 0.0), 0.0)
+    estimator.update((1.0, 0.0), 0.1)
+
+    assert estimator.estimate(10)[0] == 1
+
+
+def test_stats_keys():
+    for name in ESTIMATORS:
+        assert list(make_estimator(name).stats()) == \
+            estimator_class(name).STATS_KEYS
+
+
+def test_unknown_estimator():
+    with pytest.raises(ValueError):
+        make_estimator("particle")
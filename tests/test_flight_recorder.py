@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+
+from wandb_jetracer.utils import flight_recorder
+from wandb_jetracer.utils.flight_recorder import (FILES,
+                                                  FlightRecorder,
+                                                  recover)
+from wandb_jetracer.utils.imu import IMU_KEYS
+from wandb_jetracer.utils.replay import Session
+
+
+def record(recorder, i):
+    frame = np.full((4, 4, 3), i, dtype=np.uint8)
+    prediction = None if i % 2 else (i / 10, 0.5)
+    recorder.record(10.0 + i, frame, prediction, -i, 0.1,
+                    {"car/gyroscope_z": float(i)})
+
+
+def test_dump_last_records(tmp_path):
+    recorder = FlightRecorder(str(tmp_path), capacity=3, frame_shape=(4, 4, 3))
+    assert recorder.dump() is None
+
+    for i in range(5):
+        record(recorder, i)
+    path = recorder.dump(str(tmp_path / "dump.npz"))
+
+    session = Session.load(path)
+    assert [int(frame[0, 0, 0]) for frame in session.frames] == [2, 3, 4]
+    assert list(session.timestamps) == [0, 1, 2]
+    assert list(session.imu[:, IMU_KEYS.index("car/gyroscope_z")]) \
+        == [2, 3, 4]
+
+    data = np.load(path)
+    assert list(data["steering"]) == [-2, -3, -4]
+    assert np.isnan(data["prediction"][1]).all()
+    assert np.allclose(data["prediction"][2], [0.4, 0.5])
+
+
+def test_recover_ring_left_by_a_crash(tmp_path):
+    directory = str(tmp_path / "ring")
+    recorder = FlightRecorder(directory, capacity=4, frame_shape=(4, 4, 3))
+    for i in range(2):
+        record(recorder, i)
+    # the process dies without dumping
+    del recorder
+
+    path = recover(directory)
+    assert len(Session.load(path)) == 2
+    # only once
+    assert recover(directory) is None
+    assert recover(str(tmp_path / "nothing")) is None
+
+
+def test_only_last_dumps_are_kept(tmp_path, monkeypatch):
+    times = iter(f"20210101-12000{i}" for i in range(4))
+    monkeypatch.setattr(flight_recorder.time, "strftime",
+                        lambda fmt: next(times))
+    recorder = FlightRecorder(str(tmp_path), capacity=3,
+                              frame_shape=(4, 4, 3), max_dumps=2)
+    record(recorder, 0)
+    # a dump given a path isn't counted
+    recorder.dump(str(tmp_path / "manual.npz"))
+    paths = [recorder.dump() for _ in range(4)]
+
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        FILES + ["manual.npz"]
+        + [os.path.basename(path) for path in paths[-2:]]
+    )
@@ -0,0 +1,58 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from wandb_jetracer.utils.frame_writer import FrameWriter
+
+
+def image(value):
+    return np.full((16, 16, 3), value, dtype=np.uint8)
+
+
+def test_writes_every_frame(tmp_path):
+    with FrameWriter(str(tmp_path), workers=3, max_queue=2) as writer:
+        for i in range(20):
+            assert writer.submit(image(i * 10), f"{i}.jpg")
+
+    assert writer.stats()["written"] == 20
+    assert writer.stats()["dropped"] == 0
+    assert writer.max_depth <= 2
+    assert sorted(os.listdir(tmp_path)) == sorted(f"{i}.jpg"
+                                                  for i in range(20))
+    decoded = cv2.imread(os.path.join(tmp_path, "5.jpg"))
+    assert abs(int(decoded.mean()) - 50) <= 2
+
+
+def test_backpressure(tmp_path, monkeypatch):
+    release = threading.Event()
+    encode = cv2.imencode
+
+    def slow_encode(*args):
+        release.wait()
+        return encode(*args)
+
+    monkeypatch.setattr(cv2, "imencode", slow_encode)
+
+    writer = FrameWriter(str(tmp_path), workers=1, max_queue=1, block=False)
+    # first frame is picked up by the worker, second one fills the queue
+    results = [writer.submit(image(0), f"{i}.jpg") for i in range(5)]
+    release.set()
+    writer.close()
+
+    stats = writer.stats()
+    assert results.count(False) == stats["dropped"] >= 3
+    assert stats["written"] == stats["submitted"] == 5 - stats["dropped"]
+
+
+def test_quality(tmp_path):
+    noise = np.random.default_rng(0).integers(0, 256, (64, 64, 3),
+                                              dtype=np.uint8)
+    for quality in [10, 95]:
+        with FrameWriter(str(tmp_path), quality=quality) as writer:
+            writer.submit(noise, f"{quality}.jpg")
+
+    low = os.path.getsize(os.path.join(tmp_path, "10.jpg"))
+    high = os.path.getsize(os.path.join(tmp_path, "95.jpg"))
+    assert low < high
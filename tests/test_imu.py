@@ -0,0 +1,83 @@
+import time
+
+import numpy as np
+import pytest
+
+from wandb_jetracer.utils.imu import (IMU_KEYS,
+                                      IMU_STATS_KEYS,
+                                      IMUSampler,
+                                      imu_log)
+from wandb_jetracer.utils.replay import SyntheticMPU
+
+
+def ramp(t):
+    """Every value is linear in time, easy to interpolate"""
+    return np.arange(9) + t
+
+
+def test_imu_log():
+    log = imu_log(range(9))
+
+    assert list(log) == IMU_KEYS
+    assert log["car/gyroscope_z"] == 5.0
+
+
+def test_no_sample_yet():
+    sampler = IMUSampler(SyntheticMPU(ramp))
+
+    assert sampler.latest() is None
+    assert sampler.at(1.0) is None
+    assert sampler.log_at(1.0) == {}
+
+
+def test_latest_and_interpolation(clock):
+    sampler = IMUSampler(SyntheticMPU(ramp, clock), clock=clock)
+    for t in [1.0, 2.0, 3.0]:
+        clock.now = t
+        sampler.sample()
+
+    t, sample = sampler.latest()
+    assert t == 3.0
+    np.testing.assert_allclose(sample, ramp(3.0))
+    np.testing.assert_allclose(sampler.at(2.25), ramp(2.25))
+    np.testing.assert_allclose(sampler.at(1.0), ramp(1.0))
+    # no extrapolation
+    np.testing.assert_allclose(sampler.at(0.0), ramp(1.0))
+    np.testing.assert_allclose(sampler.at(5.0), ramp(3.0))
+    assert sampler.log_at(2.5)["car/accelerometer_y"] == pytest.approx(3.5)
+
+
+def test_ring_buffer_wraps(clock):
+    sampler = IMUSampler(SyntheticMPU(ramp, clock), capacity=4, clock=clock)
+    for t in range(10):
+        clock.now = float(t)
+        sampler.sample()
+
+    assert sampler.count == 10
+    np.testing.assert_allclose(sampler.at(8.5), ramp(8.5))
+    # only the last 4 samples (6 to 9) are kept
+    np.testing.assert_allclose(sampler.at(2.0), ramp(6.0))
+
+
+def test_read_errors_are_counted():
+    def broken(t):
+        raise OSError("i2c")
+
+    sampler = IMUSampler(SyntheticMPU(broken))
+    sampler.sample()
+
+    assert sampler.errors == 1
+    assert sampler.latest() is None
+    assert list(sampler.stats()) == IMU_STATS_KEYS
+
+
+def test_background_sampling_rate():
+    mpu = SyntheticMPU(ramp)
+    sampler = IMUSampler(mpu, rate=200).start()
+    time.sleep(0.25)
+    sampler.stop()
+
+    assert 20 < sampler.count <= 55
+    t, sample = sampler.latest()
+    # the sample time is within the reads
+    assert t - 0.01 <= sample[0] <= t + 0.01
@@ -0,0 +1,89 @@
+import pytest
+
+from wandb_jetracer.utils.instrumentation import (Histogram,
+                                                  Profiler,
+                                                  StartupTimer,
+                                                  log_buckets)
+
+
+def test_log_buckets():
+    bounds = log_buckets(1_000, 1_000_000, per_decade=1)
+
+    assert bounds == [1_000, 10_000, 100_000, 1_000_000]
+
+
+def test_histogram_percentiles():
+    histogram = Histogram(bounds=[10, 20, 30, 40])
+
+    assert histogram.percentile(50) is None
+
+    for value in [5] * 50 + [15] * 45 + [35] * 5:
+        histogram.record(value)
+
+    assert histogram.percentile(50) == pytest.approx(10)
+    assert 10 < histogram.percentile(95) <= 20
+    assert 30 < histogram.percentile(99) <= 40
+
+
+def test_histogram_overflow_bucket():
+    histogram = Histogram(bounds=[10, 20])
+    histogram.record(1000)
+
+    assert histogram.counts == [0, 0, 1]
+    assert histogram.percentile(99) == 20
+
+
+def test_profiler_span():
+    profiler = Profiler()
+
+    with profiler.span("preprocess"):
+        pass
+    profiler.record("model_trt", 2_000_000)
+
+    report = profiler.report()
+    assert set(report) == {
+        f"latency/{name}_p{q}_ms"
+        for name in ["preprocess", "model_trt"]
+        for q in [50, 95, 99]
+    }
+    assert list(report) == \
+        Profiler.report_keys(["preprocess", "model_trt"])
+    # 2ms falls in the ~2-2.5ms bucket
+    assert 1.9 < report["latency/model_trt_p50_ms"] < 2.6
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler(enabled=False)
+
+    with profiler.span("preprocess"):
+        pass
+    profiler.record("model_trt", 1)
+
+    assert profiler.report() == {}
+    assert profiler.span("a") is profiler.span("b")
+
+
+def test_startup_timer():
+    now = [10.0]
+    startup = StartupTimer(clock=lambda: now[0])
+
+    with startup.task("camera"):
+        now[0] += 2
+    model = startup.timed("model", lambda: "runner")
+    now[0] += 1
+    assert model() == "runner"
+    startup.mark("first_command")
+    now[0] += 1
+    startup.mark("first_command")
+
+    assert list(startup.report()) == \
+        StartupTimer.report_keys(["camera", "model"], ["first_command"])
+    assert startup.report() == {
+        "startup/camera_seconds": 2,
+        "startup/model_seconds": 0,
+        "startup/first_command_at": 3,
+    }
+    lines = startup.summary().splitlines()
+    assert [line.split()[0] for line in lines] == [
+        "camera", "model", "first_command"
+    ]
@@ -0,0 +1,116 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from wandb_jetracer.utils.labelling import (LABELS_FILE,
+                                            LabelIndex,
+                                            LabellingSession,
+                                            Prefetcher)
+
+
+@pytest.fixture
+def directory(tmp_path):
+    for i in range(5):
+        image = np.full((8, 8, 3), i * 10, dtype=np.uint8)
+        cv2.imwrite(str(tmp_path / f"img{i}.jpg"), image)
+    cv2.imwrite(str(tmp_path / "1_2_done.jpg"), image)
+    return str(tmp_path)
+
+
+def test_prefetcher_order(directory):
+    fnames = [f"img{i}.jpg" for i in range(5)]
+    prefetcher = Prefetcher(directory, fnames, depth=2)
+    items = list(prefetcher)
+    prefetcher.close()
+
+    assert [fname for fname, _ in items] == fnames
+    assert items[3][1].shape == (8, 8, 3)
+
+
+def test_prefetcher_close_early(directory):
+    prefetcher = Prefetcher(directory, os.listdir(directory), depth=1)
+    next(iter(prefetcher))
+    prefetcher.close()
+
+    assert not prefetcher._thread.is_alive()
+
+
+def test_label_index_last_decision_wins(tmp_path):
+    path = str(tmp_path / "labels.csv")
+    index = LabelIndex(path)
+    index.label("a.jpg", 1, 2)
+    index.label("a.jpg", 3, 4)
+    index.delete("b.jpg")
+    index.close()
+    # truncated row from a crash
+    with open(path, "a") as f:
+        f.write("label,c.jpg,5")
+
+    index = LabelIndex(path)
+    assert index.decisions == {
+        "a.jpg": ("label", 3, 4),
+        "b.jpg": ("delete", None, None),
+    }
+
+
+def test_session_commit(directory):
+    session = LabellingSession(directory)
+    assert session.total == 6
+    assert len(session.pending) == 5
+
+    for fname, image in session.images():
+        if fname == "img0.jpg":
+            session.label(fname, 10, 20)
+        elif fname == "img1.jpg":
+            session.delete(fname)
+    # nothing touched before commit
+    assert "img0.jpg" in os.listdir(directory)
+
+    assert session.commit() == (1, 1)
+    assert sorted(os.listdir(directory)) == [
+        "10_20_img0.jpg", "1_2_done.jpg", "img2.jpg", "img3.jpg", "img4.jpg"
+    ]
+
+
+def test_session_resume(directory):
+    session = LabellingSession(directory)
+    images = session.images()
+    fname, _ = next(images)
+    session.label(fname, 1, 1)
+    images.close()
+    # crash: the session is never committed
+    session.index.close()
+    assert os.path.exists(os.path.join(directory, LABELS_FILE))
+
+    resumed = LabellingSession(directory)
+    assert fname not in resumed.pending
+    assert len(resumed.pending) == 4
+    resumed.delete(resumed.pending[0])
+
+    assert resumed.commit() == (1, 1)
+    assert not os.path.exists(os.path.join(directory, LABELS_FILE))
+
+
+def test_session_orders_by_uncertainty(directory):
+    session = LabellingSession(directory)
+    session.add_suggestions({
+        "img0.jpg": (1, 1, 0.1),
+        "img1.jpg": (2, 2, 0.9),
+        "img2.jpg": (3, 3, 0.5),
+    })
+    # images without a suggestion first
+    assert session.pending == [
+        "img3.jpg", "img4.jpg", "img1.jpg", "img2.jpg", "img0.jpg"
+    ]
+    assert session.suggestion("img1.jpg") == (2, 2)
+    assert session.suggestion("img3.jpg") is None
+
+    session.label("img1.jpg", *session.suggestion("img1.jpg"))
+    session.commit()
+
+    # suggestions survive for the next session
+    resumed = LabellingSession(directory)
+    assert resumed.pending[-2:] == ["img2.jpg", "img0.jpg"]
+    assert "img1.jpg" not in resumed.suggestions
@@ -0,0 +1,62 @@
+import os
+
+from wandb_jetracer.utils.model_cache import ModelCache, cache_key
+
+
+def test_cache_key():
+    key = cache_key("digest", "resnet18", "onnx", "fp32", (1, 3, 224, 224))
+
+    assert key == cache_key("digest", "resnet18", "onnx", "fp32",
+                            [1, 3, 224, 224])
+    assert key != cache_key("digest", "resnet18", "onnx", "int8",
+                            (1, 3, 224, 224))
+    assert key != cache_key("digest", "resnet18", "onnx", "fp32",
+                            (1, 3, 224, 224), calibration_digest="abc")
+
+
+def test_put_get(tmp_path):
+    model_path = tmp_path / "model.onnx"
+    model_path.write_bytes(b"model")
+    cache = ModelCache(str(tmp_path / "cache"))
+
+    assert cache.get("key") is None
+    cached_path = cache.put("key", str(model_path), {"backend": "onnx"})
+    os.remove(model_path)
+
+    path, metadata = cache.get("key")
+    assert path == cached_path
+    assert os.path.basename(path) == "model.onnx"
+    with open(path, "rb") as f:
+        assert f.read() == b"model"
+    assert metadata == {"backend": "onnx"}
+
+
+def test_put_replaces_entry(tmp_path):
+    cache = ModelCache(str(tmp_path / "cache"))
+    for content in [b"old", b"new"]:
+        model_path = tmp_path / "model.ts"
+        model_path.write_bytes(content)
+        cache.put("key", str(model_path), {})
+
+    path, _ = cache.get("key")
+    with open(path, "rb") as f:
+        assert f.read() == b"new"
+    assert not os.path.exists(os.path.join(cache.root, "key.tmp"))
+
+
+def test_aliases(tmp_path):
+    model_path = tmp_path / "model.ts"
+    model_path.write_bytes(b"model")
+    cache = ModelCache(str(tmp_path / "cache"))
+    cache.put("a", str(model_path), {"version": 1})
+    cache.put("b", str(model_path), {"version": 2})
+
+    assert cache.resolve("torchscript-model:latest") is None
+    cache.set_alias("torchscript-model:latest", "a")
+    cache.set_alias("torchscript-model:latest", "b")
+    cache.set_alias("torchscript-model:v0", "a")
+
+    assert cache.resolve("torchscript-model:latest")[1] == {"version": 2}
+    # aliases are kept across instances
+    reopened = ModelCache(cache.root)
+    assert reopened.resolve("torchscript-model:v0")[1] == {"version": 1}
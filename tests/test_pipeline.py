@@ -0,0 +1,87 @@
+import threading
+import time
+
+from wandb_jetracer.utils.pipeline import LatestQueue, Pipeline, RateMeter
+
+
+def test_latest_queue_newest_wins():
+    queue = LatestQueue(maxsize=2)
+
+    for i in range(5):
+        queue.put(i)
+
+    assert queue.qsize() == 2
+    assert queue.get() == 4
+    assert queue.qsize() == 0
+    # 3 dropped on put, 1 discarded on get
+    assert queue.dropped == 4
+
+
+def test_latest_queue_timeout_and_close():
+    queue = LatestQueue()
+
+    assert queue.get(timeout=0.01) is None
+
+    queue.close()
+    assert queue.get() is None
+
+
+def test_rate_meter():
+    now = [0.0]
+    meter = RateMeter(smoothing=0.0, clock=lambda: now[0])
+
+    for _ in range(3):
+        meter.tick()
+        now[0] += 0.1
+
+    assert abs(meter.rate - 10) < 1e-6
+
+
+def test_pipeline_runs_stages_in_order():
+    counter = iter(range(1000000))
+    done = threading.Event()
+    results = []
+
+    def source():
+        time.sleep(0.001)
+        return next(counter)
+
+    def sink(item):
+        results.append(item)
+        if len(results) >= 5:
+            done.set()
+
+    pipeline = Pipeline([
+        ("capture", source),
+        ("inference", lambda x: x * 2),
+        ("telemetry", sink),
+    ])
+    pipeline.start()
+    assert done.wait(timeout=5)
+    pipeline.stop()
+
+    assert results == sorted(results)
+    assert all(r % 2 == 0 for r in results)
+
+    stats = pipeline.stats()
+    assert list(stats) == Pipeline.stats_keys(["capture", "inference",
+                                               "telemetry"])
+    assert "pipeline/capture_queue_depth" in stats
+    assert "pipeline/inference_queue_dropped" in stats
+    assert stats["pipeline/capture_hz"] > 0
+    assert not pipeline.failed
+
+
+def test_pipeline_reports_failed_stage():
+    def broken(item):
+        raise ValueError("boom")
+
+    pipeline = Pipeline([("capture", lambda: 1), ("inference", broken)])
+    pipeline.start()
+
+    deadline = time.time() + 5
+    while not pipeline.failed and time.time() < deadline:
+        time.sleep(0.01)
+    pipeline.stop()
+
+    assert pipeline.failed
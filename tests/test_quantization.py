@@ -0,0 +1,113 @@
+import sys
+import types
+
+import numpy as np
+import pytest
+
+# not in the labelling env the CI runs in
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+
+from wandb_jetracer.utils.quantization import (  # noqa: E402
+    accuracy_regressed,
+    calibration_batches,
+    evaluate,
+    quantize_onnx,
+    quantize_trt,
+)
+from wandb_jetracer.utils.runners import (TorchRunner,  # noqa: E402
+                                          build_model,
+                                          export_model,
+                                          load_runner)
+from wandb_jetracer.utils.xy_dataset import preprocess  # noqa: E402
+
+
+def test_calibration_batches(dataset):
+    batches = calibration_batches(dataset, size=5, batch_size=2)
+
+    assert [len(images) for images in batches] == [2, 2, 1]
+    assert batches[0].shape[1:] == (3, 224, 224)
+    assert 0 <= float(batches[0].min()) and float(batches[0].max()) <= 1
+
+
+def test_accuracy_regressed():
+    assert not accuracy_regressed(0.105, 0.1, 0.1)
+    assert accuracy_regressed(0.12, 0.1, 0.1)
+
+
+def test_quantize_onnx(dataset, tmp_path):
+    pytest.importorskip("onnxruntime")
+    torch.manual_seed(0)
+    model = build_model("resnet18").eval()
+
+    fp32_path = export_model(model, "onnx", str(tmp_path / "fp32.onnx"),
+                             device="cpu")
+    path = quantize_onnx(fp32_path, str(tmp_path / "model.onnx"),
+                         calibration_batches(dataset, batch_size=3))
+    runner = load_runner("onnx", path)
+
+    int8 = evaluate(runner, dataset)
+    reference = evaluate(TorchRunner(model, "cpu"), dataset)
+    assert int8["ms_per_frame"] > 0
+    # an untrained model is a poor regressor but int8 must stay close
+    assert not accuracy_regressed(int8["test_mse"], reference["test_mse"], 1)
+
+
+class FakeTRTModule:
+    """
+    Stands in for a torch2trt engine: like TensorRT, it doesn't cast
+    its input, which must have the dtype and the batch size of 1 the
+    engine was built with.
+    """
+
+    def __init__(self, input_dtype=None):
+        self.input_dtype = input_dtype
+
+    def state_dict(self):
+        return {"input": torch.zeros(0, dtype=self.input_dtype)}
+
+    def load_state_dict(self, state_dict):
+        self.input_dtype = state_dict["input"].dtype
+
+    def __call__(self, images):
+        if len(images) > 1:
+            raise ValueError(f"Batch of {len(images)}, the engine was "
+                             "built for 1")
+        if images.dtype != self.input_dtype:
+            raise TypeError(f"{images.dtype} input, the engine expects "
+                            f"{self.input_dtype}")
+        return images.mean((2, 3))[:, :2]
+
+
+def fake_torch2trt(model, inputs, fp16_mode=False, int8_mode=False,
+                   int8_calib_dataset=()):
+    assert int8_mode
+    for sample in int8_calib_dataset:
+        assert sample[0].dtype == inputs[0].dtype
+    if inputs[0].dtype == torch.half:
+        assert fp16_mode
+
+    return FakeTRTModule(inputs[0].dtype)
+
+
+def test_quantize_trt_runs_on_driver_input(dataset, tmp_path, monkeypatch):
+    torch2trt = types.ModuleType("torch2trt")
+    torch2trt.torch2trt = fake_torch2trt
+    torch2trt.TRTModule = FakeTRTModule
+    monkeypatch.setitem(sys.modules, "torch2trt", torch2trt)
+    # no gpu needed to build the fake engine
+    monkeypatch.setattr(torch.nn.Module, "cuda", lambda self: self)
+    monkeypatch.setattr(torch.Tensor, "cuda", lambda self: self)
+
+    path = quantize_trt(build_model("resnet18"), str(tmp_path / "trt.pth"),
+                        calibration_batches(dataset, size=2))
+    runner = load_runner("trt", path)
+
+    # what drive.infer() feeds it
+    image = np.zeros((224, 224, 3), dtype=np.uint8)
+    output = runner(preprocess(image, runner.dtype, "cpu"))
+    assert output.shape == (1, 2)
+
+    # what trt_optim.py gates the upload on
+    runner.device = torch.device("cpu")
+    assert np.isfinite(evaluate(runner, dataset)["test_mse"])
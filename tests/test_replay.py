@@ -0,0 +1,120 @@
+import os
+import uuid
+
+import cv2
+import numpy as np
+import pytest
+
+from wandb_jetracer.utils.replay import (EndOfSession,
+                                         FakeCamera,
+                                         FakeCar,
+                                         FakeMPU,
+                                         ReplayClock,
+                                         Session,
+                                         make_report)
+
+
+@pytest.fixture
+def session():
+    frames = np.arange(5, dtype=np.uint8)[:, None, None, None] \
+        * np.ones((5, 4, 4, 3), dtype=np.uint8)
+    imu = np.arange(45, dtype=np.float32).reshape(5, 9)
+    return Session(frames, [10.0, 10.1, 10.2, 10.3, 10.4], imu)
+
+
+def test_session_save_load(session, tmp_path):
+    path = str(tmp_path / "session.npz")
+    session.save(path)
+
+    loaded = Session.load(path)
+    assert np.array_equal(loaded.frames, session.frames)
+    assert np.allclose(loaded.timestamps, [0, 0.1, 0.2, 0.3, 0.4])
+    assert np.array_equal(loaded.imu, session.imu)
+
+
+def test_session_from_images(tmp_path):
+    names = []
+    for i in range(3):
+        name = str(uuid.uuid1()) + ".jpg"
+        names.append(name)
+        image = np.full((8, 8, 3), i * 100, dtype=np.uint8)
+        cv2.imwrite(os.path.join(tmp_path, name), image)
+    # labelled images keep their capture time
+    os.rename(os.path.join(tmp_path, names[0]),
+              os.path.join(tmp_path, "1_2_" + names[0]))
+
+    session = Session.load(str(tmp_path))
+
+    assert len(session) == 3
+    assert [int(f.mean()) // 100 for f in session.frames] == [0, 1, 2]
+    assert np.all(np.diff(session.timestamps) >= 0)
+
+
+def test_fast_camera_serves_every_frame(session, clock):
+    camera = FakeCamera(session, clock)
+
+    assert [int(camera.value[0, 0, 0]) for _ in range(5)] == [0, 1, 2, 3, 4]
+    with pytest.raises(EndOfSession):
+        camera.read()
+
+
+def test_realtime_camera_follows_timestamps(session, clock):
+    camera = FakeCamera(session, clock, realtime=True)
+
+    assert camera.value[0, 0, 0] == 0
+    clock.now = 0.05
+    assert camera.value is camera.value
+    clock.now = 0.25
+    assert camera.value[0, 0, 0] == 2
+    clock.now = 10
+    with pytest.raises(EndOfSession):
+        camera.value
+
+
+def test_fake_mpu_and_car_report(session, clock):
+    camera = FakeCamera(session, clock)
+    car = FakeCar(camera, clock)
+    mpu = FakeMPU(session, camera)
+
+    for i in range(3):
+        camera.read()
+        assert mpu.readGyroscopeMaster() == [9 * i + 3, 9 * i + 4, 9 * i + 5]
+        clock.now += 0.02
+        car.throttle, car.steering = 0.1, float(i)
+        clock.now += 0.08
+
+    report, trace = make_report(camera, car, wall_seconds=1.5)
+
+    assert report["frames_processed"] == 3
+    assert report["throughput_fps"] == 2
+    assert report["latency_p50_ms"] == pytest.approx(20)
+    assert list(trace[:, 2]) == [0, 1, 2]
+    assert trace[:, 0] == pytest.approx([0.02, 0.12, 0.22])
+
+
+def test_replay_clock_skips_sleeps():
+    clock = ReplayClock(fast=True)
+    start = clock()
+    clock.sleep(100)
+
+    assert clock() - start >= 100
+
+
+def test_report_steering_error(session, clock):
+    camera = FakeCamera(session, clock)
+    car = FakeCar(camera, clock)
+
+    for i in range(3):
+        camera.read()
+        clock.now += 0.02
+        car.steering = float(i)
+        clock.now += 0.08
+
+    # the road kept moving during the 20ms it took to steer, except
+    # after the last frame, when nothing more is known
+    report, _ = make_report(
+        camera, car, wall_seconds=1, reference=[0, 1, 2, 3, 4]
+    )
+
+    assert report["steering_error_max"] == pytest.approx(0.2)
+    assert report["steering_error_rms"] == pytest.approx((0.08 / 3) ** 0.5)
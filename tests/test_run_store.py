@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import pytest
+
+from wandb_jetracer.utils.run_store import RunReader, RunStore
+from wandb_jetracer.utils.telemetry import Image, TelemetrySink, Video
+
+
+COLUMNS = ["car/steering", "car/throttle", "imu/samples"]
+
+
+def test_scalar_chunks(tmp_path):
+    store = RunStore(str(tmp_path), COLUMNS, config={"throttle": 0.1},
+                     chunk_rows=2, flush_seconds=60)
+    store.write({"car/steering": 0.5})
+    store.write({"car/steering": 0.25, "car/throttle": 0.1})
+    store.write({"imu/samples": 100, "undeclared": 1.0})
+
+    reader = RunReader(str(tmp_path))
+    assert list(reader.scalars()["step"]) == [0, 1]
+    store.close()
+
+    assert reader.config == {"throttle": 0.1}
+    table = reader.scalars()
+    assert list(table) == ["step", "time", *COLUMNS]
+    assert list(table["step"]) == [0, 1, 2]
+    assert np.array_equal(
+        table["car/throttle"], [np.nan, 0.1, np.nan], equal_nan=True
+    )
+    assert np.array_equal(
+        table["imu/samples"], [np.nan, np.nan, 100], equal_nan=True
+    )
+
+
+def test_flush_interval(tmp_path):
+    store = RunStore(str(tmp_path), COLUMNS, flush_seconds=0)
+    store.write({"car/steering": 0.5})
+
+    # written right away, even though the chunk isn't full
+    assert list(RunReader(str(tmp_path)).scalars()["car/steering"]) == [0.5]
+    store.close()
+
+
+def test_images_and_rows(tmp_path):
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+    image[..., 0] = 255  # red
+    boxes = {"predictions": {"box_data": []}}
+
+    store = RunStore(str(tmp_path), COLUMNS)
+    with TelemetrySink(store, flush_hz=1e-3) as sink:
+        sink.log({"car/steering": 0.5, "inference/frame": Image(image)})
+        sink.log({"car/steering": 1.0,
+                  "inference/frame": Image(image, boxes)})
+        sink.log({"unsupported": "text"})
+
+    reader = RunReader(str(tmp_path))
+    images = list(reader.images())
+    assert [(step, key) for step, key, _, _ in images] == [
+        (0, "inference/frame"), (1, "inference/frame")
+    ]
+    assert np.array_equal(images[0][2], image)
+    assert images[1][3] == boxes
+
+    rows = list(reader.rows())
+    assert [step for step, _ in rows] == [0, 1, 3]
+    assert isinstance(rows[0][1]["inference/frame"], Image)
+    assert rows[2][1] == {"car/steering": 1.0}
+
+
+def test_store_is_not_appended_to(tmp_path):
+    store = RunStore(str(tmp_path), COLUMNS)
+    store.write({"car/steering": 0.5})
+    store.close()
+
+    with pytest.raises(ValueError):
+        RunStore(str(tmp_path), COLUMNS)
+
+
+def test_videos(tmp_path):
+    store = RunStore(str(tmp_path), COLUMNS)
+    store.write({"debug/video": Video("segment-0000.mp4", [1.0, 1.1], 10)})
+    store.write({"car/steering": 0.5})
+    store.close()
+
+    (step, row), _ = RunReader(str(tmp_path)).rows()
+    video = row["debug/video"]
+    assert step == 0
+    assert video.path == os.path.abspath("segment-0000.mp4")
+    assert video.timestamps == [1.0, 1.1]
+    assert video.fps == 10
@@ -0,0 +1,46 @@
+import pytest
+
+# not in the labelling env the CI runs in
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+
+from wandb_jetracer.utils.runners import (MODEL_FILES,  # noqa: E402
+                                          build_model,
+                                          export_model,
+                                          load_runner,
+                                          max_abs_error)
+
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    return build_model("resnet18").eval()
+
+
+@pytest.mark.parametrize("backend", ["torch", "torchscript", "onnx"])
+def test_export_and_run(model, backend, tmp_path):
+    if backend == "onnx":
+        pytest.importorskip("onnxruntime")
+
+    path = str(tmp_path / MODEL_FILES[backend])
+    export_model(model, backend, path, device="cpu")
+    runner = load_runner(backend, path, "resnet18", device="cpu")
+
+    assert runner.backend == backend
+    assert runner.device.type == "cpu"
+
+    images = torch.rand((2, 3, 224, 224), dtype=runner.dtype)
+    assert runner(images).shape == (2, 2)
+    assert max_abs_error(model, runner, n=2) < 1e-3
+
+
+def test_torch_backend_needs_architecture(tmp_path):
+    with pytest.raises(ValueError):
+        load_runner("torch", str(tmp_path / "model.pth"))
+
+
+def test_unknown_backend(model, tmp_path):
+    with pytest.raises(ValueError):
+        load_runner("tflite", str(tmp_path / "model.tflite"))
+    with pytest.raises(ValueError):
+        export_model(model, "tflite", str(tmp_path / "model.tflite"))
@@ -0,0 +1,217 @@
+import time
+
+import pytest
+
+from wandb_jetracer.utils.scheduler import (ControlScheduler,
+                                            LatestFrame,
+                                            Watchdog)
+
+
+class FakeCamera:
+    def __init__(self):
+        self.value = None
+
+
+class ObservableCamera:
+    """Notifies observers of new values, like jetcam's traitlets"""
+
+    def __init__(self):
+        self._value = None
+        self.observers = []
+
+    def observe(self, handler, names):
+        assert names == "value"
+        self.observers.append(handler)
+
+    def unobserve(self, handler, names):
+        self.observers.remove(handler)
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, frame):
+        self._value = frame
+        for handler in self.observers:
+            handler({"name": "value", "new": frame})
+
+
+class FakeCar:
+    def __init__(self):
+        self.throttle = 0.5
+        self.steering = 0
+
+
+def make_scheduler(clock, car=None, **kwargs):
+    kwargs.setdefault("period", 0.1)
+    kwargs.setdefault("watchdog_timeout", 0.25)
+    return ControlScheduler(
+        car or FakeCar(), clock=clock, sleep=clock.sleep, **kwargs
+    )
+
+
+def test_latest_frame_skips_already_seen_frames(clock):
+    camera = FakeCamera()
+    read_frame = LatestFrame(camera, clock)
+
+    assert read_frame() is None
+
+    camera.value = object()
+    assert read_frame() == (camera.value, 0.0)
+    assert read_frame() is None
+
+
+def test_latest_frame_stamps_frames_on_arrival(clock):
+    camera = ObservableCamera()
+    read_frame = LatestFrame(camera, clock)
+
+    clock.now = 1.0
+    camera.value = "first"
+    clock.now = 1.5
+    assert read_frame() == ("first", 1.0)
+    assert read_frame() is None
+
+    camera.value = "second"
+    clock.now = 2.0
+    camera.value = "third"
+    assert read_frame() == ("third", 2.0)
+
+    read_frame.close()
+    assert camera.observers == []
+
+
+def test_scheduler_skips_frames_that_waited_too_long(clock):
+    camera = ObservableCamera()
+    scheduler = make_scheduler(clock, max_frame_age=0.05)
+    read_frame = LatestFrame(camera, clock)
+    steps = []
+
+    camera.value = "old"
+    clock.now = 0.1
+    assert not scheduler.tick(read_frame, lambda *frame: steps.append(frame))
+    camera.value = "new"
+    clock.now = 0.12
+    assert scheduler.tick(read_frame, lambda *frame: steps.append(frame))
+
+    # step gets the time the frame arrived, not when it was picked up
+    assert steps == [("new", 0.1)]
+    assert scheduler.stale_frames == 1
+
+
+def test_watchdog_stops_car(clock):
+    car = FakeCar()
+    watchdog = Watchdog(car, timeout=1, clock=clock)
+
+    clock.now = 0.5
+    assert not watchdog.check()
+    assert car.throttle == 0.5
+
+    clock.now = 1.5
+    assert watchdog.check()
+    assert watchdog.check()
+    assert car.throttle == 0
+    assert watchdog.trips == 1
+
+    watchdog.feed()
+    assert not watchdog.tripped
+
+
+def test_scheduler_fixed_rate(clock):
+    scheduler = make_scheduler(clock)
+    starts = []
+
+    def read_frame():
+        return object(), clock()
+
+    def step(image, timestamp):
+        starts.append(clock())
+        clock.now += 0.03
+
+    scheduler.run(read_frame, step, should_stop=lambda: len(starts) == 5)
+
+    assert starts == pytest.approx([0.0, 0.1, 0.2, 0.3, 0.4])
+    assert scheduler.overruns == 0
+    assert scheduler.stats()["scheduler/jitter_max_ms"] < 1e-6
+
+
+def test_scheduler_counts_overruns_and_drops_missed_periods(clock):
+    scheduler = make_scheduler(clock)
+    starts = []
+
+    def read_frame():
+        return object(), clock()
+
+    def step(image, timestamp):
+        starts.append(clock())
+        # second step takes 2.5 periods
+        clock.now += 0.25 if len(starts) == 2 else 0.01
+
+    scheduler.run(read_frame, step, should_stop=lambda: len(starts) == 3)
+
+    assert scheduler.overruns == 1
+    assert scheduler.missed_periods == 2
+    # next step is aligned on the period grid, not run late
+    assert starts[2] == pytest.approx(0.4)
+
+
+def test_scheduler_skips_stale_frames(clock):
+    scheduler = make_scheduler(clock, max_frame_age=0.05)
+    steps = []
+
+    clock.now = 1.0
+    assert not scheduler.tick(lambda: ("old", 0.9),
+                              lambda *frame: steps.append(frame))
+    assert scheduler.tick(lambda: ("new", 0.99),
+                          lambda *frame: steps.append(frame))
+
+    assert steps == [("new", 0.99)]
+    assert scheduler.stale_frames == 1
+
+
+def test_scheduler_watchdog_without_fresh_frames(clock):
+    car = FakeCar()
+    scheduler = make_scheduler(clock, car=car)
+
+    scheduler.run(lambda: None, None, should_stop=lambda: clock() > 1)
+
+    assert car.throttle == 0
+    assert scheduler.stats()["scheduler/watchdog_trips"] == 1
+
+
+def test_scheduler_stage_budget(clock):
+    scheduler = make_scheduler(clock, budgets={"infer": 0.02})
+
+    with scheduler.stage("infer"):
+        clock.now += 0.01
+    with scheduler.stage("infer"):
+        clock.now += 0.03
+    with scheduler.stage("unbudgeted"):
+        clock.now += 1
+
+    assert scheduler.stats()["scheduler/infer_over_budget"] == 1
+    assert list(scheduler.stats()) == \
+        ControlScheduler.stats_keys(["infer"])
+
+
+def test_scheduler_watchdog_stops_car_when_step_hangs():
+    car = FakeCar()
+    scheduler = ControlScheduler(car, period=0.01, watchdog_timeout=0.05,
+                                 watchdog_interval=0.01)
+    steps = []
+
+    def read_frame():
+        return object(), scheduler.clock()
+
+    def step(image, timestamp):
+        # hangs, only the watchdog thread can stop the car
+        deadline = time.monotonic() + 5
+        while car.throttle != 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        steps.append(image)
+
+    scheduler.run(read_frame, step, should_stop=lambda: steps)
+
+    assert car.throttle == 0
+    assert scheduler.watchdog.trips == 1
+    assert scheduler.watchdog._thread is None
@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+import pytest
+
+# not in the labelling env the CI runs in
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+
+from wandb_jetracer.utils.labelling import suggest_labels  # noqa: E402
+
+
+class LeftHalfRunner:
+    """Predicts x from the mean intensity of the left half"""
+
+    device = torch.device("cpu")
+    dtype = torch.float32
+
+    def __call__(self, images):
+        width = images.shape[-1]
+        left = images[..., :width // 2].mean(dim=(1, 2, 3)) - 0.5
+        return torch.stack([left, torch.zeros_like(left)], dim=1)
+
+
+def test_suggest_labels(tmp_path):
+    # left half white: 0.5 on the image and -0.5 on its mirror, consistent
+    consistent = np.zeros((16, 32, 3), dtype=np.uint8)
+    consistent[:, :16] = 255
+    # white: 0.5 on both the image and its mirror, which should be -0.5
+    inconsistent = np.full((16, 32, 3), 255, dtype=np.uint8)
+    cv2.imwrite(str(tmp_path / "consistent.jpg"), consistent)
+    cv2.imwrite(str(tmp_path / "inconsistent.jpg"), inconsistent)
+
+    suggestions = suggest_labels(
+        LeftHalfRunner(), str(tmp_path),
+        ["consistent.jpg", "inconsistent.jpg"], batch_size=1
+    )
+
+    # x = 0.5 -> 3/4 of the width
+    x, y, uncertainty = suggestions["consistent.jpg"]
+    assert (x, y) == (23, 8)
+    assert uncertainty == pytest.approx(0, abs=0.05)
+    x, y, uncertainty = suggestions["inconsistent.jpg"]
+    assert (x, y) == (23, 8)
+    assert uncertainty == pytest.approx(1, abs=0.05)
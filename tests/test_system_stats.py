@@ -0,0 +1,79 @@
+import pytest
+
+from wandb_jetracer.utils.system_stats import (JTOP_KEYS,
+                                               JtopSource,
+                                               ProcSource,
+                                               SystemStats)
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def test_proc_source(tmp_path):
+    write(tmp_path / "proc" / "meminfo",
+          "MemTotal: 1000 kB\nMemFree: 100 kB\nMemAvailable: 250 kB\n")
+    write(tmp_path / "proc" / "stat", "cpu  10 0 10 70 10 0 0 0 0 0\n")
+    zone = tmp_path / "sys" / "class" / "thermal" / "thermal_zone0"
+    write(zone / "type", "cpu-thermal\n")
+    write(zone / "temp", "45500\n")
+
+    source = ProcSource(root=str(tmp_path))
+    stats = source.read()
+    # no cpu load until there are two /proc/stat readings
+    assert stats == {"RAM": pytest.approx(75), "Temp cpu-thermal": 45.5}
+
+    # 100 more jiffies, 50 of them idle
+    write(tmp_path / "proc" / "stat", "cpu  40 0 30 110 20 0 0 0 0 0\n")
+    stats = source.read()
+    assert stats["CPU"] == pytest.approx(50)
+    assert ProcSource.keys(root=str(tmp_path)) == list(stats)
+
+
+def test_jtop_source():
+    class Jetson:
+        stats = {**{key: 1 for key in JTOP_KEYS}, "uptime": 10}
+
+    assert JtopSource(Jetson()).read() == {key: 1 for key in JTOP_KEYS}
+    assert JtopSource.keys() == JTOP_KEYS
+
+
+def test_snapshot_age():
+    now = [10.0]
+    reads = []
+
+    class Source:
+        def read(self):
+            reads.append(now[0])
+            return {"GPU": 50}
+
+    stats = SystemStats(Source(), rate=1e-3, clock=lambda: now[0])
+    assert stats.snapshot() == {}
+
+    stats.start()
+    now[0] += 0.5
+    # reading the snapshot doesn't read the source
+    assert stats.snapshot() == {
+        "GPU": 50, "system/stats_age_seconds": 0.5
+    }
+    assert reads == [10.0]
+    stats.stop()
+
+
+def test_failed_reads_keep_the_last_snapshot():
+    class Source:
+        calls = 0
+
+        def read(self):
+            self.calls += 1
+            if self.calls > 1:
+                raise OSError("gone")
+            return {"GPU": 50}
+
+    stats = SystemStats(Source(), clock=lambda: 1.0)
+    stats.sample()
+    stats.sample()
+
+    assert stats.errors == 1
+    assert stats.snapshot(now=3.0)["system/stats_age_seconds"] == 2.0
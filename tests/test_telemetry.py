@@ -0,0 +1,113 @@
+import json
+
+import numpy as np
+import pytest
+
+from wandb_jetracer.utils.telemetry import (RingBuffer,
+                                            TelemetrySink,
+                                            MemoryBackend,
+                                            FileBackend,
+                                            Image,
+                                            Video,
+                                            REDUCERS,
+                                            reduced_columns,
+                                            to_wandb)
+
+
+def test_ring_buffer_overwrites_oldest():
+    buffer = RingBuffer(3)
+
+    for i in range(5):
+        buffer.append(i)
+
+    assert len(buffer) == 3
+    assert buffer.overwritten == 2
+    assert buffer.drain() == [2, 3, 4]
+    assert buffer.drain() == []
+
+    buffer.append(5)
+    assert buffer.drain() == [5]
+
+
+def test_sink_downsample():
+    backend = MemoryBackend()
+    # flush manually, the background thread shouldn't kick in
+    sink = TelemetrySink(backend, flush_hz=1e-3, mode="downsample")
+
+    for i in range(10):
+        sink.log({"car/steering": i, "car/throttle": 0.1})
+    sink.close()
+
+    assert backend.rows == [{"car/steering": 9, "car/throttle": 0.1}]
+
+
+def test_sink_aggregate_keeps_non_scalars():
+    backend = MemoryBackend()
+    sink = TelemetrySink(backend, flush_hz=1e-3, mode="aggregate")
+
+    for i in range(100):
+        sink.log({"inference/seconds": float(i)})
+    sink.log({"inference/frame": "image"})
+    sink.close()
+
+    images, row = backend.rows
+    assert images == {"inference/frame": "image"}
+    assert row["inference/seconds"] == pytest.approx(49.5)
+    assert row["inference/seconds/min"] == 0
+    assert row["inference/seconds/max"] == 99
+    assert row["inference/seconds/p99"] == pytest.approx(98.01)
+
+
+@pytest.mark.parametrize("mode", list(REDUCERS))
+def test_reduced_columns(mode):
+    row = REDUCERS[mode]([{"a": 1.0, "b": 2.0}, {"a": 3.0}])
+
+    assert reduced_columns(["a", "b"], mode) == list(row)
+
+
+def test_sink_flushes_in_background():
+    backend = MemoryBackend()
+
+    with TelemetrySink(backend, flush_hz=100) as sink:
+        sink.log({"car/steering": 1})
+        for _ in range(100):
+            if backend.rows:
+                break
+            sink._stop_event.wait(0.01)
+        assert backend.rows == [{"car/steering": 1}]
+
+
+def test_file_backend(tmp_path):
+    path = tmp_path / "telemetry.jsonl"
+
+    with TelemetrySink(FileBackend(path), flush_hz=1e-3) as sink:
+        sink.log({"car/steering": 0.5, "inference/frame": object()})
+
+    rows = [json.loads(line) for line in open(path)]
+    assert rows[1] == {"car/steering": 0.5}
+    assert rows[0]["inference/frame"].startswith("<object")
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        TelemetrySink(MemoryBackend(), mode="median")
+
+
+def test_to_wandb_media():
+    class FakeWandb:
+        Image = staticmethod(lambda data, boxes: ("image", boxes))
+        Video = staticmethod(lambda path: ("video", path))
+        Table = staticmethod(lambda columns, data: (columns, data))
+
+    row = to_wandb({
+        "car/steering": 0.5,
+        "inference/frame": Image(np.zeros((2, 2, 3)), boxes={"a": 1}),
+        "debug/video": Video("segment.mp4", [1.0, 1.5], fps=10),
+    }, FakeWandb)
+
+    assert row == {
+        "car/steering": 0.5,
+        "inference/frame": ("image", {"a": 1}),
+        "debug/video": ("video", "segment.mp4"),
+        "debug/video_timestamps": (["frame", "time"], [[0, 1.0], [1, 1.5]]),
+    }
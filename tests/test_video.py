@@ -0,0 +1,80 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from wandb_jetracer.utils import video
+from wandb_jetracer.utils.video import VideoRecorder
+
+
+def frame(value):
+    return np.full((32, 32, 3), value, dtype=np.uint8)
+
+
+def draw(image, value):
+    image[:] = value
+    return image
+
+
+def test_segments(tmp_path):
+    videos = []
+    recorder = VideoRecorder(
+        str(tmp_path), fps=10, segment_frames=4, overlay=draw,
+        on_segment=videos.append
+    )
+    frames = [frame(0) for _ in range(10)]
+    for i, image in enumerate(frames):
+        assert recorder.submit(image, 100.0 + i, 200)
+    recorder.close()
+
+    assert [len(video.timestamps) for video in videos] == [4, 4, 2]
+    assert videos[1].timestamps == [104, 105, 106, 107]
+    assert recorder.stats()["video/segments"] == 3
+    assert list(recorder.stats()) == video.VIDEO_STATS_KEYS
+    # overlays are drawn on copies
+    assert all(image.max() == 0 for image in frames)
+
+    capture = cv2.VideoCapture(videos[2].path)
+    ok, decoded = capture.read()
+    assert ok and abs(int(decoded.mean()) - 200) <= 3
+    with open(os.path.join(tmp_path, "segment-0002.csv")) as f:
+        assert f.read().splitlines() == [
+            "frame,time", "0,108.000000", "1,109.000000"
+        ]
+
+
+def test_full_queue_drops_frames(tmp_path):
+    release = threading.Event()
+
+    def slow_draw(image):
+        release.wait()
+        return image
+
+    recorder = VideoRecorder(
+        str(tmp_path), fps=10, segment_frames=100, overlay=slow_draw,
+        max_queue=2
+    )
+    # first frame is picked up by the worker, two more fill the queue
+    results = [recorder.submit(frame(0), i) for i in range(5)]
+    release.set()
+    recorder.close()
+
+    assert results.count(False) == recorder.stats()["video/dropped"] >= 1
+    assert recorder.stats()["video/frames"] == results.count(True)
+
+
+def test_unknown_codec(tmp_path):
+    with pytest.raises(ValueError):
+        VideoRecorder(str(tmp_path), fps=10, segment_frames=10, codec="xvid")
+
+
+def test_unavailable_codec_fails_at_startup(tmp_path, monkeypatch):
+    monkeypatch.setattr(video, "can_encode",
+                        lambda directory, codec: codec != "avc1")
+
+    with pytest.raises(ValueError, match="VP80"):
+        VideoRecorder(str(tmp_path), fps=10, segment_frames=10, codec="avc1")
+    # the probe leaves nothing behind
+    assert os.listdir(tmp_path) == []
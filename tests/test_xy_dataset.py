@@ -0,0 +1,255 @@
+import os
+from unittest import mock
+
+import cv2
+import numpy as np
+import pytest
+
+# not in the labelling env the CI runs in
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+
+from torchvision import transforms  # noqa: E402
+
+from wandb_jetracer.utils import xy_dataset  # noqa: E402
+from wandb_jetracer.utils.xy_dataset import (AnnotationIndex,  # noqa: E402
+                                             Preprocessor,
+                                             XYDataset,
+                                             index_path,
+                                             journal_path,
+                                             preprocess,
+                                             MEAN,
+                                             STD)
+
+
+@pytest.fixture
+def image():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (224, 224, 3), dtype=np.uint8)
+
+
+def test_preprocessor_matches_to_tensor(image):
+    expected = transforms.functional.to_tensor(image)[None, ...]
+
+    output = Preprocessor(device="cpu")(image)
+
+    assert output.shape == (1, 3, 224, 224)
+    assert torch.allclose(output, expected)
+
+
+def test_preprocessor_swap_and_normalize(image):
+    expected = transforms.functional.to_tensor(image[..., ::-1].copy())
+    expected = transforms.functional.normalize(expected, MEAN, STD)
+
+    output = Preprocessor(device="cpu", bgr2rgb=True, normalize=True)(image)
+
+    assert torch.allclose(output[0], expected, atol=1e-5)
+
+
+def test_preprocessor_reuses_buffers(image):
+    preprocessor = Preprocessor(device="cpu", dtype=torch.float64)
+
+    first = preprocessor(image)
+    data_ptr = first.data_ptr()
+    second = preprocessor(np.zeros_like(image))
+
+    assert second.data_ptr() == data_ptr
+    assert second.dtype == torch.float64
+    assert float(second.abs().sum()) == 0
+
+
+def test_preprocessor_wrong_shape():
+    with pytest.raises(ValueError):
+        Preprocessor(device="cpu")(np.zeros((10, 10, 3), dtype=np.uint8))
+
+
+def test_preprocess_shortcut(image):
+    output = preprocess(image, device="cpu")
+
+    assert output is preprocess(image, device="cpu")
+
+
+def test_annotation_index_append_and_grow():
+    index = AnnotationIndex(capacity=1, name_size=1)
+
+    for i in range(50):
+        index.append(f"{i}_{-i}_image.jpg", i, -i)
+
+    assert len(index) == 50
+    assert index[0] == ("0_0_image.jpg", 0, 0)
+    assert index[-1] == ("49_-49_image.jpg", 49, -49)
+    assert index.xy.dtype == np.int16
+    assert index.xy[:, 0].tolist() == list(range(50))
+    with pytest.raises(IndexError):
+        index[50]
+
+
+def test_annotation_index_save_load(tmp_path):
+    index = AnnotationIndex()
+    index.append("1_2_a.jpg", 1, 2)
+    index.append("3_4_b.jpg", 3, 4)
+    path = str(tmp_path / "train.index.npz")
+
+    index.save(path, directory_mtime=42)
+    loaded, mtime = AnnotationIndex.load(path)
+
+    assert mtime == 42
+    assert [loaded[i] for i in range(2)] == [index[i] for i in range(2)]
+
+    loaded.append("5_6_c.jpg", 5, 6)
+    assert loaded[2] == ("5_6_c.jpg", 5, 6)
+
+
+def test_dataset_index_is_reused_and_invalidated(tmp_path, image):
+    directory = str(tmp_path / "train")
+    cache_dir = str(tmp_path / "cache")
+    dataset = XYDataset(directory, train=False, cache_dir=cache_dir)
+    assert len(dataset) == 0
+
+    # every entry saved keeps the index up to date
+    for i in range(3):
+        dataset.save_entry(None, image, 10 * i, 20 * i)
+    assert len(dataset) == 3
+
+    # nothing changed, the index is loaded instead of globbing
+    assert os.path.exists(index_path(directory, cache_dir))
+    with mock.patch("glob.glob") as glob:
+        reopened = XYDataset(directory, train=False, cache_dir=cache_dir)
+        glob.assert_not_called()
+    assert sorted(reopened.index.xy[:, 0].tolist()) == [0, 10, 20]
+
+    # an image was added behind its back, the index is rebuilt
+    cv2.imwrite(os.path.join(directory, "5_5_new.jpg"), image)
+    assert len(XYDataset(directory, train=False, cache_dir=cache_dir)) == 4
+
+
+def test_save_entry_journals_instead_of_rewriting_the_index(
+    tmp_path, image, monkeypatch
+):
+    directory = str(tmp_path / "train")
+    cache_dir = str(tmp_path / "cache")
+    monkeypatch.setattr(xy_dataset, "COMPACT_EVERY", 4)
+    dataset = XYDataset(directory, train=False, cache_dir=cache_dir)
+
+    with mock.patch.object(AnnotationIndex, "save", autospec=True,
+                           side_effect=AnnotationIndex.save) as save:
+        for i in range(6):
+            dataset.save_entry(None, image, 10 * i, 0)
+        # the first entry creates the index, the 4 next are compacted
+        assert save.call_count == 2
+        reopened = XYDataset(directory, train=False, cache_dir=cache_dir)
+        assert save.call_count == 2
+    xs = sorted(reopened.index.xy[:, 0].tolist())
+    assert xs == [0, 10, 20, 30, 40, 50]
+
+    dataset.close()
+    assert not os.path.exists(journal_path(directory, cache_dir))
+    assert len(XYDataset(directory, train=False, cache_dir=cache_dir)) == 6
+
+
+def test_dataset_index_is_only_saved_in_cache_dir(tmp_path, image):
+    directory = str(tmp_path / "train")
+    dataset = XYDataset(directory, train=False)
+    dataset.save_entry(None, image, 10, 20)
+    dataset.save_index()
+
+    assert os.listdir(tmp_path) == ["train"]
+
+
+def test_dataset_index_unwritable_cache_dir(tmp_path, image):
+    directory = str(tmp_path / "train")
+    XYDataset(directory).save_entry(None, image, 10, 20)
+
+    error = PermissionError("read-only file system")
+    with mock.patch.object(AnnotationIndex, "save", side_effect=error):
+        dataset = XYDataset(directory, cache_dir=str(tmp_path / "cache"))
+        dataset.save_entry(None, image, 30, 40)
+
+    assert len(dataset) == 2
+
+
+def test_dataset_getitem(tmp_path, image):
+    directory = str(tmp_path / "test")
+    dataset = XYDataset(directory, train=False)
+    dataset.save_entry(None, image, 224, 0)
+
+    tensor, target = dataset[0]
+
+    assert tensor.shape == (3, 224, 224)
+    assert target.tolist() == [1.0, -1.0]
+
+
+def test_frame_cache_matches_uncached(tmp_path, image):
+    directory = str(tmp_path / "val")
+    cache_dir = str(tmp_path / "cache")
+    dataset = XYDataset(directory, train=False)
+    for x in [0, 100, 200]:
+        dataset.save_entry(None, image, x, 50)
+
+    uncached = XYDataset(directory, train=False)
+    cached = XYDataset(directory, train=False, cache_dir=cache_dir)
+    assert len(cached.cache) == 3
+
+    expected = sorted((uncached[i] for i in range(3)),
+                      key=lambda item: float(item[1][0]))
+    actual = sorted((cached[i] for i in range(3)),
+                    key=lambda item: float(item[1][0]))
+    for (image_a, target_a), (image_b, target_b) in zip(expected, actual):
+        assert torch.allclose(target_a, target_b)
+        assert torch.allclose(image_a, image_b)
+
+    # reopening reuses the cache, adding an image invalidates it
+    XYDataset(directory, train=False, cache_dir=cache_dir)
+    # frames, labels and the index
+    assert len(os.listdir(cache_dir)) == 3
+    dataset.save_entry(None, image, 10, 10)
+    assert len(XYDataset(directory, cache_dir=cache_dir)) == 4
+    # the stale frames and labels are deleted
+    assert len(os.listdir(cache_dir)) == 3
+
+    # other directories keep theirs
+    other = str(tmp_path / "other")
+    XYDataset(other).save_entry(None, image, 20, 20)
+    XYDataset(other, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 6
+    assert len(XYDataset(directory, cache_dir=cache_dir)) == 4
+
+
+def test_frame_cache_empty_directory(tmp_path):
+    directory = str(tmp_path / "empty")
+    os.makedirs(directory)
+
+    dataset = XYDataset(directory, cache_dir=str(tmp_path / "cache"))
+
+    assert len(dataset) == 0
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_dataset_uint8(tmp_path, image, cached):
+    directory = str(tmp_path / "train")
+    XYDataset(directory).save_entry(None, image, 112, 112)
+    cache_dir = str(tmp_path / "cache") if cached else None
+
+    tensor, target = XYDataset(directory, cache_dir=cache_dir, uint8=True)[0]
+
+    assert tensor.dtype == torch.uint8
+    assert tensor.shape == (3, 224, 224)
+    assert target.tolist() == [0, 0]
+
+
+def test_frame_cache_rewritten_image(tmp_path):
+    directory = str(tmp_path / "train")
+    cache_dir = str(tmp_path / "cache")
+    os.makedirs(directory)
+    path = os.path.join(directory, "10_10_a.jpg")
+    cv2.imwrite(path, np.full((32, 32, 3), 50, dtype=np.uint8))
+    size = os.path.getsize(path)
+    assert XYDataset(directory, cache_dir=cache_dir).cache[0][0].max() < 60
+
+    # same name and size, different pixels
+    cv2.imwrite(path, np.full((32, 32, 3), 200, dtype=np.uint8))
+    assert os.path.getsize(path) == size
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    assert XYDataset(directory, cache_dir=cache_dir).cache[0][0].min() > 190